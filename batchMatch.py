@@ -0,0 +1,159 @@
+import numpy as np
+from player import chanceOfOverlvl, changeOfMoreSkill #work on arrays as is, so both versions share one formula
+from ladderRules import lossPercent, applyGates
+
+#Batched version of Player.playMatch / Player.winsMatch on a PlayerTable.
+#Thousands of matches are resolved with a handful of numpy operations instead of one Python call per match.
+
+NOCAP = np.iinfo(np.int16).max #card level cap of matches that aren't capped
+_rng = np.random.default_rng()
+
+
+def playMatches(table, p1, p2, gatesList = [5000], caps = None, rng = None):
+    """Plays the matches p1[k] vs p2[k] for every k at once.  Same rules as Player.playMatch,
+    players without a skill are treated as equally skilled.
+
+    Args:
+    table: PlayerTable, updated in place
+    p1, p2: arrays of row indices.  A player can't appear twice in one batch
+    gatesList: List of trophy gates
+    caps: optional array of card level caps, one per match
+    rng: optional numpy Generator
+
+    Returns: (winners, losers), arrays of row indices
+    """
+    p1 = np.asarray(p1, dtype = np.intp)
+    p2 = np.asarray(p2, dtype = np.intp)
+    if p1.size != p2.size:
+        raise ValueError("p1 and p2 must be the same length")
+    if np.unique(np.concatenate((p1, p2))).size != 2*p1.size:
+        raise ValueError("A player can only play one match per batch")
+    rng = _rng if rng is None else rng
+
+    cards1 = table.cardLevel[p1].astype(np.int64)
+    cards2 = table.cardLevel[p2].astype(np.int64)
+    if caps is not None:
+        cards1 = np.minimum(cards1, caps)
+        cards2 = np.minimum(cards2, caps)
+    levels1 = cards1 + table.kt[p1]
+    levels2 = cards2 + table.kt[p2]
+    lvlDiff = np.abs(levels2 - levels1)
+    table.totalLvlDiff[p1] += lvlDiff.astype(table.totalLvlDiff.dtype)
+    table.totalLvlDiff[p2] += lvlDiff.astype(table.totalLvlDiff.dtype)
+
+    skillDiff = np.nan_to_num(table.skill[p1].astype(np.float64) - table.skill[p2])
+    chanceBetter = changeOfMoreSkill(np.abs(skillDiff))
+    p1Chance = np.where(levels1 > levels2, chanceOfOverlvl(lvlDiff),
+               np.where(levels1 < levels2, 1 - chanceOfOverlvl(lvlDiff),
+               np.where(skillDiff >= 0, chanceBetter, 1 - chanceBetter)))
+    p1Wins = rng.random(p1.size) < p1Chance
+    winners = np.where(p1Wins, p1, p2)
+    losers = np.where(p1Wins, p2, p1)
+
+    winnerTrophies = table.trophies[winners].astype(np.int64)
+    original = table.trophies[losers].astype(np.int64)
+    exchanged = 30 + np.trunc((1/12) *(original - winnerTrophies)).astype(np.int64)
+    newTrophies = original - np.trunc(lossPercent(original) * exchanged).astype(np.int64)
+    table.trophies[winners] = winnerTrophies + exchanged
+    table.trophies[losers] = applyGates(newTrophies, original, gatesList)
+    table.wins[winners] += 1
+    table.losses[losers] += 1
+    return winners, losers
+
+
+class BatchResult():
+    """
+    The matches of one played batch, handed to the MatchBatch listeners.
+
+    Attributes:
+        p1, p2: arrays of row indices of both players of every match
+        caps: array of card level caps of every match (NOCAP if not capped)
+        trophies1, trophies2: trophies of both players before the match
+        winners, losers: arrays of row indices
+    """
+    def __init__(self, p1, p2, caps, trophies1, trophies2, winners, losers):
+        self.p1 = p1
+        self.p2 = p2
+        self.caps = caps
+        self.trophies1 = trophies1
+        self.trophies2 = trophies2
+        self.winners = winners
+        self.losers = losers
+
+    def __len__(self):
+        """Number of matches"""
+        return self.p1.size
+
+    def levels(self, table):
+        """Returns the levels (capped card level + king tower) of both players of every match"""
+        levels1 = np.minimum(table.cardLevel[self.p1], self.caps) + table.kt[self.p1]
+        levels2 = np.minimum(table.cardLevel[self.p2], self.caps) + table.kt[self.p2]
+        return levels1.astype(np.int64), levels2.astype(np.int64)
+
+
+class MatchBatch():
+    """
+    Collects the matches found by a matchmaker and plays them all at once with playMatches.
+    A player with a pending match must not be matched again before the batch is played,
+    so simulations check `player in batch` and call flush() first.
+
+    Attributes:
+        listeners: list of functions called with (table, BatchResult) after every played batch
+    Methods:
+        add
+        flush
+    """
+    def __init__(self, table, gatesList = [5000], size = 4096, rng = None):
+        """Args:
+            table: PlayerTable the matches are played on
+            gatesList: List of trophy gates
+            size: int, number of matches played per batch
+            rng: optional numpy Generator
+        """
+        self.table = table
+        self.gatesList = gatesList
+        self.size = size
+        self.rng = rng
+        self.listeners = []
+        self.pending = set()
+        self.p1 = []
+        self.p2 = []
+        self.caps = []
+
+    def __len__(self):
+        """Number of pending matches"""
+        return len(self.p1)
+
+    def __contains__(self, player):
+        """Checks if player has a pending match"""
+        return player in self.pending
+
+    def add(self, p1, p2, cap = None):
+        """Adds the match p1 vs p2, with an optional card level cap.  Plays the batch when it is full"""
+        self.p1.append(p1)
+        self.p2.append(p2)
+        self.caps.append(NOCAP if cap is None else cap)
+        self.pending.add(p1)
+        self.pending.add(p2)
+        if len(self.p1) >= self.size:
+            self.flush()
+
+    def flush(self):
+        """Plays every pending match"""
+        if self.p1:
+            caps = np.asarray(self.caps)
+            p1 = np.asarray(self.p1, dtype = np.intp)
+            p2 = np.asarray(self.p2, dtype = np.intp)
+            if self.listeners:
+                trophies1 = self.table.trophies[p1].copy()
+                trophies2 = self.table.trophies[p2].copy()
+            winners, losers = playMatches(self.table, p1, p2, gatesList = self.gatesList,
+                                          caps = None if (caps == NOCAP).all() else caps, rng = self.rng)
+            if self.listeners:
+                result = BatchResult(p1, p2, caps, trophies1, trophies2, winners, losers)
+                for listener in self.listeners:
+                    listener(self.table, result)
+        self.pending.clear()
+        self.p1 = []
+        self.p2 = []
+        self.caps = []
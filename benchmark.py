@@ -0,0 +1,215 @@
+import io
+import json
+import time
+import timeit
+import platform
+import tracemalloc
+import contextlib
+import numpy as np
+import pandas as pd
+import player as pl
+import ladderSim2 as ls
+import tableSim as ts
+import batchMatch as bm
+from playerTable import PlayerTable
+from engine import LadderEngine, MatchPolicy
+from telemetry import Telemetry
+from population import realPopulation
+
+#Throughput benchmarks of the simulations.  Every simulation runs a fixed number of matches at a fixed seed
+#on populations of several sizes, with the table engine and (for small populations) the Player object version.
+#Results are written as json, so runs on different commits can be compared with compare().
+#Run it with python benchmark.py [--sizes 1000 10000 ...] [--matches N] [--out file.json]
+
+SIZES = [1000, 10000, 100000, 1000000]
+CASES = {"simulate": MatchPolicy(),
+         "continueSim": MatchPolicy(), #the mode None seasons of ladderSim2.test
+         "KTsim": MatchPolicy(mode = 'KT', KTdiff = 1, KTcutoff = 6000),
+         "CLsim": MatchPolicy(mode = 'CL', cardLvlRule = 5, CLcutoff = 6000, legacyCL = True),
+         "trophyCapSim": MatchPolicy(capList = ts.CAPLIST),
+         "finalSimulation": MatchPolicy(capList = ts.CAPLIST, partySkip = True)}
+SIMULATE_SKILL = 0.5 #skill of every simulate player
+
+
+def population(case, numPlayers, seed):
+    """Starting PlayerTable of a case: simulate starts everyone at 4000 trophies with equal skills (the Player
+    objects can't play equal levels without one), the others use finalSimulation's players"""
+    if case == "simulate":
+        table = ts.createTable(numPlayers, 4000, seed = seed)
+        table.skill[:] = SIMULATE_SKILL
+        return table
+    return realPopulation(numPlayers, seed = seed)
+
+
+def _legacyRun(case, table, numMatches, seed):
+    """Runs the Player object version of a case on a copy of table"""
+    p = CASES[case]
+    if case == "simulate":
+        return ls.simulate(len(table), 4000, numMatches, seed = seed, skill = SIMULATE_SKILL)
+    arr = table.toPlayers()
+    if case == "continueSim":
+        return ls.continueSim(arr, numMatches, mode = p.mode, cardLvlRule = p.cardLvlRule, KTdiff = p.KTdiff, KTcutoff = p.KTcutoff, seed = seed)
+    if case == "KTsim":
+        return ls.KTsim(arr, numMatches, KTdiff = p.KTdiff, KTcutoff = p.KTcutoff, seed = seed)
+    if case == "CLsim":
+        return ls.CLsim(arr, numMatches, p.cardLvlRule, p.CLcutoff, seed = seed)
+    if case == "trophyCapSim":
+        return ls.trophyCapSim(arr, numMatches, p.capList, seed = seed)
+    raise ValueError(f"{case} has no Player object version with a variable size")
+
+
+def _tableRun(case, table, numMatches, seed):
+    """Runs the table engine version of a case on table, returns its Telemetry"""
+    engine = LadderEngine(table, CASES[case], rng = seed, sampler = case == "finalSimulation") #as tableSim.finalSimulation builds it
+    telemetry = Telemetry().attach(engine)
+    engine.run(numMatches, progress = False)
+    return telemetry
+
+
+def benchCase(case, numPlayers, numMatches = 100000, engine = "table", seed = 0, memory = True):
+    """Times one simulation and returns its result row
+
+    Args:
+    case: key of CASES
+    numPlayers: int, population size
+    numMatches: int, matches played
+    engine: 'table' (LadderEngine) or 'legacy' (ladderSim2 Player objects)
+    seed: int, seed of the population and the run
+    memory: bool, runs the case a second time under tracemalloc to measure its peak memory (peakMB, the Python
+            allocations of that run alone; the process's peak resident memory never goes down, so it can't be
+            measured per case)
+    """
+    table = population(case, numPlayers, seed)
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            if engine == "table":
+                return _tableRun(case, table.copy(), numMatches, seed)
+            return _legacyRun(case, table, numMatches, seed)
+    start = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - start
+    row = {"case": case, "engine": engine, "players": numPlayers, "matches": numMatches, "seed": seed,
+           "seconds": seconds, "matchesPerSecond": numMatches/seconds}
+    if engine == "table":
+        report = result.report()
+        row.update(maxQueueSize = report["maxQueueSize"], drawsPerMatch = report["drawsPerMatch"],
+                   rejections = report["rejections"])
+    if memory:
+        tracemalloc.start()
+        run()
+        row["peakMB"] = tracemalloc.get_traced_memory()[1]/2**20
+        tracemalloc.stop()
+    return row
+
+
+def microbenchmarks(number = 10000, rows = 100000, seed = 0):
+    """Times Player.playMatch, allowMatch, dfToArr and arrToDF next to their table versions
+
+    Args:
+    number: int, calls of the per match functions
+    rows: int, population size of the data frame conversions
+    Returns: list of result rows (name, calls, seconds, microseconds per call)
+    """
+    ls.seedLegacy(seed)
+    p1 = pl.createRealPlayers(kingLvl = 11, id = 0, skill = 0.5, pp = 0.2)
+    p2 = pl.createRealPlayers(kingLvl = 12, id = 1, skill = 0.6, pp = 0.2)
+    table = PlayerTable.fromPlayers([p1, p2])
+    df = population("finalSimulation", rows, seed).toDF()
+    arr = ls.dfToArr(df)
+    big = ls.dfToTable(df)
+    players = np.arange(rows)
+    tests = [("Player.playMatch", lambda: p1.playMatch(p2), number),
+             ("PlayerTable.playMatch", lambda: table.playMatch(0, 1), number),
+             ("batchMatch.playMatches (per match)", lambda: bm.playMatches(big, players[:rows//2], players[rows//2:]), 1),
+             ("allowMatch", lambda: ls.allowMatch(p1, p2, mode = 'KTCL', cardLvlRule = 5, KTdiff = 1, KTcutoff = 6000), number),
+             ("PlayerTable.allowMatch", lambda: table.allowMatch(0, 1, mode = 'KTCL', cardLvlRule = 5, KTdiff = 1, KTcutoff = 6000), number),
+             ("dfToArr", lambda: ls.dfToArr(df), 1),
+             ("dfToTable", lambda: ls.dfToTable(df), 1),
+             ("arrToDF", lambda: ls.arrToDF(arr), 1),
+             ("PlayerTable.toDF", lambda: big.toDF(), 1)]
+    results = []
+    for name, function, calls in tests:
+        seconds = min(timeit.repeat(function, number = calls, repeat = 3))
+        if name.endswith("(per match)"):
+            calls = rows//2
+        results += [{"name": name, "calls": calls, "seconds": seconds, "microseconds": seconds/calls*1e6}]
+    return results
+
+
+def environment():
+    """Python, numpy and machine details stored with the results"""
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "machine": platform.machine(), "processor": platform.processor(), "system": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def runBenchmarks(sizes = SIZES, cases = None, numMatches = 100000, legacyMax = 10000, seed = 0, memory = True,
+                  micro = True, outFile = "benchmark.json"):
+    """Runs every case at every size and stores the results
+
+    Args:
+    sizes: list of population sizes
+    cases: optional list of CASES keys, every case by default
+    numMatches: int, matches per run
+    legacyMax: int, largest population the Player object versions run on (they are much slower)
+    seed: int, seed of every run
+    memory: bool, measures peak memory (doubles the run time)
+    micro: bool, also runs the microbenchmarks
+    outFile: optional json file name
+    Returns: dict with the environment, the settings, the simulation rows and the microbenchmark rows
+    """
+    rows = []
+    for numPlayers in sizes:
+        for case in cases or CASES:
+            engines = ["table"]
+            if numPlayers <= legacyMax and case != "finalSimulation":
+                engines += ["legacy"]
+            for engine in engines:
+                try:
+                    row = benchCase(case, numPlayers, numMatches, engine = engine, seed = seed, memory = memory)
+                    print(f"{case:16} {engine:6} {numPlayers:>8} players: {row['matchesPerSecond']:>10.0f} matches/s")
+                except Exception as error: #recorded, so one broken case doesn't stop the others
+                    tracemalloc.stop()
+                    row = {"case": case, "engine": engine, "players": numPlayers, "matches": numMatches, "seed": seed, "error": repr(error)}
+                    print(f"{case:16} {engine:6} {numPlayers:>8} players: failed, {error!r}")
+                rows += [row]
+    results = {"environment": environment(),
+               "settings": {"sizes": list(sizes), "matches": numMatches, "seed": seed},
+               "simulations": rows,
+               "micro": microbenchmarks(seed = seed) if micro else []}
+    if outFile is not None:
+        with open(outFile, "w") as f:
+            json.dump(results, f, indent = 1)
+    return results
+
+
+def loadResults(filename):
+    """Reads a results file as (simulations DataFrame, microbenchmarks DataFrame)"""
+    with open(filename) as f:
+        results = json.load(f)
+    return pd.DataFrame(results["simulations"]), pd.DataFrame(results["micro"])
+
+
+def compare(oldFile, newFile):
+    """Speed up of every simulation between two result files (new matches/s over old matches/s)"""
+    old, _ = loadResults(oldFile)
+    new, _ = loadResults(newFile)
+    keys = ["case", "engine", "players", "matches"]
+    df = old[keys + ["matchesPerSecond"]].merge(new[keys + ["matchesPerSecond"]], on = keys, suffixes = ("Old", "New"))
+    df["speedUp"] = df["matchesPerSecondNew"]/df["matchesPerSecondOld"]
+    return df
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Benchmarks the ladder simulations")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = SIZES)
+    parser.add_argument("--cases", nargs = "+", choices = list(CASES))
+    parser.add_argument("--matches", type = int, default = 100000)
+    parser.add_argument("--legacy-max", type = int, default = 10000)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--no-memory", action = "store_true")
+    parser.add_argument("--no-micro", action = "store_true")
+    parser.add_argument("--out", default = "benchmark.json")
+    args = parser.parse_args()
+    runBenchmarks(args.sizes, args.cases, args.matches, args.legacy_max, args.seed, not args.no_memory, not args.no_micro, args.out)
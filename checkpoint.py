@@ -0,0 +1,167 @@
+import os
+import json
+import numpy as np
+from playerTable import PlayerTable, COLUMNS
+from engine import LadderEngine, MatchPolicy
+from eventEngine import EventEngine
+from matchIndex import MatchIndex
+
+#Checkpoints of a multi season LadderEngine run.  A checkpoint holds everything the run depends on:
+#player columns, queue contents (with the time every player was queued at), pending batch matches, the random generator state,
+#the unused pre-drawn random numbers and the season / match counters.  Resuming from a checkpoint
+#continues exactly (bit for bit) like the run that wrote it.  Observers (metrics, logs) aren't saved.  Checkpoints are written to a temporary
+#file and renamed, so a crash while writing never loses the previous checkpoint.
+
+
+def saveCheckpoint(engine, filename, counters):
+    """Writes the state of engine to filename
+
+    Args:
+    engine: LadderEngine
+    filename: string, name of the checkpoint file (.npz)
+    counters: dict of json serializable run counters (season, matches played, run settings)
+    """
+    if isinstance(engine, EventEngine):
+        raise ValueError("Checkpoints of an EventEngine aren't supported, its event heap isn't saved")
+    arrays = {"col_" + name: getattr(engine.table, name) for name in COLUMNS}
+    keys = list(engine.queues)
+    players, trophies, kts, cards, keyIndex, since = [], [], [], [], [], []
+    for n, key in enumerate(keys):
+        queue = engine.queues[key]
+        for player in queue:
+            players += [player]
+            trophies += [queue.members[player]]
+            kts += [queue.attrs[player][0]]
+            cards += [queue.attrs[player][1]]
+            keyIndex += [n]
+            since += [queue.attrs[player][2]]
+    arrays["queue"] = np.asarray([players, trophies, kts, cards, keyIndex, since], dtype = np.int64).reshape(6, -1)
+    batch = engine.batch
+    arrays["batch"] = np.asarray([batch.p1, batch.p2, batch.caps], dtype = np.int64).reshape(3, -1)
+    arrays["draws"] = np.asarray(engine.draws.block[engine.draws.pos:], dtype = np.float64)
+    if engine.sampler is not None:
+        arrays["samplerDraws"] = np.asarray(engine.sampler.block[engine.sampler.pos:], dtype = np.int64)
+    policy = engine.policy
+    meta = {"counters": counters,
+            "queueKeys": keys,
+            "maxQueueSize": engine.maxQueueSize,
+            "engineSeason": engine.season,
+            "now": engine.now,
+            "rngState": engine.rng.bit_generator.state,
+            "bitGenerator": type(engine.rng.bit_generator).__name__,
+            "policyClass": type(policy).__name__,
+            "policy": policy.__dict__,
+            "batchSize": batch.size,
+            "sampler": engine.sampler is not None}
+    arrays["meta"] = np.frombuffer(json.dumps(meta).encode(), dtype = np.uint8)
+    temp = filename + ".tmp"
+    with open(temp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temp, filename)
+
+
+def loadCheckpoint(filename, policy = None):
+    """Rebuilds the LadderEngine saved in filename
+
+    Args:
+    filename: string, name of the checkpoint file
+    policy: optional MatchPolicy to continue with instead of the saved one (to try a different rule
+            from this point on).  Required if the run used a MatchPolicy subclass
+    Returns: (LadderEngine, counters dict)
+    """
+    with np.load(filename) as data:
+        meta = json.loads(data["meta"].tobytes())
+        table = PlayerTable(0)
+        for name in COLUMNS:
+            setattr(table, name, data["col_" + name].copy())
+        queue = data["queue"]
+        batch = data["batch"]
+        draws = data["draws"].tolist()
+        samplerDraws = data["samplerDraws"].tolist() if "samplerDraws" in data else []
+    if policy is None:
+        if meta["policyClass"] != "MatchPolicy":
+            raise ValueError(f"The run used a {meta['policyClass']} policy, pass it as policy to resume")
+        policy = MatchPolicy()
+        policy.__dict__.update(meta["policy"])
+    rng = np.random.Generator(getattr(np.random, meta["bitGenerator"])())
+    rng.bit_generator.state = meta["rngState"]
+    engine = LadderEngine(table, policy, batchSize = meta["batchSize"], rng = rng, sampler = meta.get("sampler", False))
+    engine.draws.block = draws
+    engine.draws.pos = 0
+    if engine.sampler is not None:
+        engine.sampler.block = samplerDraws
+        engine.sampler.pos = 0
+    keys = meta["queueKeys"]
+    if len(queue) == 5: #written before queue times were saved
+        queue = np.vstack((queue, np.zeros(queue.shape[1], dtype = np.int64)))
+    for player, trophies, kt, cards, n, since in sorted(queue.T.tolist(), key = lambda q: q[5]): #queueing order
+        key = keys[n]
+        if key not in engine.queues:
+            engine.queues[key] = MatchIndex()
+        engine.queues[key].add(player, trophies, kt, cards, since = since)
+        engine.queued[player] = key
+        if engine.sampler is not None:
+            engine.sampler.exclude(player)
+    engine.maxQueueSize = meta["maxQueueSize"]
+    engine.season = meta["engineSeason"]
+    engine.now = meta.get("now", 0)
+    for p1, p2, cap in batch.T.tolist():
+        engine.batch.p1.append(p1)
+        engine.batch.p2.append(p2)
+        engine.batch.caps.append(cap)
+        engine.batch.pending.update((p1, p2))
+    return engine, meta["counters"]
+
+
+def runSeasons(engine, numSeasons, matchesPerSzn, checkpointFile = None, checkpointEvery = None, resetAfterLast = False,
+               season = 1, matchesPlayed = 0):
+    """Plays numSeasons seasons of matchesPerSzn matches on engine, with a season reset between seasons,
+    writing a checkpoint every checkpointEvery matches and at the end of every season
+
+    Args:
+    engine: LadderEngine
+    numSeasons: int, last season to play
+    matchesPerSzn: int, matches per season
+    checkpointFile: optional string, name of the checkpoint file
+    checkpointEvery: optional int, matches between checkpoints. Checkpoints are only written at season ends if None
+    resetAfterLast: bool, also resets trophies after the last season (like finalSimulation)
+    season, matchesPlayed: where to start, used by resume
+    Returns: the engine's PlayerTable
+    """
+    def counters():
+        return {"season": season, "matchesPlayed": matchesPlayed, "numSeasons": numSeasons, "matchesPerSzn": matchesPerSzn,
+                "checkpointEvery": checkpointEvery, "resetAfterLast": resetAfterLast}
+    while season <= numSeasons:
+        while matchesPlayed < matchesPerSzn:
+            chunk = matchesPerSzn - matchesPlayed
+            if checkpointEvery:
+                chunk = min(chunk, checkpointEvery - matchesPlayed %checkpointEvery)
+            engine.run(chunk, progress = False, flush = False)
+            matchesPlayed += chunk
+            if checkpointFile and checkpointEvery and matchesPlayed < matchesPerSzn:
+                saveCheckpoint(engine, checkpointFile, counters())
+        print(f"Season {season} complete")
+        if season < numSeasons or resetAfterLast:
+            engine.endSeason()
+        season += 1
+        matchesPlayed = 0
+        if checkpointFile:
+            saveCheckpoint(engine, checkpointFile, counters())
+    engine.batch.flush()
+    return engine.table
+
+
+def resume(checkpointFile, policy = None, numSeasons = None, newCheckpointFile = None):
+    """Continues the run saved in checkpointFile until its last season and returns the PlayerTable
+
+    Args:
+    checkpointFile: string, name of the checkpoint file
+    policy: optional MatchPolicy to continue with a different rule (see loadCheckpoint)
+    numSeasons: optional int, plays until this season instead of the saved one
+    newCheckpointFile: optional string, writes the following checkpoints here instead of checkpointFile,
+                       so several runs can be fanned out from one checkpoint
+    """
+    engine, c = loadCheckpoint(checkpointFile, policy = policy)
+    return runSeasons(engine, numSeasons or c["numSeasons"], c["matchesPerSzn"],
+                      checkpointFile = newCheckpointFile or checkpointFile, checkpointEvery = c["checkpointEvery"],
+                      resetAfterLast = c["resetAfterLast"], season = c["season"], matchesPlayed = c["matchesPlayed"])
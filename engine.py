@@ -0,0 +1,359 @@
+import time
+import numpy as np
+from rngStreams import makeRng, RandomBlock
+from matchIndex import MatchIndex
+from batchMatch import MatchBatch
+from ladderRules import cap
+from sampler import EligibleSampler
+
+#One matchmaking loop for every simulation.  What changes between simulations (who can play who,
+#which queue a player waits in, card level caps, gates, 2v2 skips) is decided by a MatchPolicy.
+
+
+class MatchPolicy():
+    """
+    Matchmaking rules of a simulation.  Subclass it and override the methods to try new rules.
+
+    Attributes:
+        mode: Type of matchmaking.  Either None, 'KT', 'CL' or 'KTCL' (same as ladderSim2.allowMatch)
+        cardLvlRule: int, card levels of both players must differ by less than this
+        CLcutoff: int, max trophies where card level mm occurs
+        KTdiff: int, maximum difference in king tower
+        KTcutoff: int, max trophies where king tower mm occurs
+        gatesList: List of trophy gates
+        capList: optional list of 6 trophy counts where card levels are capped (see ladderSim2.trophyCapSim)
+        partySkip: bool, if True a drawn player skips ladder with probability pp
+        window: int, max trophy difference of a match (Player.matchAllowed)
+        widenEvery: optional wait between two widenings of a queued player's limits, in draws for the LadderEngine
+                    and seconds for the EventEngine.  None keeps the limits fixed
+        widenTrophies, widenKT, widenCL: how much the trophy window, KT difference and card level rule grow per widening
+        maxWindow: int, widest trophy window
+        maxQueue: optional int, most queued players.  When the queues are full the player that has waited
+                  longest leaves to make room
+        legacyCL: bool, in 'CL' mode picks opponents like ladderSim2.CLsim: below CLcutoff players wait in one
+                  queue per card level, and a search tries the queues of the same level, then +1, -1, +2, -2 ... up
+                  to cardLvlRule levels away, looking at one player per queue (the queue's np.searchsorted
+                  neighbour, see TrophyQueue.above).  Above CLcutoff one general queue is searched the same way.
+                  Like findOppCL, the card level rule of those queues only applies up to 5000 trophies.  Without
+                  it every queued player within the window is a candidate, closest trophies first, which gives
+                  matches with smaller level differences
+    Methods:
+        eligible
+        queueKey
+        searchKeys
+        limits
+        cap
+        skips
+        weights
+        widening
+    """
+    def __init__(self, mode = None, cardLvlRule = 100, CLcutoff = 5000, KTdiff = 0, KTcutoff = 5000, gatesList = [5000], capList = None, partySkip = False,
+                 widenEvery = None, widenTrophies = 20, widenKT = 1, widenCL = 2, maxWindow = 200, maxQueue = None, legacyCL = False):
+        self.mode = mode
+        self.cardLvlRule = cardLvlRule
+        self.CLcutoff = CLcutoff
+        self.KTdiff = KTdiff
+        self.KTcutoff = KTcutoff
+        self.gatesList = gatesList
+        self.capList = capList
+        self.partySkip = partySkip
+        self.window = 40
+        self.widenEvery = widenEvery
+        self.widenTrophies = widenTrophies
+        self.widenKT = widenKT
+        self.widenCL = widenCL
+        self.maxWindow = maxWindow
+        self.maxQueue = maxQueue
+        self.legacyCL = legacyCL
+
+    def __repr__(self):
+        """String representation of a policy"""
+        return f"MatchPolicy({self.__dict__})"
+
+    def eligible(self, table, i, j, waited = 0):
+        """Checks if rows i and j are allowed to play each other
+
+        Args:
+        waited: how long j has been queued.  Widened limits apply once it has waited widenEvery
+        """
+        steps = self.widenSteps(waited)
+        if steps:
+            ktDiff, clRule = self.limits(table, i, waited)
+            return (i != j and abs(int(table.trophies[i]) - int(table.trophies[j])) <= min(self.window + steps*self.widenTrophies, self.maxWindow)
+                    and (ktDiff is None or abs(int(table.kt[i]) - int(table.kt[j])) <= ktDiff)
+                    and (clRule is None or abs(int(table.cardLevel[i]) - int(table.cardLevel[j])) < clRule))
+        CLcutoff = self.CLcutoff
+        if self.legacyCL and self.mode == 'CL' and table.trophies[i] <= self.CLcutoff:
+            CLcutoff = 5000 #ladderSim2.findOppCL calls allowMatch with its default CLcutoff
+        return table.allowMatch(i, j, mode = self.mode, cardLvlRule = self.cardLvlRule, CLcutoff = CLcutoff,
+                                KTdiff = self.KTdiff, KTcutoff = self.KTcutoff)
+
+    def queueKey(self, table, i):
+        """Key of the queue row i waits in.  Only players that can never play each other need different queues,
+        KT and card level rules are handled by the MatchIndex query (see limits).  With legacyCL, the card level
+        of players at or below CLcutoff"""
+        if self.legacyCL and self.mode == 'CL' and table.trophies[i] <= self.CLcutoff:
+            return int(table.cardLevel[i])
+        return None
+
+    def searchKeys(self, table, i, key):
+        """Keys of the queues searched for an opponent of row i, in order.  Only the legacyCL card level queues
+        search several: the same level, then +1, -1, +2, -2 ... up to cardLvlRule levels away"""
+        if not self.legacyCL or key is None:
+            return [key]
+        keys = [key]
+        for diff in range(1, self.cardLvlRule + 1):
+            keys += [key + diff, key - diff]
+        return keys
+
+    def limits(self, table, i, waited = 0):
+        """(max KT difference, card level rule) an opponent of row i must be within. None where there is no limit.
+        Widened for an opponent that has waited"""
+        trophies = table.trophies[i]
+        ktDiff = None
+        clRule = None
+        if self.mode in ('KT', 'KTCL') and trophies <= self.KTcutoff:
+            ktDiff = self.KTdiff
+        if (self.mode == 'CL' and trophies <= self.CLcutoff) or self.mode == 'KTCL':
+            clRule = self.cardLvlRule
+        steps = self.widenSteps(waited)
+        if steps:
+            ktDiff = None if ktDiff is None else ktDiff + steps*self.widenKT
+            clRule = None if clRule is None else clRule + steps*self.widenCL
+        return ktDiff, clRule
+
+    def widenSteps(self, waited):
+        """Number of times the limits of a player that has waited have widened"""
+        if not self.widenEvery or waited <= 0:
+            return 0
+        return int(waited//self.widenEvery)
+
+    def widening(self):
+        """(every, trophies, kt, cl, maxWindow) widening of the MatchIndex query, None if the limits are fixed"""
+        if not self.widenEvery:
+            return None
+        return (self.widenEvery, self.widenTrophies, self.widenKT, self.widenCL, self.maxWindow)
+
+    def cap(self, table, i, j):
+        """Card level cap of a match between rows i and j, None if it isn't capped"""
+        if self.capList is None:
+            return None
+        return cap(min(int(table.trophies[i]), int(table.trophies[j])), self.capList)
+
+    def skips(self, table, i, draws):
+        """Checks if row i is playing something other than ladder (2v2, party) when drawn
+
+        Args:
+        draws: the engine's RandomBlock
+        """
+        return self.partySkip and draws.random() < table.pp[i]
+
+    def weights(self, table):
+        """Chance of every row playing ladder when drawn, the weights of the engine's EligibleSampler.
+        Must agree with skips: a pp below 0 never skips (weight 1) and one above 1 always does (weight 0)"""
+        if self.partySkip:
+            return np.clip(1 - table.pp.astype(np.float64), 0, 1)
+        return np.ones(len(table))
+
+
+class LadderEngine():
+    """
+    Runs matches on a PlayerTable following a MatchPolicy.
+    Players are drawn at random, matched against the closest allowed player in their queue (one MatchIndex query),
+    and queued if there is no allowed opponent.  Matches are played in batches (batchMatch.MatchBatch).
+    Queues are kept between calls of run, so a season can be played in several parts.
+
+    Attributes:
+        table: PlayerTable
+        policy: MatchPolicy
+        queues: dict, queue key -> MatchIndex
+        queued: dict, queued row -> key of its queue
+        rng: numpy Generator of the engine
+        draws: RandomBlock of rng, used for drawing players and party skips
+        batch: MatchBatch of pending matches
+        maxQueueSize: largest number of queued players seen
+        now: number of draws made, the clock queue waits are measured with
+        season: int, current season, increased by endSeason
+        observers: list of observers of the run (see addObserver)
+        sampler: optional EligibleSampler drawing only players that aren't queued, weighted by policy.weights
+        telemetry: optional telemetry.Telemetry counting draws, rejections and timings (see Telemetry.attach)
+    Methods:
+        run
+        endSeason
+        addObserver
+        enqueue
+        dequeue
+        leave
+    """
+    def __init__(self, table, policy, batchSize = 4096, rng = None, sampler = False):
+        """Args:
+            table: PlayerTable
+            policy: MatchPolicy
+            batchSize: int, number of matches played per batch
+            rng: seed or numpy Generator (see rngStreams.makeRng).  Draws and matches both come from it
+            sampler: bool, draws players with an EligibleSampler instead of drawing anyone and skipping queued
+                     players and party skips.  Same arrival distribution with no wasted draws, but different random numbers
+        """
+        self.table = table
+        self.policy = policy
+        self.queues = {}
+        self.queued = {}
+        self.rng = makeRng(rng)
+        self.draws = RandomBlock(self.rng)
+        self.sampler = EligibleSampler(policy.weights(table), rng = self.rng) if sampler else None
+        self.batch = MatchBatch(table, gatesList = policy.gatesList, size = batchSize, rng = self.rng)
+        self.maxQueueSize = 0
+        self.now = 0
+        self.season = 1
+        self.observers = []
+        self.telemetry = None
+
+    def addObserver(self, observer):
+        """Adds an observer of the run.  observer.onBatch(table, BatchResult) is called after every played batch,
+        and observer.onSeasonEnd(table, season) (if it has one) before every season reset"""
+        self.observers.append(observer)
+        self.batch.listeners.append(observer.onBatch)
+
+    def findOpponent(self, i, key):
+        """Returns the closest allowed opponent of row i in the queue of key, or None"""
+        if self.policy.legacyCL:
+            return self._legacyOpponent(i, key)
+        queue = self.queues.get(key)
+        if not queue:
+            if self.telemetry is not None:
+                self.telemetry.reject('emptyQueue')
+            return None
+        table = self.table
+        policy = self.policy
+        ktDiff, clRule = policy.limits(table, i)
+        rejections = None if self.telemetry is None else self.telemetry.rejections
+        widen = policy.widening()
+        if widen is None:
+            accept = lambda j: policy.eligible(table, i, j)
+        else:
+            accept = lambda j: policy.eligible(table, i, j, waited = self.now - queue.attrs[j][2])
+        return queue.query(int(table.trophies[i]), int(table.kt[i]), int(table.cardLevel[i]), window = policy.window,
+                           ktDiff = ktDiff, clRule = clRule, accept = accept, rejections = rejections,
+                           now = self.now, widen = widen)
+
+    def _legacyOpponent(self, i, key):
+        """findOpponent of policy.legacyCL: the first of policy.searchKeys' queues whose TrophyQueue.above player
+        is eligible, or None"""
+        table = self.table
+        trophies = int(table.trophies[i])
+        seen = False
+        for k in self.policy.searchKeys(table, i, key):
+            queue = self.queues.get(k)
+            if not queue:
+                continue
+            seen = True
+            opponent = queue.above(trophies)
+            if self.policy.eligible(table, i, opponent):
+                return opponent
+            if self.telemetry is not None:
+                self.telemetry.reject('legacyCL')
+        if not seen and self.telemetry is not None:
+            self.telemetry.reject('emptyQueue')
+        return None
+
+    def enqueue(self, i, key):
+        """Queues row i in the queue of key.  If policy.maxQueue players are already queued, the one that
+        has waited longest leaves first (see leave)"""
+        maxQueue = self.policy.maxQueue
+        if maxQueue is not None and len(self.queued) >= maxQueue:
+            self.leave(next(iter(self.queued))) #queued is in queueing order
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = MatchIndex()
+        table = self.table
+        queue.add(i, int(table.trophies[i]), int(table.kt[i]), int(table.cardLevel[i]), since = self.now)
+        self.queued[i] = key
+        if self.sampler is not None:
+            self.sampler.exclude(i)
+        self.maxQueueSize = max(self.maxQueueSize, len(self.queued))
+
+    def dequeue(self, i):
+        """Removes row i from its queue.  Returns the time it was queued at"""
+        queue = self.queues[self.queued.pop(i)]
+        since = queue.attrs[i][2]
+        queue.remove(i)
+        if self.sampler is not None:
+            self.sampler.include(i)
+        return since
+
+    def leave(self, i):
+        """Row i gives up waiting to make room in full queues"""
+        self.dequeue(i)
+        if self.telemetry is not None:
+            self.telemetry.count('left')
+
+    def step(self):
+        """Draws one player and matches or queues them.  Returns True if a match was made"""
+        table = self.table
+        telemetry = self.telemetry
+        self.now += 1
+        if self.sampler is None:
+            newPlayer = self.draws.randrange(len(table))
+        else:
+            newPlayer = self.sampler.draw()
+        if telemetry is not None:
+            telemetry.onDraw(self)
+        if newPlayer in self.batch:
+            if telemetry is not None:
+                telemetry.count('flushes')
+            self.batch.flush() #newPlayer's trophies are out of date until its match is played
+        if newPlayer in self.queued:
+            if telemetry is not None:
+                telemetry.reject('self')
+            return False #can't play against themself
+        if self.sampler is None and self.policy.skips(table, newPlayer, self.draws):
+            if telemetry is not None:
+                telemetry.reject('partySkip')
+            return False
+        key = self.policy.queueKey(table, newPlayer)
+        opponent = self.findOpponent(newPlayer, key)
+        if opponent is None:
+            if telemetry is not None:
+                telemetry.count('queued')
+            self.enqueue(newPlayer, key)
+            return False
+        self.dequeue(opponent)
+        self.batch.add(newPlayer, opponent, cap = self.policy.cap(table, newPlayer, opponent))
+        if telemetry is not None:
+            telemetry.onMatch()
+        return True
+
+    def run(self, numMatches, progress = True, flush = True):
+        """Plays numMatches matches and plays every pending match before returning
+
+        Args:
+        numMatches: int, number of matches to play
+        progress: bool, prints the number of matches played every 10%
+        flush: bool, if False the last matches can be left pending in the batch.  Splitting a run into
+               several calls with flush = False gives exactly the same results as one call
+        """
+        start = time.perf_counter()
+        matchesPlayed = 0
+        while matchesPlayed < numMatches:
+            if self.step():
+                matchesPlayed += 1
+                if progress and matchesPlayed %max(1, numMatches//10) == 0:
+                    print(matchesPlayed)
+        if flush:
+            self.batch.flush()
+        if self.telemetry is not None:
+            self.telemetry.addRun(time.perf_counter() - start)
+        return self.table
+
+    def endSeason(self):
+        """Season reset: resets every player's trophies and empties the queues"""
+        self.batch.flush()
+        for observer in self.observers:
+            if hasattr(observer, "onSeasonEnd"):
+                observer.onSeasonEnd(self.table, self.season)
+        self.season += 1
+        self.table.reset()
+        self.queues = {} #queued trophies are stale after the reset
+        self.queued = {}
+        if self.sampler is not None:
+            self.sampler.reset()
@@ -0,0 +1,174 @@
+import os
+import math
+import time
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import pandas as pd
+from sweep import DEFAULTS, runConfig
+from rngStreams import spawn
+
+#Replica ensembles.  One run of a configuration is one draw of a random process, so two runs (like inf7000_2KT.csv
+#and inf7000_2noKT.csv) can differ by noise alone.  runEnsembles runs independent replicas of every configuration
+#(sweep.runConfig, each with its own random stream) on a process pool and summarizes each king tower's metrics
+#over the replicas: mean, standard deviation and a Student t confidence interval of the mean.
+#Replicas are added to a configuration until every king tower's interval is narrower than its target (TARGETS) or
+#maxReplicas is reached, so configurations that are already precise stop using the workers.  A configuration stops
+#at the first n replicas (in stream order) that reach the target, whatever order they finish in, so the results
+#don't depend on the number of workers; replicas started past n are dropped.
+#compareEnsembles gives the difference of two configurations with a Welch confidence interval.
+#Scripts calling runEnsembles should do it under if __name__ == "__main__": so the worker processes can import them.
+
+METRICS = ["Trophies", "MedianTrophies", "LvlDiffPerMatch", "WinRate"] #sweep.ktSummary columns
+TARGETS = {"Trophies": 10.0} #metric -> largest half width of the confidence interval, in the metric's units
+
+
+def tQuantile(p, df):
+    """Quantile p of Student's t distribution with df degrees of freedom (exact for df 1 and 2, the Cornish-Fisher
+    expansion of the normal quantile above, within 0.01 of the exact value)"""
+    if df == 1:
+        return math.tan(math.pi*(p - 0.5))
+    if df == 2:
+        return (2*p - 1)/math.sqrt(2*p*(1 - p))
+    z = NormalDist().inv_cdf(p)
+    terms = [(z**3 + z)/4,
+             (5*z**5 + 16*z**3 + 3*z)/96,
+             (3*z**7 + 19*z**5 + 17*z**3 - 15*z)/384,
+             (79*z**9 + 776*z**7 + 1482*z**5 - 1920*z**3 - 945*z)/92160]
+    return z + sum(term/df**power for power, term in enumerate(terms, 1))
+
+
+def aggregate(replicas, metrics = METRICS, confidence = 0.95):
+    """Summary of replicas by king tower
+
+    Args:
+    replicas: data frame of sweep.runConfig results, one row per replica and king tower
+    metrics: list of columns to summarize
+    confidence: float, level of the confidence intervals
+    Returns: data frame with one row per king tower: Replicas, Players (mean) and for every metric its mean,
+             <metric>SD, <metric>Low, <metric>High and <metric>HalfWidth (infinite with one replica)
+    """
+    rows = []
+    for kt, group in replicas.groupby("King Tower"):
+        n = len(group)
+        row = {"King Tower": kt, "Replicas": n, "Players": group["Players"].mean()}
+        t = tQuantile((1 + confidence)/2, n - 1) if n > 1 else np.inf
+        for metric in metrics:
+            mean = group[metric].mean()
+            sd = group[metric].std(ddof = 1) if n > 1 else np.nan
+            half = t*sd/math.sqrt(n) if n > 1 else np.inf
+            row.update({metric: mean, metric + "SD": sd, metric + "Low": mean - half, metric + "High": mean + half,
+                        metric + "HalfWidth": half})
+        rows += [row]
+    return pd.DataFrame(rows)
+
+
+def precise(summary, targets = TARGETS):
+    """True if every king tower's confidence interval of every metric in targets is within its target half width"""
+    return all((summary[metric + "HalfWidth"] <= target).all() for metric, target in targets.items())
+
+
+def compareEnsembles(a, b, metrics = METRICS, confidence = 0.95):
+    """Difference b - a of two ensembles by king tower, with Welch confidence intervals
+
+    Args:
+    a, b: replica data frames of two configurations (see runEnsembles)
+    Returns: data frame with one row per king tower and metric: Difference, Low, High, and Significant if the
+             interval excludes 0
+    """
+    rows = []
+    for kt in sorted(set(a["King Tower"]) & set(b["King Tower"])):
+        x = a[a["King Tower"] == kt]
+        y = b[b["King Tower"] == kt]
+        for metric in metrics:
+            varX = x[metric].var(ddof = 1)/len(x)
+            varY = y[metric].var(ddof = 1)/len(y)
+            diff = y[metric].mean() - x[metric].mean()
+            se = math.sqrt(varX + varY)
+            if len(x) < 2 or len(y) < 2 or se == 0:
+                half = np.inf if len(x) < 2 or len(y) < 2 else 0.0
+            else: #Welch-Satterthwaite degrees of freedom
+                df = (varX + varY)**2/(varX**2/(len(x) - 1) + varY**2/(len(y) - 1))
+                half = tQuantile((1 + confidence)/2, max(df, 1))*se
+            rows += [{"King Tower": kt, "Metric": metric, "Difference": diff, "Low": diff - half, "High": diff + half,
+                      "Significant": bool(diff - half > 0 or diff + half < 0)}]
+    return pd.DataFrame(rows)
+
+
+def runEnsembles(grid, population, matchesPerSzn, seasons = 5, seed = 0, workers = None, minReplicas = 3,
+                 maxReplicas = 20, targets = TARGETS, confidence = 0.95, outFile = None):
+    """Runs replicas of every configuration of grid in parallel until each one is precise enough
+
+    Args:
+    grid: list of configuration dicts (see sweep.makeGrid)
+    population: PlayerTable or csv file name, the starting players of every replica
+    matchesPerSzn: int, matches played per season
+    seasons: int, number of seasons per replica
+    seed: int, base seed.  Every configuration gets its own stream spawned from it, and every replica its own
+          stream spawned from the configuration's
+    workers: int, number of processes.  Defaults to every core
+    minReplicas, maxReplicas: ints, replicas of a configuration before its precision is checked, and at most
+    targets: dict, metric -> largest half width of the confidence intervals (see TARGETS)
+    confidence: float, level of the confidence intervals
+    outFile: optional csv file name to store the summary in
+    Returns: (summary data frame with one row per configuration and king tower (see aggregate) plus its task
+             number and whether it reached the targets, data frame of every kept replica)
+    """
+    workers = workers or os.cpu_count()
+    minReplicas = max(minReplicas, 2)
+    streams = [spawn(s, maxReplicas) for s in spawn(seed, len(grid))]
+    done = [{} for _ in grid] #task -> replica number -> summary
+    kept = [None]*len(grid) #task -> number of replicas once it has stopped
+    nextReplica = [0]*len(grid)
+    running = {}
+    start = time.perf_counter()
+
+    def check(n):
+        """Stops task n at the first prefix of replicas that reaches the targets (or maxReplicas)"""
+        count = 0
+        while count in done[n]:
+            count += 1
+            if count >= minReplicas and (count == maxReplicas or precise(aggregate(pd.concat([done[n][r] for r in range(count)]),
+                                                                                   list(targets), confidence), targets)):
+                kept[n] = count
+                print(f"[{sum(k is not None for k in kept)}/{len(grid)}] {grid[n]} stopped after {count} replicas")
+                return
+
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        while any(k is None for k in kept):
+            #fill the pool, least replicas first, so every configuration reaches minReplicas early
+            while len(running) < workers:
+                waiting = [n for n in range(len(grid)) if kept[n] is None and nextReplica[n] < maxReplicas]
+                if not waiting:
+                    break
+                n = min(waiting, key = lambda n: nextReplica[n])
+                future = pool.submit(runConfig, grid[n], population, matchesPerSzn, seasons, streams[n][nextReplica[n]])
+                running[future] = (n, nextReplica[n])
+                nextReplica[n] += 1
+            finished, _ = wait(running, return_when = FIRST_COMPLETED)
+            for future in finished:
+                n, replica = running.pop(future)
+                if kept[n] is None:
+                    done[n][replica] = future.result().assign(task = n, replica = replica)
+                    check(n)
+        for future in running:
+            future.cancel()
+    replicas = pd.concat([done[n][r] for n in range(len(grid)) for r in range(kept[n])], ignore_index = True)
+    summaries = []
+    for n, config in enumerate(grid):
+        summary = aggregate(replicas[replicas["task"] == n], confidence = confidence)
+        summary.insert(0, "Precise", precise(summary, targets))
+        for key, value in reversed(list(dict(DEFAULTS, **config).items())):
+            summary.insert(0, key, [value]*len(summary))
+        summary.insert(0, "task", n)
+        summaries += [summary]
+    df = pd.concat(summaries, ignore_index = True)
+    print(f"{len(grid)} configurations, {sum(kept)} replicas in {time.perf_counter() - start:.1f} s")
+    if outFile is not None:
+        df.to_csv(outFile, index = False)
+    return df, replicas
+
+
+def runEnsemble(config, population, matchesPerSzn, seasons = 5, **kwargs):
+    """runEnsembles of one configuration"""
+    return runEnsembles([config], population, matchesPerSzn, seasons, **kwargs)
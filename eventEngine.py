@@ -0,0 +1,229 @@
+import math
+import heapq
+import numpy as np
+import pandas as pd
+from engine import LadderEngine
+
+#Discrete event version of the LadderEngine.  Instead of drawing players, every player arrives on ladder at random
+#times (a Poisson process whose rate is scaled by their chance of playing ladder, MatchPolicy.weights), searches for
+#an opponent with the same policy, MatchIndex queries and batches as the LadderEngine, and waits in the queue until
+#an opponent arrives or they time out.  Events are kept in a heap, so the clock jumps from one event to the next.
+#The wait of every search is recorded by king tower and trophy range.  Policies with widening limits (widenEvery)
+#widen them per second waited.
+
+ARRIVAL = 0
+TIMEOUT = 1
+TROPHY_RANGES = [4000, 5000, 5300, 5600, 6000, 6300, 6600, 7000] #lower edges of the trophy ranges after the first
+WAIT_BINS = np.concatenate(([0], np.logspace(0, 5, 51))) #seconds, everything longer goes in the last bin
+KINGS = np.arange(8, 15)
+
+
+class WaitStats():
+    """
+    Histograms of the wait of every search (seconds from joining the search to the match, 0 if an opponent was
+    already queued) and counts of timeouts, by trophy range and king tower.
+
+    Attributes:
+        counts: array [trophy range, king tower, wait bin] of matched searches
+        totals: array [trophy range, king tower] of summed waits
+        timeouts: array [trophy range, king tower] of searches that timed out
+    Methods:
+        record
+        timeout
+        toFrame
+    """
+    def __init__(self):
+        shape = (len(TROPHY_RANGES) + 1, KINGS.size)
+        self.counts = np.zeros(shape + (WAIT_BINS.size,), dtype = np.int64)
+        self.totals = np.zeros(shape)
+        self.timeouts = np.zeros(shape, dtype = np.int64)
+        self._pending = ([], [], [])
+
+    def record(self, trophies, kt, wait):
+        """Adds a matched search (collected and added to the histograms a few thousand at a time)"""
+        trophyList, ktList, waitList = self._pending
+        trophyList.append(trophies)
+        ktList.append(kt)
+        waitList.append(wait)
+        if len(waitList) >= 4096:
+            self._flush()
+
+    def _flush(self):
+        trophyList, ktList, waitList = self._pending
+        if not waitList:
+            return
+        ranges = np.searchsorted(TROPHY_RANGES, trophyList, side = "right")
+        kts = np.clip(np.asarray(ktList) - KINGS[0], 0, KINGS.size - 1)
+        waits = np.asarray(waitList)
+        bins = np.minimum(np.searchsorted(WAIT_BINS, waits, side = "right"), WAIT_BINS.size - 1)
+        np.add.at(self.counts, (ranges, kts, bins), 1)
+        np.add.at(self.totals, (ranges, kts), waits)
+        self._pending = ([], [], [])
+
+    def timeout(self, trophies, kt):
+        """Adds a search that timed out"""
+        self.timeouts[np.searchsorted(TROPHY_RANGES, trophies, side = "right"), min(max(kt - KINGS[0], 0), KINGS.size - 1)] += 1
+
+    def toFrame(self, by = "King Tower"):
+        """Wait time distribution as a data frame, one row per group
+
+        Args:
+        by: 'King Tower', 'Trophies' (trophy range) or None (one row per trophy range and king tower)
+        Returns: columns Searches, Timeouts, Timeout Rate, Mean Wait and the 50th, 90th and 99th percentile waits
+        (upper edges of the histogram bins)
+        """
+        self._flush()
+        labels = [f"<{TROPHY_RANGES[0]}"] + [f"{low}+" for low in TROPHY_RANGES]
+        if by == "King Tower":
+            groups = [({"King Tower": kt}, (slice(None), n)) for n, kt in enumerate(KINGS)]
+        elif by == "Trophies":
+            groups = [({"Trophies": label}, (n, slice(None))) for n, label in enumerate(labels)]
+        elif by is None:
+            groups = [({"Trophies": label, "King Tower": kt}, (r, n)) for r, label in enumerate(labels) for n, kt in enumerate(KINGS)]
+        else:
+            raise ValueError(f"Unknown group: {by}")
+        rows = []
+        for keys, index in groups:
+            hist = self.counts[index].reshape(-1, WAIT_BINS.size).sum(axis = 0)
+            matched = int(hist.sum())
+            timeouts = int(np.sum(self.timeouts[index]))
+            row = dict(keys, Searches = matched + timeouts, Timeouts = timeouts,
+                       **{"Timeout Rate": timeouts/(matched + timeouts) if matched + timeouts else np.nan,
+                          "Mean Wait": float(np.sum(self.totals[index]))/matched if matched else np.nan})
+            cumulative = np.cumsum(hist)
+            for q in (50, 90, 99):
+                row[f"P{q} Wait"] = float(WAIT_BINS[np.searchsorted(cumulative, q/100*matched)]) if matched else np.nan
+            rows += [row]
+        return pd.DataFrame(rows)
+
+
+class EventEngine(LadderEngine):
+    """
+    LadderEngine driven by a clock.  step() handles the next event: a player arriving (searching, like a draw of the
+    LadderEngine) or a queued player timing out.  run(numMatches) plays matches as usual and runFor(seconds)
+    plays until the clock reaches a time.
+
+    Attributes:
+        now: float, current time in seconds
+        rates: list of float, searches per second of every row when not playing or searching
+        matchLength: float, seconds a match lasts (no searches in between)
+        timeout: float, seconds a queued player waits before giving up, None to wait forever.  Players pushed out
+                 of full queues (policy.maxQueue) count as timeouts too
+        events: heap of (time, row, kind, token) events
+        waits: WaitStats
+    Methods:
+        nextTime
+        runFor
+        leave
+        endSeason
+    """
+    def __init__(self, table, policy, batchSize = 4096, rng = None, rate = 1/3600, matchLength = 180, timeout = 120):
+        """Args:
+            table, policy, batchSize, rng: like the LadderEngine
+            rate: float, searches per second of a player that always plays ladder (pp = 0).  Each player's rate
+                  is this times policy.weights
+            matchLength: float, seconds a match lasts
+            timeout: float, seconds before a queued player leaves the queue, None for no timeout
+        """
+        super().__init__(table, policy, batchSize = batchSize, rng = rng)
+        self.rates = (np.clip(policy.weights(table), 0, 1)*rate).tolist() #a ladder play chance, like the legacy skip
+        self.matchLength = matchLength
+        self.timeout = timeout
+        self.now = 0.0
+        self.tokens = [0]*len(table)
+        self.waits = WaitStats()
+        self.events = []
+        for row, r in enumerate(self.rates):
+            if r > 0:
+                self.events.append((self._gap(r), row, ARRIVAL, 0))
+        heapq.heapify(self.events)
+
+    def _gap(self, rate):
+        """Exponential time until the next arrival at rate"""
+        return -math.log(1.0 - self.draws.random())/rate
+
+    def _schedule(self, row, time, kind):
+        """Makes (time, kind) the only live event of row"""
+        self.tokens[row] += 1
+        heapq.heappush(self.events, (time, row, kind, self.tokens[row]))
+
+    def _arriveLater(self, row, start):
+        """Schedules the next arrival of row after start"""
+        if self.rates[row] > 0:
+            self._schedule(row, start + self._gap(self.rates[row]), ARRIVAL)
+        else:
+            self.tokens[row] += 1
+
+    def nextTime(self):
+        """Time of the next event (dropping the events that were replaced), None if there are none"""
+        events = self.events
+        while events and events[0][3] != self.tokens[events[0][1]]:
+            heapq.heappop(events)
+        return events[0][0] if events else None
+
+    def step(self):
+        """Handles the next event.  Returns True if a match was made"""
+        if self.nextTime() is None:
+            raise RuntimeError("No player ever searches for a match")
+        time, row, kind, token = heapq.heappop(self.events)
+        tokens = self.tokens
+        self.now = time
+        table = self.table
+        telemetry = self.telemetry
+        if kind == TIMEOUT:
+            self.dequeue(row)
+            self.waits.timeout(int(table.trophies[row]), int(table.kt[row]))
+            if telemetry is not None:
+                telemetry.count('timeouts')
+            self._arriveLater(row, time)
+            return False
+        if telemetry is not None:
+            telemetry.onDraw(self)
+        if row in self.batch:
+            self.batch.flush() #row's trophies are out of date until its match is played
+        key = self.policy.queueKey(table, row)
+        opponent = self.findOpponent(row, key)
+        if opponent is None:
+            self.enqueue(row, key)
+            if self.timeout is not None:
+                self._schedule(row, time + self.timeout, TIMEOUT)
+            else:
+                tokens[row] += 1
+            if telemetry is not None:
+                telemetry.count('queued')
+            return False
+        since = self.dequeue(opponent)
+        self.waits.record(int(table.trophies[row]), int(table.kt[row]), 0.0)
+        self.waits.record(int(table.trophies[opponent]), int(table.kt[opponent]), time - since)
+        self.batch.add(row, opponent, cap = self.policy.cap(table, row, opponent))
+        self._arriveLater(row, time + self.matchLength)
+        self._arriveLater(opponent, time + self.matchLength)
+        if telemetry is not None:
+            telemetry.onMatch()
+        return True
+
+    def leave(self, row):
+        """row gives up waiting to make room in full queues (a timeout) and searches again later"""
+        super().leave(row)
+        self.waits.timeout(int(self.table.trophies[row]), int(self.table.kt[row]))
+        self._arriveLater(row, self.now)
+
+    def runFor(self, seconds, flush = True):
+        """Handles events until the clock has advanced by seconds.  Returns the number of matches made"""
+        end = self.now + seconds
+        matches = 0
+        while True:
+            time = self.nextTime()
+            if time is None or time > end:
+                break
+            matches += self.step()
+        self.now = max(self.now, end)
+        if flush:
+            self.batch.flush()
+        return matches
+
+    def endSeason(self):
+        """Season reset.  Queued players leave the queue and search again later"""
+        for row in list(self.queued):
+            self._arriveLater(row, self.now)
+        super().endSeason()
@@ -0,0 +1,65 @@
+from matplotlib import pyplot as plt
+import seaborn as sns
+from ladderSim2 import arrToDF, cardGroups
+
+#Plots of simulation results.  matplotlib and seaborn take seconds to import, so they are only imported
+#with this module, when a plot is asked for (ladderSim2.plots, runSim.py --plots).  Simulations never import it.
+
+PALETTE = sns.color_palette("mako_r", as_cmap=True)
+
+
+def plots(data, filename):
+    """Makes 6 plots from the data and saves them:
+    Bar graph of Lvl diff/Match vs King Tower
+    Bar graph of lvl diff/match vs card level
+    Histogram of Trophies and King Tower
+    Histogram of card levels and king tower
+    Scatterplot of card lvls vs trophies
+    Scatterplot of lvl diff/match vs trophies
+    
+    Args: 
+    data: Numpy array of player objects or a PlayerTable
+    filename: String to be used as the file name
+    """
+    df = arrToDF(data)
+    df2 = df.assign(**{"Card Level": cardGroups(df["Card Level"])}) #same as arrToDF(sepByCards(data)) without copying players
+    plt.figure(figsize = (6, 6))
+    sns.barplot(x = "King Tower", y = "LvlDiff/Match", data = df)
+    plt.savefig(filename + '1')
+    plt.close()
+    
+    plt.figure(figsize = (20,6))
+    sns.barplot(x = "Card Level", y = "LvlDiff/Match", data = df)
+    plt.xticks(rotation = -45)
+    plt.savefig(filename + '2')
+    plt.close()
+
+    plt.figure(figsize = (20, 8))
+    sns.histplot(data = df,
+            x = 'Trophies', 
+            hue = 'King Tower',
+            stat = 'count',
+            palette = PALETTE,
+            multiple = 'stack')
+    plt.savefig(filename + '3')
+    plt.close()
+
+    plt.figure(figsize = (20, 8))
+    sns.histplot(data=df2, 
+             x = 'Trophies',
+             hue = 'Card Level',
+             stat = 'count',
+             palette = sns.color_palette("CMRmap_r", n_colors = 13),
+             multiple = 'stack')
+    plt.savefig(filename + '4')
+    plt.close()
+    
+    plt.figure(figsize = (16, 8))    
+    sns.relplot(data = df, x = "Trophies", y = "Card Level", hue = "King Tower", palette = PALETTE)
+    plt.savefig(filename + '5')
+    plt.close()
+
+    plt.figure(figsize = (20, 8))
+    sns.relplot(data = df, x='Trophies', y = 'LvlDiff/Match', hue = 'King Tower', palette = PALETTE)
+    plt.savefig(filename + '6')
+    plt.close()
@@ -0,0 +1,117 @@
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+import numpy as np
+
+#Ladder rules as lookup tables.  Each rule that depends on a player's trophies is a Breakpoints table
+#(trophy breakpoints -> value of every range), and one kernel applies it to a single trophy count or to a
+#whole array at once.  Trying a different rule means passing a different table, not editing the simulations.
+
+
+class Breakpoints():
+    """
+    Piecewise constant function of trophies.  With breakpoints [b1, b2] and values [v0, v1, v2],
+    trophies below b1 get v0, from b1 up to b2 get v1 and from b2 up get v2 (right = True).
+    With right = False a trophy count equal to a breakpoint belongs to the range below it.
+
+    Attributes:
+        breakpoints: array of increasing trophy counts
+        values: array, one more value than breakpoints
+        right: bool, side a breakpoint belongs to
+    Methods:
+        __call__
+        toDict
+    """
+    def __init__(self, breakpoints, values, right = True):
+        """Args:
+            breakpoints: list of increasing trophy counts
+            values: list of len(breakpoints) + 1 values
+            right: bool, a trophy count equal to a breakpoint gets the value above it
+        """
+        if len(values) != len(breakpoints) + 1:
+            raise ValueError("Breakpoints need one more value than breakpoints")
+        if list(breakpoints) != sorted(breakpoints):
+            raise ValueError("Breakpoints must be increasing")
+        self.breakpoints = np.asarray(breakpoints)
+        self.values = np.asarray(values)
+        self.right = right
+        self._breakpoints = list(breakpoints)
+        self._values = list(values)
+
+    def __repr__(self):
+        """String representation of a table"""
+        return f"Breakpoints({self._breakpoints}, {self._values}, right = {self.right})"
+
+    def __call__(self, trophies):
+        """Value of every trophy count.  A number gives a number, an array gives an array"""
+        if isinstance(trophies, (int, float)) or np.ndim(trophies) == 0:
+            find = bisect_right if self.right else bisect_left
+            return self._values[find(self._breakpoints, trophies)]
+        side = "right" if self.right else "left"
+        return self.values[np.searchsorted(self.breakpoints, trophies, side = side)]
+
+    def toDict(self):
+        """The table as a json serializable dict (Breakpoints(**d) rebuilds it)"""
+        return {"breakpoints": self._breakpoints, "values": self._values, "right": self.right}
+
+
+RESET_BASE = 5000
+RESET_FACTOR = Breakpoints([5000, 6000, 7000], [0, 0.5, 0.4, 0.3]) #share of the trophies above RESET_BASE lost
+RESET_CEILING = Breakpoints([7000], [np.inf, 6600]) #most trophies kept
+LOSS_PERCENT = Breakpoints([5000, 5300, 6000], [1, 0.8, 0.9, 1]) #share of the exchanged trophies the loser loses
+
+
+def seasonReset(trophies, factor = RESET_FACTOR, ceiling = RESET_CEILING, base = RESET_BASE):
+    """Season reset (Player.reset) of one trophy count or an array of them:
+    trophies - factor*(trophies - base), rounded towards zero, then lowered to ceiling
+
+    Returns: int for a number, int64 array for an array
+    """
+    if np.ndim(trophies) == 0:
+        new = int(trophies - factor(trophies)*(trophies - base))
+        return int(min(new, ceiling(trophies)))
+    t = np.asarray(trophies, dtype = np.float64)
+    new = np.trunc(t - factor(t)*(t - base))
+    return np.minimum(new, ceiling(t)).astype(np.int64)
+
+
+def lossPercent(trophies, table = LOSS_PERCENT):
+    """Share of the exchanged trophies lost at trophies (player.lossPercent), for a number or an array"""
+    return table(trophies)
+
+
+def applyGates(newTrophies, original, gatesList):
+    """Raises newTrophies to the lowest gate that was passed on the way down from original
+    (the first one in gatesList for the ascending lists every simulation uses)
+
+    Args:
+    newTrophies, original: arrays of trophies after and before the loss
+    gatesList: List of trophy gates
+    """
+    newTrophies = np.asarray(newTrophies)
+    if not gatesList:
+        return newTrophies.copy()
+    gates = np.sort(np.asarray(gatesList, dtype = np.int64))
+    above = np.searchsorted(gates, newTrophies, side = "right") #first gate above newTrophies
+    gate = gates[np.minimum(above, gates.size - 1)]
+    return np.where((above < gates.size) & (gate <= original), gate, newTrophies)
+
+
+@lru_cache(maxsize = 64)
+def capTable(capList):
+    """Card level caps of a trophy cap list (see ladderSim2.trophyCapSim) as Breakpoints: 64 below the first
+    trophy count, 8 more after each one.  A trophy count equal to a breakpoint keeps the lower cap
+
+    Args:
+    capList: tuple of increasing trophy counts
+    """
+    return Breakpoints(list(capList), [(8 + n)*8 for n in range(len(capList) + 1)], right = False)
+
+
+def cap(trophies, capList):
+    """Card level cap at trophies (a number or an array) for capList"""
+    return capTable(tuple(capList))(trophies)
+
+
+def capLevels(cardLevels, trophies, capList):
+    """Card levels capped by the trophies of each player (ladderSim2.capByTrophies) as an array"""
+    return np.minimum(cardLevels, cap(np.asarray(trophies), capList))
@@ -2,34 +2,61 @@ import random
 import player as pl
 import pandas as pd
 import numpy as np
-import matplotlib as mpl
-from matplotlib import pyplot as plt
-import seaborn as sns
+import tableSim as ts
+import ladderRules as lr
+from playerTable import PlayerTable
+from rngStreams import makeRng
 
 #Global variables
 COLS = ["ID", "Trophies", "Wins","Losses", "King Tower", "Card Level","Total Level Difference", "LvlDiff/Match"]
-PALETTE = sns.color_palette("mako_r", as_cmap=True)
+CARD_BINS = [60, 64, 68, 72, 76, 80, 84, 88, 92, 96, 100, 104, 108] #lower edges of the card level groups
+CARD_LABELS = ['60-63', '64-67', '68-71', '72-75', '76-79', '80-83', '84-87', '88-91', '92-95', '96-99', '100-103', '104-107', '108-112']
 
 
-def createArray(numPlayers, trophies):
+def __getattr__(name):
+    """PALETTE moved to ladderPlots with the plots, ladderSim2.PALETTE still gives it (importing seaborn then)"""
+    if name == "PALETTE":
+        import ladderPlots
+        return ladderPlots.PALETTE
+    raise AttributeError(f"module 'ladderSim2' has no attribute '{name}'")
+
+def seedLegacy(seed):
+    """Seeds the random module used by the player object simulations. Does nothing if seed is None
+    Args:
+    seed: int, SeedSequence or numpy Generator"""
+    if seed is None:
+        return None
+    if not isinstance(seed, int):
+        seed = int(makeRng(seed).integers(2**63))
+    random.seed(seed)
+
+def createArray(numPlayers, trophies, seed = None, skill = None):
     """Creates an array of player objects
     
     Args:
     numPlayers: Integer, number of player objects to be created
     trophies: the starting number of trophies
+    seed: optional seed of the random module
+    skill: optional skill of every player.  Players without one can't play a match between equal levels
     """
-    playerList = [pl.createPlayer(random.choice(range(8,15)), id = i, trophies= trophies) for  i in range(numPlayers)]
+    seedLegacy(seed)
+    playerList = [pl.createPlayer(random.choice(range(8,15)), id = i, trophies= trophies, skill = skill) for  i in range(numPlayers)]
     return np.asarray(playerList)
 
-def simulate(numPlayers, initialTrophies, numMatches, gatesList = [5000]):
+def simulate(numPlayers, initialTrophies, numMatches, gatesList = [5000], useTable = False, seed = None, skill = None):
     """Simulates the CR ladder with numPlayers players starting at initialTrophies
     Used to set a baseline for uniform distribution of players across KTs
     plays numMatches matches
     Args:  numPlayers - int, number of players in the ladder
     initialTrophies - int, initial starting numbr of trophies
     numMatches - int, Number of matches to play
+    useTable - bool, runs on a PlayerTable (much faster) and returns the table
+    seed - None, int, SeedSequence or numpy Generator. Makes the run reproducible
+    skill - optional skill of every player (see createArray), the table treats players without one as equally skilled
     """
-    playerArr = createArray(numPlayers, initialTrophies)
+    if useTable:
+        return ts.simulate(numPlayers, initialTrophies, numMatches, gatesList = gatesList, seed = seed)
+    playerArr = createArray(numPlayers, initialTrophies, seed = seed, skill = skill)
     queue = np.asarray([random.choice(playerArr)], dtype = object)
     matchesPlayed = 0
     maxQueueSize = 0
@@ -63,15 +90,19 @@ def simulate(numPlayers, initialTrophies, numMatches, gatesList = [5000]):
     print(f"Max queue size: {maxQueueSize}")
     return playerArr
 
-def continueSim(playerArr, numMatches, mode = None, cardLvlRule = 0, KTdiff = 0, KTcutoff = 5000, gatesList = [5000]):
-    """Continues a simulation for numMatches more games, Very slow if using mode isn't none
+def continueSim(playerArr, numMatches, mode = None, cardLvlRule = 0, KTdiff = 0, KTcutoff = 5000, gatesList = [5000], seed = None):
+    """Continues a simulation for numMatches more games, Very slow if using mode isn't none (use a PlayerTable instead)
     Args: 
     playerArr: Array of player objects.  
     numMatches: Number of matches to be played
     mode: The type of matchmaking to use.  Either 'KT', 'CL', 'KTCL'
     cardLvlRule: Int, the maximum difference in card levels allowed in a match
     KTdiff: The maximum difference in king tower between both players
-    KTcutoff: The maximum trophies where the KT diff rule applies. """
+    KTcutoff: The maximum trophies where the KT diff rule applies. 
+    seed: None, int, SeedSequence or numpy Generator. Makes the run reproducible"""
+    if isinstance(playerArr, PlayerTable):
+        return ts.continueSim(playerArr, numMatches, mode = mode, cardLvlRule = cardLvlRule, KTdiff = KTdiff, KTcutoff = KTcutoff, gatesList = gatesList, seed = seed)
+    seedLegacy(seed)
     queue = np.asarray([random.choice(playerArr)], dtype = object)
     matchesPlayed = 0
     maxQueueSize = 0
@@ -111,13 +142,17 @@ def continueSim(playerArr, numMatches, mode = None, cardLvlRule = 0, KTdiff = 0,
     playerArr.sort()
     return playerArr
 
-def KTsim(playerArr, numMatches, KTdiff = 1, KTcutoff = 6000, gatesList = [5000]):
+def KTsim(playerArr, numMatches, KTdiff = 1, KTcutoff = 6000, gatesList = [5000], seed = None):
     """Simulates a king tower matchmaking system, but uses separate queues to optimize performance
     Args: 
     playerArr: Array of player objects, sorted by trophies
     numMatches: number of matches to be played
     KTdiff: The difference in king tower between 2 players matched against each other
-    KTcutoff:  The point where king tower matchmaking ends"""
+    KTcutoff:  The point where king tower matchmaking ends
+    seed: None, int, SeedSequence or numpy Generator. Makes the run reproducible"""
+    if isinstance(playerArr, PlayerTable):
+        return ts.KTsim(playerArr, numMatches, KTdiff = KTdiff, KTcutoff = KTcutoff, gatesList = gatesList, seed = seed)
+    seedLegacy(seed)
     queueDict = {}
     for kt in range(8, 15):
         queueDict[str(kt)] = np.asarray([]) #separated queue for players under cutoff (MUCH FASTER)
@@ -155,13 +190,17 @@ def KTsim(playerArr, numMatches, KTdiff = 1, KTcutoff = 6000, gatesList = [5000]
     playerArr.sort()
     return playerArr
 
-def trophyCapSim(playerArr, numMatches, capList):
+def trophyCapSim(playerArr, numMatches, capList, seed = None):
     """Simulates the ladder when all matches are capped by the trophy range at which the match occurs. No King Tower, No Card Level mm
     Args:
     playerArr:  Array of player Objects
     numMatches: int-Number of matches to play.  
     capList:  List of 6 integers representing where card levels are capped. 
-    [5300, 5600, 6000, 6300, 6600, 7000] means matches below 5300 are capped at 64 levels, below 5600 is capped at 72 lvls and so on"""
+    [5300, 5600, 6000, 6300, 6600, 7000] means matches below 5300 are capped at 64 levels, below 5600 is capped at 72 lvls and so on
+    seed: None, int, SeedSequence or numpy Generator. Makes the run reproducible"""
+    if isinstance(playerArr, PlayerTable):
+        return ts.trophyCapSim(playerArr, numMatches, capList, seed = seed)
+    seedLegacy(seed)
     queue = np.asarray([random.choice(playerArr)], dtype = object)
     matchesPlayed = 0
     while matchesPlayed < numMatches:
@@ -184,7 +223,7 @@ def trophyCapSim(playerArr, numMatches, capList):
                     opponent = queue[addPos]
                 if allowMatch(newPlayer, opponent):
                     originalLevels = [newPlayer.cardLevel, opponent.cardLevel]
-                    cap = (8 + np.searchsorted(capList, min(newPlayer.trophies, opponent.trophies)))*8
+                    cap = lr.cap(min(newPlayer.trophies, opponent.trophies), capList)
                     newPlayer.cardLevel = min(newPlayer.cardLevel, cap)
                     opponent.cardLevel = min(opponent.cardLevel, cap)
                     newPlayer.playMatch(opponent)
@@ -208,9 +247,9 @@ def capByTrophies(playerArr, caps):
     Returns:list of original card levels
     """
     originalLvls = [p.cardLevel for p in playerArr]
-    for pla in playerArr:
-        cap = (8 + np.searchsorted(caps, pla.trophies))*8
-        pla.cardLevel = min(pla.cardLevel, cap)
+    capped = lr.capLevels(originalLvls, [p.trophies for p in playerArr], caps).tolist()
+    for pla, level in zip(playerArr, capped):
+        pla.cardLevel = level
     return originalLvls
 
 
@@ -282,161 +321,93 @@ def allowMatch(p1, p2, mode = None, cardLvlRule = 100, CLcutoff = 5000, KTdiff =
         return cardRule(p1, p2) or p1.trophies > CLcutoff
     elif mode == 'KT':
         return KTDiffRule(p1, p2) or p1.trophies > KTcutoff 
-    elif mode == 'KTCL': #Specialized simulation for this hasn't been made
+    elif mode == 'KTCL': #Neither continueSim has separate queues for this, players are searched in one queue and filtered by both rules
         return (KTDiffRule(p1, p2) or p1.trophies > KTcutoff) and cardRule(p1, p2)
     else:
         return True
         
 def plots(data, filename):
-    """Makes 6 plots from the data and saves them:
-    Bar graph of Lvl diff/Match vs King Tower
-    Bar graph of lvl diff/match vs card level
-    Histogram of Trophies and King Tower
-    Histogram of card levels and king tower
-    Scatterplot of card lvls vs trophies
-    Scatterplot of lvl diff/match vs trophies
-    
-    Args: 
-    data: Numpy array of player objects
+    """Makes 6 plots from the data and saves them (see ladderPlots.plots).
+    matplotlib and seaborn are imported on the first call, not with ladderSim2
+
+    Args:
+    data: Numpy array of player objects (or a PlayerTable)
     filename: String to be used as the file name
     """
-    df = arrToDF(data)
-    df2 = arrToDF(sepByCards(data))
-    plt.figure(figsize = (6, 6))
-    sns.barplot(x = "King Tower", y = "LvlDiff/Match", data = df)
-    plt.savefig(filename + '1')
-    plt.close()
-    
-    plt.figure(figsize = (20,6))
-    sns.barplot(x = "Card Level", y = "LvlDiff/Match", data = df)
-    plt.xticks(rotation = -45)
-    plt.savefig(filename + '2')
-    plt.close()
-
-    plt.figure(figsize = (20, 8))
-    sns.histplot(data = df,
-            x = 'Trophies', 
-            hue = 'King Tower',
-            stat = 'count',
-            palette = PALETTE,
-            multiple = 'stack')
-    plt.savefig(filename + '3')
-    plt.close()
-
-    plt.figure(figsize = (20, 8))
-    sns.histplot(data=df2, 
-             x = 'Trophies',
-             hue = 'Card Level',
-             stat = 'count',
-             palette = sns.color_palette("CMRmap_r", n_colors = 13),
-             multiple = 'stack')
-    plt.savefig(filename + '4')
-    plt.close()
-    
-    plt.figure(figsize = (16, 8))    
-    sns.relplot(data = df, x = "Trophies", y = "Card Level", hue = "King Tower", palette = PALETTE)
-    plt.savefig(filename + '5')
-    plt.close()
-
-    plt.figure(figsize = (20, 8))
-    sns.relplot(data = df, x='Trophies', y = 'LvlDiff/Match', hue = 'King Tower', palette = PALETTE)
-    plt.savefig(filename + '6')
-    plt.close()
-    
+    import ladderPlots
+    ladderPlots.plots(data, filename)
+
+def cardGroups(cardLevels):
+    """Labels card levels with their group in CARD_LABELS ('60-63', '64-67', ... '108-112').
+    Levels below 60 keep their own value (an int, as sepByCards always left them) as the label
+    Args:
+    cardLevels: array or Series of card levels
+    Returns: numpy object array of strings and ints"""
+    levels = np.asarray(cardLevels)
+    labels = np.asarray(CARD_LABELS, dtype = object)[np.maximum(np.digitize(levels, CARD_BINS) - 1, 0)]
+    low = levels < CARD_BINS[0]
+    labels[low] = levels[low].tolist()
+    return labels
+
 def sepByCards(arr):
     """Separates an array of player objecs by cards
     Args:
     arr: Array of player objects
+    Returns: copies of the players with their card level replaced by its group label
     """
-    playerCopy = [] #need to deepcopy the array
-    for p in arr:
-            new = pl.Player(id = p.id,
-                            trophies=p.trophies,
-                            wins=p.wins,
-                            losses=p.losses,
-                            kingLevel=p.kt,
-                            cardLevel=p.cardLevel, 
-                            totalLvlDiff=p.totalLvlDiff)
-            playerCopy += [new]
-    newArr = np.asarray(playerCopy)
-    for player in newArr:
-        if 60 <= player.cardLevel <= 63:
-            player.cardLevel = '60-63'
-        elif 64 <= player.cardLevel <= 67:
-            player.cardLevel = '64-67'
-        elif 68 <= player.cardLevel <= 71:
-            player.cardLevel = '68-71'
-        elif 72 <= player.cardLevel <= 75:
-            player.cardLevel = '72-75'
-        elif 76 <= player.cardLevel <= 79:
-            player.cardLevel = '76-79'
-        elif 80 <= player.cardLevel <= 83:
-            player.cardLevel = '80-83'
-        elif 84 <= player.cardLevel <= 87:
-            player.cardLevel = '84-87'
-        elif 88 <= player.cardLevel <= 91:
-            player.cardLevel = '88-91'
-        elif 92 <= player.cardLevel <= 95:
-            player.cardLevel = '92-95'
-        elif 96 <= player.cardLevel <= 99:
-            player.cardLevel = '96-99'
-        elif 100 <= player.cardLevel <= 103:
-            player.cardLevel = '100-103'
-        elif 104 <= player.cardLevel <= 107:
-            player.cardLevel = '104-107'
-        elif 108 <= player.cardLevel:
-            player.cardLevel = '108-112'
+    labels = cardGroups([p.cardLevel for p in arr])
+    newArr = np.empty(len(arr), dtype = object)
+    newArr[:] = [pl.Player(id = p.id, trophies=p.trophies, wins=p.wins, losses=p.losses, kingLevel=p.kt,
+                           cardLevel=label, totalLvlDiff=p.totalLvlDiff) for p, label in zip(arr, labels)]
     return newArr
 
 def arrToDF(arr):
-    """Converts an array of player objects to a dataframe
-    Args: arr- Array of Player objects
+    """Converts an array of player objects (or a PlayerTable) to a dataframe
+    Args: arr- Array of Player objects or PlayerTable
     Returns: dataframe. 
     """
-    #dataInLists = [p.getData() + [(p.totalLvlDiff/(p.wins+p.losses))] for p in arr]
-    dataInLists = []
-    for p in arr:
-        new = p.getData()
-        if p.wins+p.losses == 0:
-            new += [0]
-        else:
-            new += [(p.totalLvlDiff/(p.wins+p.losses))]
-        dataInLists += [new]
-    return pd.DataFrame(data = dataInLists, columns = COLS)
+    if isinstance(arr, PlayerTable):
+        return arr.toDF()
+    df = pd.DataFrame(data = [p.getData() for p in arr], columns = COLS[:-1])
+    matches = (df["Wins"] + df["Losses"]).to_numpy()
+    df["LvlDiff/Match"] = np.divide(df["Total Level Difference"].to_numpy(), matches, out = np.zeros(len(df)), where = matches != 0)
+    return df
      
 def storeDF(df, filename):
     """Stores the dataframe in csv file filename
     Args:
     df:  Dataframe to store
     filename: string, name of file"""
-    df.to_csv(filename, index_label = False)
+    df.to_csv(filename, index = False) #index_label = False wrote the index without a header, shifting the columns
     
 def dfToArr(df, reset = False):
     """Converts a dataframe back into a numpy array of player objects
     Args
-    df: A dataFrame with the data to be converted to an array of objects"""
-    arrays = df.to_numpy()
-    playerList = []
-    if reset:
-        for p in arrays:
-            new = pl.Player(id = p[0], trophies = p[1],wins=0,losses =0, kingLevel=p[4],cardLevel = p[5],totalLvlDiff=0)
-            new.reset()
-            playerList += [new]
-    else:
-        for p in arrays:
-            new = pl.Player(id = p[0],trophies=p[1],wins=p[2],losses=p[3],kingLevel=p[4],cardLevel=p[5], totalLvlDiff=p[6])
-            playerList += [new]
-    return np.asarray(playerList)
+    df: A dataFrame with the data to be converted to an array of objects
+    reset: bool, zeroes wins, losses and level differences and resets the trophies"""
+    return PlayerTable.fromDF(df, reset = reset).toPlayers()
+
+def dfToTable(df, reset = False):
+    """Converts a dataframe into a PlayerTable, much faster than dfToArr
+    Args
+    df: A dataFrame with the data to be converted
+    reset: bool, zeroes wins, losses and level differences and resets the trophies"""
+    return PlayerTable.fromDF(df, reset = reset)
 
-def CLsim(playerArr, numMatches, CLrule, CLcutoff, gatesList = [5000]):
+def CLsim(playerArr, numMatches, CLrule, CLcutoff, gatesList = [5000], seed = None):
     """Card level matchmaking simulation
     Args:
-    playerArr: Array of player objects
+    playerArr: Array of player objects.  A PlayerTable runs on the table engine (tableSim.CLsim) with the same
+               card level queues (MatchPolicy.legacyCL)
     numMatches: int, number of matches to play
     CLrule: int, The max difference in card lvls between 2 players
     CLcutoff: int, the max trophes where CL mm occurs
     gatesList: List of ints representing trophy gates. 
+    seed: None, int, SeedSequence or numpy Generator. Makes the run reproducible
     """
+    if isinstance(playerArr, PlayerTable):
+        return ts.CLsim(playerArr, numMatches, CLrule, CLcutoff, gatesList = gatesList, seed = seed)
+    seedLegacy(seed)
     queueDict = createDict()
     matchesPlayed = 0
     generalQueue = np.asarray([])
@@ -530,31 +501,48 @@ def findOppCL(qDict, p, CLrule):
     return p
     
 
-def test(initialArr, matchesPerSzn, filename, mode = None, CLrule = 100, CLcutoff= 5000, KTrule=1, KTcutoff = 1, gatesList = [5000]):
-    """Runs 5 seasons of a simulation"""
+def test(initialArr, matchesPerSzn, filename, mode = None, CLrule = 100, CLcutoff= 5000, KTrule=1, KTcutoff = 1, gatesList = [5000], seed = None):
+    """Runs 5 seasons of a simulation
+    seed: None, int, SeedSequence or numpy Generator. Makes the run reproducible"""
     data = initialArr
+    rng = makeRng(seed) if isinstance(data, PlayerTable) else seedLegacy(seed) #one stream for all 5 seasons
     for season in [1, 2, 3, 4,5]:
         if mode == None: 
-            data = continueSim(data, numMatches = matchesPerSzn, mode = None)
+            data = continueSim(data, numMatches = matchesPerSzn, mode = None, seed = rng)
             print(f"Season {season} Complete")
         elif mode == 'KT':
-            data = KTsim(data, numMatches = matchesPerSzn, KTdiff = KTrule, KTcutoff = KTcutoff)
+            data = KTsim(data, numMatches = matchesPerSzn, KTdiff = KTrule, KTcutoff = KTcutoff, seed = rng)
             print(f"Season {season} Complete")
         elif mode == 'CL':
-            data = CLsim(data, matchesPerSzn, CLrule, CLcutoff)
+            data = CLsim(data, matchesPerSzn, CLrule, CLcutoff, seed = rng)
+            print(f"Season {season} Complete")
+        elif mode == 'KTCL':
+            data = continueSim(data, numMatches = matchesPerSzn, mode = 'KTCL', cardLvlRule = CLrule, KTdiff = KTrule, KTcutoff = KTcutoff, seed = rng)
             print(f"Season {season} Complete")
         if season == 5:
             break
         else:
-            for p in data:
-                p.reset()
+            resetAll(data)
     #plots(data, filename)
     return data    
 
-def finalSimulation():
+def resetAll(data):
+    """Season reset of an array of player objects or a PlayerTable"""
+    if isinstance(data, PlayerTable):
+        data.reset()
+    else:
+        for p in data:
+            p.reset()
+
+def finalSimulation(useTable = False, seed = None):
     """Uses the result of 70 million battles to play out the most fair matchmaking rules for numSeason seasons.
     Rules: No KTmm, No CLmm, Trophy caps are [5300, 5600, 6000, 6300, 6600, 7000]. 
-    Plays 16 million battles per season for 12 seasons"""
+    Plays 16 million battles per season for 12 seasons
+    useTable: bool, runs on a PlayerTable (much faster) and returns the table
+    seed: None, int, SeedSequence or numpy Generator. Makes the run reproducible"""
+    if useTable:
+        return ts.finalSimulation(seed = seed)
+    seedLegacy(seed)
     kingTowers = []
     playerL = []
     while len(kingTowers) < 100000:  #initialize king towers
@@ -592,7 +580,7 @@ def finalSimulation():
                         opponent = queue[addPos]
                     if allowMatch(newPlayer, opponent):
                         originalLevels = [newPlayer.cardLevel, opponent.cardLevel]
-                        cap = (8 + np.searchsorted([5300, 5600, 6000, 6300, 6600, 7000], min(newPlayer.trophies, opponent.trophies)))*8
+                        cap = lr.cap(min(newPlayer.trophies, opponent.trophies), ts.CAPLIST)
                         newPlayer.cardLevel = min(newPlayer.cardLevel, cap)
                         opponent.cardLevel = min(opponent.cardLevel, cap)
                         newPlayer.playMatch(opponent)
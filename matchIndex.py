@@ -0,0 +1,108 @@
+from trophyQueue import TrophyQueue
+
+class MatchIndex(TrophyQueue):
+    """
+    TrophyQueue that also knows the king tower and card level of every queued player, so
+    "closest trophies within +/-40, within the KT and card level rules" is answered by one query
+    instead of probing one queue per king tower or card level.
+
+    Attributes:
+        attrs: dict, queued player -> (king tower, card level, time queued)
+    Methods:
+        add
+        remove
+        query
+    """
+    def __init__(self):
+        """Creates an empty index"""
+        super().__init__()
+        self.attrs = {}
+
+    def add(self, player, trophies, kt = 0, cardLevel = 0, since = 0):
+        """Adds player to the index
+
+        Args:
+        player: Hashable player identifier (a PlayerTable row index)
+        trophies, kt, cardLevel: ints, the player's trophies, king tower and card level
+        since: number, time the player was queued at (see query's widen)
+        """
+        super().add(player, trophies)
+        self.attrs[player] = (int(kt), int(cardLevel), since)
+
+    def remove(self, player):
+        """Removes player from the index and returns the trophies it was queued with"""
+        del self.attrs[player]
+        return super().remove(player)
+
+    def query(self, trophies, kt, cardLevel, window = 40, ktDiff = None, clRule = None, accept = None, rejections = None,
+              now = 0, widen = None):
+        """Returns the queued player with the closest trophies that is within all the rules, or None
+
+        Args:
+        trophies, kt, cardLevel: the searching player's trophies, king tower and card level
+        window: int, max trophy difference
+        ktDiff: optional int, max king tower difference
+        clRule: optional int, card levels must differ by less than this
+        accept: optional function of a player, extra check a candidate must pass
+        rejections: optional dict, counts the rejected candidates by reason ('KT', 'CL', 'accept', 'wait'),
+                    and 'window' if no queued player is within window at all
+        now: number, current time, on the same clock as since
+        widen: optional (every, trophies, kt, cl, maxWindow) tuple (see MatchPolicy.widening).  A candidate that
+               has waited n*every widens window by n*trophies (up to maxWindow), ktDiff by n*kt and clRule by n*cl.
+               Candidates are checked against their own limits ('wait' rejections) out to the widest window any
+               queued player has reached
+        """
+        if widen is not None:
+            return self._widenedQuery(trophies, kt, cardLevel, window, ktDiff, clRule, accept, rejections, now, widen)
+        if rejections is None:
+            for player in self.candidates(trophies, window):
+                otherKt, otherCards, _ = self.attrs[player]
+                if ktDiff is not None and abs(otherKt - kt) > ktDiff:
+                    continue
+                if clRule is not None and abs(otherCards - cardLevel) >= clRule:
+                    continue
+                if accept is None or accept(player):
+                    return player
+            return None
+        seen = False
+        for player in self.candidates(trophies, window):
+            seen = True
+            otherKt, otherCards, _ = self.attrs[player]
+            if ktDiff is not None and abs(otherKt - kt) > ktDiff:
+                reason = 'KT'
+            elif clRule is not None and abs(otherCards - cardLevel) >= clRule:
+                reason = 'CL'
+            elif accept is None or accept(player):
+                return player
+            else:
+                reason = 'accept'
+            rejections[reason] = rejections.get(reason, 0) + 1
+        if not seen:
+            rejections['window'] = rejections.get('window', 0) + 1
+        return None
+
+    def _widenedQuery(self, trophies, kt, cardLevel, window, ktDiff, clRule, accept, rejections, now, widen):
+        """query with limits that widen with each candidate's wait"""
+        every, dTrophies, dKt, dCl, maxWindow = widen
+        oldest = next(iter(self.attrs.values()))[2] if self.attrs else now #attrs is in queueing order
+        widest = max(window, min(window + int((now - oldest)//every)*dTrophies, maxWindow)) if now > oldest else window
+        seen = False
+        for player in self.candidates(trophies, widest):
+            seen = True
+            otherKt, otherCards, since = self.attrs[player]
+            steps = int((now - since)//every) if now > since else 0
+            if abs(self.members[player] - trophies) > min(window + steps*dTrophies, maxWindow):
+                reason = 'wait'
+            elif ktDiff is not None and abs(otherKt - kt) > ktDiff + steps*dKt:
+                reason = 'KT'
+            elif clRule is not None and abs(otherCards - cardLevel) >= clRule + steps*dCl:
+                reason = 'CL'
+            elif accept is None or accept(player):
+                return player
+            else:
+                reason = 'accept'
+            if rejections is not None:
+                rejections[reason] = rejections.get(reason, 0) + 1
+        if not seen and rejections is not None:
+            rejections['window'] = rejections.get('window', 0) + 1
+        return None
@@ -0,0 +1,221 @@
+import os
+import json
+import queue
+import threading
+import numpy as np
+from rngStreams import makeRng, describeSeed
+
+#Append-only binary log of individual matches.  A log file is:
+#  MAGIC, then a little endian uint32 with the length of the header, then the header as json (version, record
+#  dtype and the seed of the sampling, see rngStreams.describeSeed), padded to a 64 byte boundary, then fixed
+#  width records (RECORD) until the end of the file.
+#The number of records comes from the file size, so a log can be appended to by later runs and read while it is written.
+#Records are collected in preallocated buffers, which a background thread writes to the file, so the simulation
+#only stalls if the disk falls a whole pool of buffers behind.
+
+MAGIC = b"CRMATLOG"
+VERSION = 1
+ALIGN = 64
+RECORD = np.dtype([("tick", "<i8"), #match number in the run that logged it
+                   ("season", "<i2"),
+                   ("id1", "<i4"), ("id2", "<i4"),
+                   ("trophies1", "<i4"), ("trophies2", "<i4"), #before the match
+                   ("kt1", "<i2"), ("kt2", "<i2"),
+                   ("cardLevel1", "<i2"), ("cardLevel2", "<i2"),
+                   ("cap", "<i2"), #card level cap of the match, batchMatch.NOCAP if not capped
+                   ("winner", "u1"), #1 or 2
+                   ("won", "<i2"), ("lost", "<i2")]) #trophies won by the winner and lost by the loser
+
+
+def _align(n):
+    return (n + ALIGN - 1)//ALIGN*ALIGN
+
+
+def _header(seed = None):
+    header = json.dumps({"version": VERSION, "record": RECORD.descr, "seed": describeSeed(seed)}).encode()
+    return MAGIC + np.uint32(len(header)).astype("<u4").tobytes() + header
+
+
+def readHeader(filename):
+    """Returns (header dict, byte offset of the first record) of a match log"""
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filename} is not a match log")
+        length = int(np.frombuffer(f.read(4), dtype = "<u4")[0])
+        header = json.loads(f.read(length))
+    if header["version"] > VERSION:
+        raise ValueError(f"{filename} has match log version {header['version']}, only versions up to {VERSION} can be read")
+    return header, _align(len(MAGIC) + 4 + length)
+
+
+class MatchLog():
+    """
+    Observer of a LadderEngine (engine.addObserver(log)) that appends every played match, or a sample of them,
+    to a binary log file.  Close it (or use it in a with block) to write the last records.
+
+    Attributes:
+        filename: string, name of the log file
+        sampleRate: float, fraction of the matches logged
+        matches: int, matches seen
+        logged: int, matches logged
+    Methods:
+        onBatch
+        onSeasonEnd
+        flush
+        close
+    """
+    def __init__(self, filename, sampleRate = 1.0, bufferSize = 65536, buffers = 4, seed = None):
+        """Args:
+            filename: string, name of the log file.  An existing log is appended to
+            sampleRate: float, fraction of the matches to log, chosen at random
+            bufferSize: int, records per buffer
+            buffers: int, number of preallocated buffers
+            seed: seed of the sampling, separate from the simulation's so sampling never changes a run (pass
+                  rngStreams.copySeed of the run's seed).  A new log records it in its header
+        """
+        if not 0 < sampleRate <= 1:
+            raise ValueError("sampleRate must be in (0, 1]")
+        self.filename = filename
+        self.sampleRate = sampleRate
+        self.rng = makeRng(seed)
+        self.matches = 0
+        self.logged = 0
+        self.season = 1
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            header, dataStart = readHeader(filename)
+            if np.dtype([tuple(field) for field in header["record"]]) != RECORD:
+                raise ValueError(f"{filename} has a different record layout")
+            self._file = open(filename, "r+b")
+            self._file.seek(0, os.SEEK_END)
+            if self._file.tell() < dataStart:
+                self._file.truncate(dataStart)
+                self._file.seek(dataStart)
+        else:
+            self._file = open(filename, "wb")
+            header = _header(seed)
+            self._file.write(header + bytes(_align(len(header)) - len(header)))
+        self._free = queue.Queue()
+        for _ in range(buffers):
+            self._free.put(np.zeros(bufferSize, dtype = RECORD))
+        self._full = queue.Queue()
+        self._buffer = self._free.get()
+        self._used = 0
+        self._error = None
+        self._writer = threading.Thread(target = self._write, daemon = True)
+        self._writer.start()
+
+    def _write(self):
+        """Background thread: writes full buffers to the file and hands them back"""
+        while True:
+            item = self._full.get()
+            if item is None:
+                break
+            buffer, used = item
+            try:
+                if self._error is None:
+                    self._file.write(buffer[:used].tobytes())
+            except Exception as e:
+                self._error = e
+            self._free.put(buffer)
+            self._full.task_done()
+        self._full.task_done()
+
+    def _checkError(self):
+        if self._error is not None:
+            raise IOError(f"Writing {self.filename} failed") from self._error
+
+    def onBatch(self, table, result):
+        """Adds the sampled matches of a played batch (batchMatch.BatchResult) to the log"""
+        self._checkError()
+        n = len(result)
+        ticks = np.arange(self.matches, self.matches + n)
+        self.matches += n
+        if self.sampleRate < 1:
+            keep = np.flatnonzero(self.rng.random(n) < self.sampleRate)
+        else:
+            keep = np.arange(n)
+        if keep.size == 0:
+            return
+        p1, p2 = result.p1[keep], result.p2[keep]
+        winners = result.winners[keep]
+        p1Won = winners == p1
+        before1, before2 = result.trophies1[keep], result.trophies2[keep]
+        after1, after2 = table.trophies[p1], table.trophies[p2]
+        records = np.empty(keep.size, dtype = RECORD)
+        records["tick"] = ticks[keep]
+        records["season"] = self.season
+        records["id1"] = table.id[p1]
+        records["id2"] = table.id[p2]
+        records["trophies1"] = before1
+        records["trophies2"] = before2
+        records["kt1"] = table.kt[p1]
+        records["kt2"] = table.kt[p2]
+        records["cardLevel1"] = table.cardLevel[p1]
+        records["cardLevel2"] = table.cardLevel[p2]
+        records["cap"] = result.caps[keep]
+        records["winner"] = np.where(p1Won, 1, 2)
+        records["won"] = np.where(p1Won, after1 - before1, after2 - before2)
+        records["lost"] = np.where(p1Won, before2 - after2, before1 - after1)
+        self._append(records)
+
+    def _append(self, records):
+        """Copies records into the buffers, handing full buffers to the writer"""
+        start = 0
+        while start < records.size:
+            count = min(records.size - start, self._buffer.size - self._used)
+            self._buffer[self._used:self._used + count] = records[start:start + count]
+            self._used += count
+            start += count
+            if self._used == self._buffer.size:
+                self._full.put((self._buffer, self._used))
+                self._buffer = self._free.get() #only waits if every buffer is waiting to be written
+                self._used = 0
+        self.logged += records.size
+
+    def onSeasonEnd(self, table, season):
+        """Records of the next season are tagged with season + 1"""
+        self.season = season + 1
+
+    def flush(self):
+        """Writes every logged record to the file and waits until it is written"""
+        if self._used:
+            self._full.put((self._buffer, self._used))
+            self._buffer = self._free.get()
+            self._used = 0
+        self._full.join()
+        self._file.flush()
+        self._checkError()
+
+    def close(self):
+        """Writes the remaining records, stops the writer thread and closes the file"""
+        if self._file.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._full.put(None)
+            self._writer.join()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def readMatchLog(filename):
+    """Opens a match log as a read only memory mapped record array (RECORD), without reading it into memory"""
+    header, dataStart = readHeader(filename)
+    count = (os.path.getsize(filename) - dataStart)//RECORD.itemsize
+    if count == 0:
+        return np.empty(0, dtype = RECORD)
+    return np.memmap(filename, dtype = RECORD, mode = "r", offset = dataStart, shape = (count,))
+
+
+def iterMatchLog(filename, chunkSize = 1 << 20):
+    """Yields the records of a match log in chunks of chunkSize, so logs bigger than memory can be scanned.
+    Each chunk is a memory mapped view, copy it to keep it"""
+    records = readMatchLog(filename)
+    for start in range(0, records.size, chunkSize):
+        yield records[start:start + chunkSize]
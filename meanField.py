@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+from player import chanceOfOverlvl, changeOfMoreSkill
+from ladderRules import seasonReset, lossPercent, applyGates, cap
+from engine import MatchPolicy
+
+#Fast estimate of the trophy distribution without playing matches.  Players are grouped by king tower and card level
+#bucket, and each group's players are spread over a lattice of trophy counts (binWidth apart).  Every step a share of
+#the players plays one match: opponents come from the lattice points within the policy's trophy window, weighted by
+#how many eligible players are there (policy.limits, so KT and card level rules apply), the chance of winning is the
+#one Player.playMatch uses (level gap after trophy caps, skill gap on equal levels), and the winners and losers move
+#by the exchanged trophies (trophy gap, lossPercent, gates), split between the two nearest lattice points.
+#Season resets use ladderRules.seasonReset.  It ignores queues and pairs players independently, so use it to shortlist
+#rules and check the shortlist with the LadderEngine.
+
+
+class MeanField():
+    """
+    Distribution of a population over (group, trophies), evolved match by match on average.
+
+    Attributes:
+        policy: MatchPolicy
+        trophies: array, trophy count of every lattice point
+        groups: data frame, one row per group: King Tower, Card Level (mean of the bucket), Skill, Activity (chance
+                of playing ladder when drawn) and Players
+        mass: array [group, lattice point], number of players
+        eligible, eligibleWins, eligibleGaps: arrays [lattice point, group, opponent group], 1 if allowed to play
+                                              (policy.limits), times the chance of winning, times the level gap
+        plays, wins, lvlDiff: arrays, expected matches, wins and summed level differences of every group
+    Methods:
+        step
+        run
+        endSeason
+        toFrame
+        distribution
+    """
+    def __init__(self, table, policy, binWidth = 10, cardBucket = 4, maxTrophies = 9000):
+        """Args:
+            table: PlayerTable, the starting population
+            policy: MatchPolicy, its mode, limits, window, gates, caps and party skips are used
+            binWidth: int, trophies between two lattice points.  The window is rounded down to a multiple of it
+            cardBucket: int, card levels per group
+            maxTrophies: int, highest lattice point
+        """
+        self.policy = policy
+        self.binWidth = binWidth
+        low = (int(table.trophies.min())//binWidth)*binWidth
+        self.trophies = np.arange(low, max(maxTrophies, int(table.trophies.max())) + binWidth, binWidth)
+        buckets = table.cardLevel.astype(np.int64)//cardBucket
+        keys, group = np.unique(np.stack((table.kt.astype(np.int64), buckets)), axis = 1, return_inverse = True)
+        group = group.ravel()
+        count = np.bincount(group)
+        skill = np.nan_to_num(table.skill.astype(np.float64), nan = 0.5)
+        activity = np.clip(policy.weights(table), 0, 1)
+        self.groups = pd.DataFrame({"King Tower": keys[0],
+                                    "Card Level": np.bincount(group, weights = table.cardLevel)/count,
+                                    "Skill": np.bincount(group, weights = skill)/count,
+                                    "Activity": np.bincount(group, weights = activity)/count,
+                                    "Players": count})
+        self.mass = np.zeros((len(count), self.trophies.size))
+        position = (table.trophies.astype(np.float64) - low)/binWidth
+        lo = np.floor(position).astype(np.int64)
+        np.add.at(self.mass, (group, lo), 1 - (position - lo))
+        np.add.at(self.mass, (group, np.minimum(lo + 1, self.trophies.size - 1)), position - lo)
+        self.plays = np.zeros(len(count))
+        self.wins = np.zeros(len(count))
+        self.lvlDiff = np.zeros(len(count))
+        self._build()
+
+    def _build(self):
+        """Precomputes eligibility, win chances, level gaps and destinations of every lattice point and offset"""
+        policy = self.policy
+        kt = self.groups["King Tower"].to_numpy()
+        cards = self.groups["Card Level"].to_numpy()
+        skill = self.groups["Skill"].to_numpy()
+        t = self.trophies
+        self.offsets = np.arange(-(policy.window//self.binWidth), policy.window//self.binWidth + 1)
+        #[b, g, h] matrices: searcher of group g at lattice point b against an opponent of group h
+        ktGap = np.abs(kt[:, None] - kt[None, :])
+        cardGap = np.abs(cards[:, None] - cards[None, :])
+        eligible = np.ones((t.size, kt.size, kt.size))
+        if policy.mode in ('KT', 'KTCL'):
+            eligible *= ~((ktGap > policy.KTdiff)[None, :, :] & (t <= policy.KTcutoff)[:, None, None])
+        if policy.mode == 'CL':
+            eligible *= ~((cardGap >= policy.cardLvlRule)[None, :, :] & (t <= policy.CLcutoff)[:, None, None])
+        elif policy.mode == 'KTCL':
+            eligible *= (cardGap < policy.cardLvlRule)[None, :, :]
+        capped = cards[None, :] if policy.capList is None else np.minimum(cards[None, :], cap(t, policy.capList)[:, None])
+        levels = capped + kt[None, :] #[b, g], after the trophy caps
+        gap = levels[:, :, None] - levels[:, None, :]
+        overChance = np.clip(chanceOfOverlvl(np.abs(gap)), 0, 1)
+        skillGap = skill[:, None] - skill[None, :]
+        skillChance = np.clip(changeOfMoreSkill(np.abs(skillGap)), 0, 1)
+        skillWin = np.where(skillGap > 0, skillChance, np.where(skillGap < 0, 1 - skillChance, 0.5))
+        winChance = np.where(gap > 0, overChance, np.where(gap < 0, 1 - overChance, skillWin[None, :, :]))
+        self.eligible = eligible
+        self.eligibleWins = eligible*winChance
+        self.eligibleGaps = eligible*np.abs(gap)
+        #destinations [b, k] of a win and a loss against an opponent offsets[k] lattice points away, as flat
+        #indices into the mass array of every group (see _move)
+        opponent = t[:, None] + self.offsets[None, :]*self.binWidth
+        gained = 30 + np.trunc((opponent - t[:, None])/12)
+        lost = np.trunc(lossPercent(t)[:, None]*(30 + np.trunc((t[:, None] - opponent)/12)))
+        rows = np.arange(kt.size)[:, None, None]*t.size
+        self.winTo = self._split(t[:, None] + gained, rows)
+        self.lossTo = self._split(applyGates((t[:, None] - lost).astype(np.int64), t[:, None], policy.gatesList), rows)
+
+    def _split(self, trophies, rows = 0):
+        """(index of the lower lattice point, weight of the upper one) of every trophy count.  rows is added to
+        the indices (the start of each group's row in the flattened mass array)"""
+        position = np.clip((np.asarray(trophies, dtype = np.float64) - self.trophies[0])/self.binWidth, 0, self.trophies.size - 1)
+        lo = np.minimum(np.floor(position).astype(np.int64), self.trophies.size - 2)
+        return lo + rows, position - lo
+
+    def _move(self, moving, destination):
+        """Mass array of moving [group, lattice point, ...] put at destination (see _split)"""
+        lo, frac = destination
+        size = self.mass.size
+        moved = np.bincount(np.broadcast_to(lo, moving.shape).ravel(), weights = (moving*(1 - frac)).ravel(), minlength = size)
+        moved[1:] += np.bincount(np.broadcast_to(lo, moving.shape).ravel(), weights = (moving*frac).ravel(), minlength = size)[:-1]
+        return moved.reshape(self.mass.shape)
+
+    def step(self, share = 1.0):
+        """Plays one step: share of the active players play one match each.  Returns the number of matches"""
+        width = self.offsets[-1]
+        active = self.mass*self.groups["Activity"].to_numpy()[:, None]
+        padded = np.pad(active, ((0, 0), (width, width)))
+        numBins = self.trophies.size
+        #opponents [b, h, k]: active players of group h offsets[k] lattice points above b
+        opponents = np.stack([padded[:, width + k:width + k + numBins] for k in self.offsets], axis = -1).transpose(1, 0, 2)
+        byOffset = self.eligible @ opponents #[b, g, k]
+        total = byOffset.sum(axis = 2).T #[g, b]
+        playing = share*active*(total > 0)
+        rate = (playing/np.where(total > 0, total, 1)).T[:, :, None] #[b, g, 1]
+        wins = rate*(self.eligibleWins @ opponents)
+        losses = rate*byOffset - wins
+        self.wins += wins.sum(axis = (0, 2))
+        self.lvlDiff += (rate[:, :, 0]*(self.eligibleGaps @ opponents).sum(axis = 2)).sum(axis = 0)
+        plays = playing.sum(axis = 1)
+        self.plays += plays
+        self.mass = (self.mass - playing + self._move(wins.transpose(1, 0, 2), self.winTo)
+                     + self._move(losses.transpose(1, 0, 2), self.lossTo))
+        return plays.sum()/2
+
+    def run(self, numMatches, share = 1.0):
+        """Steps until numMatches matches have been played (the last step is shortened to land on it)"""
+        played = 0.0
+        while played < numMatches:
+            possible = (self.mass*self.groups["Activity"].to_numpy()[:, None]).sum()*share/2
+            if possible <= 0:
+                break
+            played += self.step(share*min(1, (numMatches - played)/possible))
+        return played
+
+    def endSeason(self):
+        """Season reset of every lattice point"""
+        rows = np.arange(self.mass.shape[0])[:, None]*self.trophies.size
+        self.mass = self._move(self.mass, self._split(seasonReset(self.trophies)[None, :], rows))
+
+    def toFrame(self):
+        """Summary by king tower with the columns of sweep.ktSummary (the median is the lattice point where half
+        the players are below)"""
+        rows = []
+        for kt, index in self.groups.groupby("King Tower").groups.items():
+            mass = self.mass[index].sum(axis = 0)
+            cumulative = np.cumsum(mass)
+            plays = self.plays[index].sum()
+            rows += [{"King Tower": kt, "Players": mass.sum(),
+                      "Trophies": float(mass @ self.trophies)/mass.sum(),
+                      "MedianTrophies": float(self.trophies[np.searchsorted(cumulative, cumulative[-1]/2)]),
+                      "LvlDiffPerMatch": self.lvlDiff[index].sum()/plays if plays else np.nan,
+                      "WinRate": self.wins[index].sum()/plays if plays else np.nan}]
+        return pd.DataFrame(rows)
+
+    def distribution(self):
+        """Number of players at every lattice point by king tower, one column per king tower"""
+        kts = self.groups["King Tower"].to_numpy()
+        return pd.DataFrame({kt: self.mass[kts == kt].sum(axis = 0) for kt in np.unique(kts)}, index = self.trophies)
+
+
+def estimate(table, policy = None, numSeasons = 1, matchesPerSzn = None, resetAfterLast = False, binWidth = 10, cardBucket = 4):
+    """Mean field estimate of a run like checkpoint.runSeasons
+
+    Args:
+    table: PlayerTable, the starting population (not changed)
+    policy: MatchPolicy, no rules by default
+    numSeasons: int, number of seasons
+    matchesPerSzn: int, matches per season.  Defaults to 160 per player, as in finalSimulation
+    resetAfterLast: bool, also resets trophies after the last season
+    Returns: MeanField
+    """
+    field = MeanField(table, policy or MatchPolicy(), binWidth = binWidth, cardBucket = cardBucket)
+    matchesPerSzn = matchesPerSzn or 160*len(table)
+    for season in range(1, numSeasons + 1):
+        field.run(matchesPerSzn)
+        if season < numSeasons or resetAfterLast:
+            field.endSeason()
+    return field
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+#Streaming metrics of a LadderEngine run.  Fixed size accumulators are updated after every played batch,
+#and a snapshot of them is taken every N matches and at every season end, so the run can be followed over
+#time with constant memory instead of re-scanning the full player table afterwards.
+
+KINGS = np.arange(8, 15)
+MAX_LEVEL = 128 #card levels are below this
+MAX_GAP = 40 #level gaps above this are counted with it
+TROPHY_BINS = np.arange(0, 10001, 100) #edges of the trophy histogram
+
+
+class MatchMetrics():
+    """
+    Observer of a LadderEngine (engine.addObserver(metrics)) that accumulates, per snapshot interval:
+    level difference per match by king tower and by card level, and the win rate of the higher leveled
+    player by level gap.  Each snapshot also stores the trophy histogram of every king tower.
+
+    Attributes:
+        every: int, matches between snapshots (None for season end snapshots only)
+        matches: int, total matches seen
+        snapshots: list of snapshot dicts
+    Methods:
+        onBatch
+        onSeasonEnd
+        snapshot
+        toFrame
+        trophyHistograms
+    """
+    def __init__(self, every = None):
+        """Args:
+            every: optional int, takes a snapshot every this many matches
+        """
+        self.every = every
+        self.matches = 0
+        self.season = 1
+        self.snapshots = []
+        self._clear()
+
+    def _clear(self):
+        """Empties the interval accumulators"""
+        self.ktDiff = np.zeros(KINGS[-1] + 1, dtype = np.int64)
+        self.ktCount = np.zeros(KINGS[-1] + 1, dtype = np.int64)
+        self.clDiff = np.zeros(MAX_LEVEL, dtype = np.int64)
+        self.clCount = np.zeros(MAX_LEVEL, dtype = np.int64)
+        self.gapWins = np.zeros(MAX_GAP + 1, dtype = np.int64)
+        self.gapCount = np.zeros(MAX_GAP + 1, dtype = np.int64)
+        self.intervalMatches = 0
+
+    def onBatch(self, table, result):
+        """Adds the matches of a played batch (batchMatch.BatchResult) to the accumulators"""
+        levels1, levels2 = result.levels(table)
+        lvlDiff = np.abs(levels1 - levels2)
+        players = np.concatenate((result.p1, result.p2))
+        diffs = np.concatenate((lvlDiff, lvlDiff))
+        kts = table.kt[players]
+        cards = np.clip(table.cardLevel[players], 0, MAX_LEVEL - 1)
+        self.ktDiff += np.bincount(kts, weights = diffs, minlength = self.ktDiff.size).astype(np.int64)
+        self.ktCount += np.bincount(kts, minlength = self.ktCount.size)
+        self.clDiff += np.bincount(cards, weights = diffs, minlength = MAX_LEVEL).astype(np.int64)
+        self.clCount += np.bincount(cards, minlength = MAX_LEVEL)
+        gap = np.minimum(lvlDiff, MAX_GAP)
+        higher = np.where(levels1 >= levels2, result.p1, result.p2)
+        self.gapWins += np.bincount(gap, weights = result.winners == higher, minlength = MAX_GAP + 1).astype(np.int64)
+        self.gapCount += np.bincount(gap, minlength = MAX_GAP + 1)
+        before = self.matches
+        self.matches += len(result)
+        self.intervalMatches += len(result)
+        if self.every and self.matches //self.every > before //self.every:
+            self.snapshot(table, f"match {self.matches}")
+
+    def onSeasonEnd(self, table, season):
+        """Takes the season end snapshot, before the trophies are reset"""
+        self.snapshot(table, f"season {season} end")
+        self.season = season + 1
+
+    def snapshot(self, table, label = ""):
+        """Stores the current accumulators and trophy histograms as a snapshot and empties the accumulators"""
+        histograms = np.stack([np.histogram(table.trophies[table.kt == kt], bins = TROPHY_BINS)[0] for kt in KINGS])
+        self.snapshots += [{"label": label,
+                            "season": self.season,
+                            "matches": self.matches,
+                            "intervalMatches": self.intervalMatches,
+                            "ktDiff": self.ktDiff[KINGS], "ktCount": self.ktCount[KINGS],
+                            "clDiff": self.clDiff, "clCount": self.clCount,
+                            "gapWins": self.gapWins, "gapCount": self.gapCount,
+                            "histograms": histograms}]
+        self._clear()
+
+    def toFrame(self, by = "King Tower"):
+        """Time series of the snapshots as a data frame, one row per snapshot and group
+
+        Args:
+        by: 'King Tower' (LvlDiff/Match), 'Card Level' (LvlDiff/Match) or 'Level Gap' (win rate of the higher leveled player)
+        """
+        frames = []
+        for n, snap in enumerate(self.snapshots):
+            if by == "King Tower":
+                keys, total, count, name = KINGS, snap["ktDiff"], snap["ktCount"], "LvlDiff/Match"
+            elif by == "Card Level":
+                keys, total, count, name = np.arange(MAX_LEVEL), snap["clDiff"], snap["clCount"], "LvlDiff/Match"
+            elif by == "Level Gap":
+                keys, total, count, name = np.arange(MAX_GAP + 1), snap["gapWins"], snap["gapCount"], "Higher Level Win Rate"
+            else:
+                raise ValueError(f"Unknown group: {by}")
+            used = count > 0
+            frames += [pd.DataFrame({"Snapshot": n, "Label": snap["label"], "Season": snap["season"], "Matches": snap["matches"],
+                                     by: keys[used], "Count": count[used], name: total[used]/count[used]})]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index = True)
+
+    def trophyHistograms(self, snapshot = -1):
+        """Trophy histogram of every king tower at a snapshot, as a data frame (rows: trophy bin start, columns: king tower)"""
+        snap = self.snapshots[snapshot]
+        return pd.DataFrame(snap["histograms"].T, index = TROPHY_BINS[:-1], columns = KINGS)
@@ -1,6 +1,7 @@
 #import pandas as pd
 import random
 import math
+from ladderRules import seasonReset, LOSS_PERCENT
 
 class Player():
     """
@@ -105,7 +106,7 @@ class Player():
                 if moreSkilled == opponent:
                     self.winsMatch(opponent, gatesList = gatesList)
                 else:
-                    opponent.winsMatch(self)
+                    opponent.winsMatch(self, gatesList = gatesList)
             else: #more skilled player wins
                 if moreSkilled == opponent:
                     opponent.winsMatch(self, gatesList = gatesList)
@@ -141,15 +142,8 @@ class Player():
             return [self.id, self.trophies, self.wins, self.losses, self.kt, self.cardLevel, self.totalLvlDiff, self.skill, self.pp]
             
     def reset(self):
-        """Resets the player object's trophies. """
-        if self.trophies >= 7000:
-            self.trophies = min((6600, int(self.trophies - 0.3*(self.trophies-5000))))
-        elif 6000 <= self.trophies< 7000:
-            self.trophies = int(self.trophies - 0.4*(self.trophies - 5000))
-        elif 5000 <= self.trophies < 6000:
-            self.trophies = int(self.trophies - 0.5*(self.trophies - 5000))
-        else:
-            pass
+        """Resets the player object's trophies (rules in ladderRules.seasonReset). """
+        self.trophies = seasonReset(self.trophies)
 
 #Non class methods:
 
@@ -162,30 +156,36 @@ def lossPercent(trophies):
     #     return 1
     # else:
     #     return 1 - 0.033*lvlDiff
-    if 4000 <= trophies < 5000:
-        return 1
-    elif 5000 <= trophies < 5300:
-        return 0.8
-    elif 5300 <= trophies < 6000:
-        return 0.9
-    else: 
-        return 1
-def createPlayer(kingLvl, id= 0,trophies = 5000, wins = 0, losses = 0, skill = None, partyPct = 0):
-    """Creates a player with a specified king tower."""
+    return LOSS_PERCENT(trophies) #1, 0.8 from 5000, 0.9 from 5300, 1 from 6000
+def _choice(options, rng = None):
+    """random.choice, or the same draw from rng if a numpy Generator is given"""
+    if rng is None:
+        return random.choice(options)
+    return options[int(rng.integers(len(options)))]
+
+def _gauss(mu, sigma, rng = None):
+    """random.gauss, or the same draw from rng if a numpy Generator is given"""
+    if rng is None:
+        return random.gauss(mu, sigma)
+    return float(rng.normal(mu, sigma))
+
+def createPlayer(kingLvl, id= 0,trophies = 5000, wins = 0, losses = 0, skill = None, partyPct = 0, rng = None):
+    """Creates a player with a specified king tower.
+    rng: optional numpy Generator, uses the random module if None"""
     if kingLvl == 8:
-        cardLevel = random.choice(range(60, 81))
+        cardLevel = _choice(range(60, 81), rng)
     elif kingLvl == 9:
-        cardLevel= random.choice(range(68, 89))
+        cardLevel= _choice(range(68, 89), rng)
     elif kingLvl == 10:
-        cardLevel= random.choice(range(76, 105))
+        cardLevel= _choice(range(76, 105), rng)
     elif kingLvl == 11:
-        cardLevel= random.choice(range(84, 113))
+        cardLevel= _choice(range(84, 113), rng)
     elif kingLvl == 12:
-        cardLevel= random.choice(range(92, 113))
+        cardLevel= _choice(range(92, 113), rng)
     elif kingLvl == 13:
-        cardLevel= random.choice(range(96, 113))
+        cardLevel= _choice(range(96, 113), rng)
     elif kingLvl == 14:
-        cardLevel= random.choice(range(104, 113))
+        cardLevel= _choice(range(104, 113), rng)
     else:
         raise ValueError("Invalid King Tower")
     return Player(id = id, trophies = trophies, wins = wins, losses = losses, kingLevel=kingLvl, cardLevel=cardLevel, skill = skill )
@@ -200,22 +200,23 @@ def changeOfMoreSkill(skillDiff):
     return 0.5 + skillDiff/2.5
 
 
-def createRealPlayers(kingLvl, id= 0,trophies = 5000, wins = 0, losses = 0, skill = None, pp = 0):
-    """Creates player with card levels more like what is actually observed on ladder """
+def createRealPlayers(kingLvl, id= 0,trophies = 5000, wins = 0, losses = 0, skill = None, pp = 0, rng = None):
+    """Creates player with card levels more like what is actually observed on ladder
+    rng: optional numpy Generator, uses the random module if None"""
     if kingLvl == 8:
-        cardLevel = int(random.gauss(70, 3.5))
+        cardLevel = int(_gauss(70, 3.5, rng))
     elif kingLvl == 9:
-        cardLevel= int(random.gauss(78, 3))
+        cardLevel= int(_gauss(78, 3, rng))
     elif kingLvl == 10:
-        cardLevel= int(random.gauss(90, 5)) #Gaussian is most likely
+        cardLevel= int(_gauss(90, 5, rng)) #Gaussian is most likely
     elif kingLvl == 11:
-        cardLevel= int(min(random.gauss(98, 9),112)) #max possible lvls is 112
+        cardLevel= int(min(_gauss(98, 9, rng),112)) #max possible lvls is 112
     elif kingLvl == 12:
-        cardLevel= int(min(random.gauss(102, 7),112))
+        cardLevel= int(min(_gauss(102, 7, rng),112))
     elif kingLvl == 13:
-        cardLevel= int(min(random.gauss(104, 5),112))
+        cardLevel= int(min(_gauss(104, 5, rng),112))
     elif kingLvl == 14:
-        cardLevel= int(min(random.gauss(108, 3),112))
+        cardLevel= int(min(_gauss(108, 3, rng),112))
     else:
         raise ValueError("Invalid King Tower")
     return Player(id = id, trophies = trophies, wins = wins, losses = losses, kingLevel=kingLvl, cardLevel=cardLevel, skill = skill, partyPct= pp )
\ No newline at end of file
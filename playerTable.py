@@ -0,0 +1,291 @@
+import numpy as np
+import pandas as pd
+import player as pl
+from ladderRules import seasonReset, RESET_FACTOR, RESET_CEILING
+
+#Column name -> dtype.  Columns are named after the Player attributes they replace
+COLUMNS = {"id": np.int32,
+           "trophies": np.int32,
+           "wins": np.int32,
+           "losses": np.int32,
+           "kt": np.int16,
+           "cardLevel": np.int16,
+           "totalLvlDiff": np.int32,
+           "skill": np.float32,
+           "pp": np.float32}
+
+#Data frame columns (ladderSim2.COLS) -> table columns
+DF_COLUMNS = {"ID": "id",
+              "Trophies": "trophies",
+              "Wins": "wins",
+              "Losses": "losses",
+              "King Tower": "kt",
+              "Card Level": "cardLevel",
+              "Total Level Difference": "totalLvlDiff"}
+
+_rng = np.random.default_rng() #draws of playMatch calls without an rng
+
+
+class PlayerTable():
+    """
+    Struct of arrays version of an array of Player objects.  Every attribute of a Player is
+    stored as its own typed numpy column, and a player is just a row index into those columns.
+
+    Attributes:
+        id, trophies, wins, losses, kt, cardLevel, totalLvlDiff, skill, pp: numpy arrays, one entry per player.
+        A skill of nan means the player has no skill (the Player default of None)
+    Methods:
+        fromPlayers
+        toPlayers
+        fromDF
+        toDF
+        lvlDiffPerMatch
+        matchAllowed
+        allowMatch
+        playMatch
+        winsMatch
+        reset
+        sortByTrophies
+        getData
+    """
+    def __init__(self, numPlayers = 0, trophies = 5000):
+        """Creates a table of numPlayers default players (the same defaults as Player)
+
+        Args:
+            numPlayers: int, number of rows
+            trophies: starting trophies of every player
+        """
+        self.id = np.arange(numPlayers, dtype = COLUMNS["id"])
+        self.trophies = np.full(numPlayers, trophies, dtype = COLUMNS["trophies"])
+        self.wins = np.zeros(numPlayers, dtype = COLUMNS["wins"])
+        self.losses = np.zeros(numPlayers, dtype = COLUMNS["losses"])
+        self.kt = np.full(numPlayers, 11, dtype = COLUMNS["kt"])
+        self.cardLevel = np.full(numPlayers, 88, dtype = COLUMNS["cardLevel"])
+        self.totalLvlDiff = np.zeros(numPlayers, dtype = COLUMNS["totalLvlDiff"])
+        self.skill = np.full(numPlayers, np.nan, dtype = COLUMNS["skill"])
+        self.pp = np.zeros(numPlayers, dtype = COLUMNS["pp"])
+
+    def __len__(self):
+        """Number of players in the table"""
+        return self.id.size
+
+    def __getitem__(self, index):
+        """Returns a PlayerView of row index"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Player index out of range")
+        return PlayerView(self, index)
+
+    def __iter__(self):
+        """Iterates over PlayerViews of every row"""
+        for index in range(len(self)):
+            yield PlayerView(self, index)
+
+    def __repr__(self):
+        """String representation of the table"""
+        return f"PlayerTable({len(self)} players)"
+
+    @classmethod
+    def fromPlayers(cls, playerArr):
+        """Builds a table from an iterable of Player objects
+
+        Args:
+            playerArr: Array or list of Player objects
+        """
+        players = list(playerArr)
+        table = cls(0)
+        for name, dtype in COLUMNS.items():
+            if name == "skill":
+                values = [np.nan if p.skill is None else p.skill for p in players]
+            else:
+                values = [getattr(p, name) for p in players]
+            setattr(table, name, np.asarray(values, dtype = dtype))
+        return table
+
+    def toPlayers(self):
+        """Converts the table back into a numpy array of Player objects"""
+        skills = [None if skill != skill else skill for skill in self.skill.tolist()] #nan is the None skill
+        columns = zip(self.id.tolist(), self.trophies.tolist(), self.wins.tolist(), self.losses.tolist(),
+                      self.kt.tolist(), self.cardLevel.tolist(), self.totalLvlDiff.tolist(), skills, self.pp.tolist())
+        playerList = [pl.Player(id = i, trophies = t, wins = w, losses = l, kingLevel = kt, cardLevel = cl,
+                                totalLvlDiff = d, skill = sk, partyPct = pp) for i, t, w, l, kt, cl, d, sk, pp in columns]
+        arr = np.empty(len(playerList), dtype = object)
+        arr[:] = playerList
+        return arr
+
+    @classmethod
+    def fromDF(cls, df, reset = False):
+        """Builds a table from a data frame with the ladderSim2.COLS columns (like ladderSim2.dfToArr).
+        Data frames without those column names are read by position, in the COLS order
+
+        Args:
+        df: DataFrame
+        reset: bool, if True wins, losses and level differences are zeroed and trophies get a season reset
+        """
+        table = cls(len(df))
+        byName = all(name in df.columns for name in DF_COLUMNS)
+        for position, (dfName, name) in enumerate(DF_COLUMNS.items()):
+            values = df[dfName] if byName else df.iloc[:, position]
+            setattr(table, name, values.to_numpy().astype(COLUMNS[name]))
+        if reset:
+            table.wins[:] = 0
+            table.losses[:] = 0
+            table.totalLvlDiff[:] = 0
+            table.reset()
+        return table
+
+    def lvlDiffPerMatch(self):
+        """Returns the level difference per match of every player, 0 for players without matches"""
+        matches = self.wins.astype(np.int64) + self.losses
+        return np.divide(self.totalLvlDiff, matches, out = np.zeros(len(self)), where = matches != 0)
+
+    def toDF(self):
+        """Converts the table to a data frame with the ladderSim2.COLS columns (like ladderSim2.arrToDF)"""
+        data = {dfName: getattr(self, name) for dfName, name in DF_COLUMNS.items()}
+        data["LvlDiff/Match"] = self.lvlDiffPerMatch()
+        return pd.DataFrame(data)
+
+    def copy(self):
+        """Returns a deep copy of the table"""
+        new = PlayerTable(0)
+        for name in COLUMNS:
+            setattr(new, name, getattr(self, name).copy())
+        return new
+
+    def matchAllowed(self, i, j):
+        """Checks if a match between rows i and j is allowed to be played (Player.matchAllowed)"""
+        return abs(int(self.trophies[i]) - int(self.trophies[j])) <= 40
+
+    def allowMatch(self, i, j, mode = None, cardLvlRule = 100, CLcutoff = 5000, KTdiff = 0, KTcutoff = 5000):
+        """Checks if a match between rows i and j is allowed with the card level and king tower rules.
+        Same arguments and rules as ladderSim2.allowMatch"""
+        if i == j:
+            return False
+        elif not self.matchAllowed(i, j):
+            return False
+        trophies = int(self.trophies[i])
+        if mode == 'CL':
+            return abs(int(self.cardLevel[i]) - int(self.cardLevel[j])) < cardLvlRule or trophies > CLcutoff
+        elif mode == 'KT':
+            return abs(int(self.kt[i]) - int(self.kt[j])) <= KTdiff or trophies > KTcutoff
+        elif mode == 'KTCL':
+            return ((abs(int(self.kt[i]) - int(self.kt[j])) <= KTdiff or trophies > KTcutoff)
+                    and abs(int(self.cardLevel[i]) - int(self.cardLevel[j])) < cardLvlRule)
+        else:
+            return True
+
+    def playMatch(self, i, j, gatesList = [5000], cap = None, rng = None):
+        """Plays a match between rows i and j, same rules as Player.playMatch.
+        Players without a skill are treated as equally skilled.
+
+        Args:
+        i, j: row indices of both players
+        gatesList: List of trophy gates
+        cap: optional int, card levels are capped at this value for this match only
+        rng: optional numpy Generator (see rngStreams.makeRng), the draw deciding the winner comes from it
+        """
+        rng = _rng if rng is None else rng
+        iCards = int(self.cardLevel[i])
+        jCards = int(self.cardLevel[j])
+        if cap is not None:
+            iCards = min(iCards, cap)
+            jCards = min(jCards, cap)
+        iLevels = iCards + int(self.kt[i])
+        jLevels = jCards + int(self.kt[j])
+        lvlDiff = abs(jLevels - iLevels)
+        self.totalLvlDiff[i] += lvlDiff
+        self.totalLvlDiff[j] += lvlDiff
+        if jLevels != iLevels:
+            over, under = (j, i) if jLevels > iLevels else (i, j)
+            if rng.random() < pl.chanceOfOverlvl(lvlDiff):
+                self.winsMatch(over, under, gatesList = gatesList)
+            else:
+                self.winsMatch(under, over, gatesList = gatesList)
+        else: #equal levels, skill based
+            skillDiff = float(self.skill[j] - self.skill[i])
+            if np.isnan(skillDiff):
+                skillDiff = 0
+            better, worse = (j, i) if skillDiff > 0 else (i, j)
+            if rng.random() > pl.changeOfMoreSkill(abs(skillDiff)): #less skilled player wins
+                self.winsMatch(worse, better, gatesList = gatesList)
+            else:
+                self.winsMatch(better, worse, gatesList = gatesList)
+
+    def winsMatch(self, winner, loser, gatesList = [5000]):
+        """Updates rows winner and loser when winner wins, same rules as Player.winsMatch
+
+        Args:
+        winner, loser: row indices
+        gatesList: List of integers representing trophy gates
+        """
+        winnerTrophies = int(self.trophies[winner])
+        original = int(self.trophies[loser])
+        exchanged = 30 + int((1/12) *(original - winnerTrophies))
+        self.wins[winner] += 1
+        self.trophies[winner] = winnerTrophies + exchanged
+        self.losses[loser] += 1
+        newTrophies = original - int(pl.lossPercent(original) * exchanged)
+        for gate in gatesList:
+            if newTrophies < gate <= original:
+                newTrophies = gate
+                break
+        self.trophies[loser] = newTrophies
+
+    def reset(self, factor = RESET_FACTOR, ceiling = RESET_CEILING):
+        """Season reset of every player's trophies, same rules as Player.reset
+
+        Args:
+        factor, ceiling: optional ladderRules.Breakpoints to reset with a different rule
+        """
+        self.trophies = seasonReset(self.trophies, factor = factor, ceiling = ceiling).astype(COLUMNS["trophies"])
+
+    def sortByTrophies(self):
+        """Sorts the rows of the table by trophies in place (like playerArr.sort())"""
+        order = np.argsort(self.trophies, kind = "stable")
+        for name in COLUMNS:
+            setattr(self, name, getattr(self, name)[order])
+        return self
+
+    def getData(self, i, skill = False):
+        """Gets row i's data and returns it as a list, same as Player.getData"""
+        return self[i].getData(skill = skill)
+
+
+def _column(name):
+    """Property that reads and writes one cell of the viewed table"""
+    def getter(self):
+        value = getattr(self._table, name)[self._index].item()
+        if name == "skill" and value != value: #nan is the None skill
+            return None
+        return value
+    def setter(self, value):
+        if name == "skill" and value is None:
+            value = np.nan
+        getattr(self._table, name)[self._index] = value
+    return property(getter, setter)
+
+
+class PlayerView(pl.Player):
+    """
+    Player-like view of one row of a PlayerTable, kept for backward compatibility.
+    Reading or writing an attribute reads or writes the table, so all Player methods
+    (playMatch, winsMatch, reset, getData...) work unchanged on the underlying table.
+    """
+    def __init__(self, table, index):
+        """Args:
+            table: PlayerTable
+            index: row index in the table
+        """
+        self._table = table
+        self._index = index
+
+    id = _column("id")
+    trophies = _column("trophies")
+    wins = _column("wins")
+    losses = _column("losses")
+    kt = _column("kt")
+    cardLevel = _column("cardLevel")
+    totalLvlDiff = _column("totalLvlDiff")
+    skill = _column("skill")
+    pp = _column("pp")
@@ -0,0 +1,90 @@
+import numpy as np
+from playerTable import PlayerTable, COLUMNS
+from rngStreams import makeRng
+
+#Populations generated as whole columns instead of one Player at a time.  The card level rules of
+#player.createPlayer and player.createRealPlayers are tables indexed by king tower, and king towers, card levels,
+#skills and party percentages are each drawn for every player with one numpy call.  The distributions are the
+#same as the per player functions (same means, deviations, ranges and rounding), not the same random numbers.
+
+KINGS = np.arange(8, 15)
+KT_MEAN = 11 #finalSimulation's king towers: round(normal(11, 1.5)), redrawn outside 8-14
+KT_SD = 1.5
+SKILL = (0.5, 0.16667) #(mean, standard deviation)
+PARTY = (0.2, 0.15)
+#createRealPlayers: card level = int(min(normal(mean, sd), cap)), one row per king tower 8-14
+REAL_CARD_MEAN = np.array([70, 78, 90, 98, 102, 104, 108], dtype = np.float64)
+REAL_CARD_SD = np.array([3.5, 3, 5, 9, 7, 5, 3], dtype = np.float64)
+REAL_CARD_CAP = np.array([np.inf, np.inf, np.inf, 112, 112, 112, 112])
+#createPlayer: card level uniform in [low, high], one row per king tower 8-14
+CARD_LOW = np.array([60, 68, 76, 84, 92, 96, 104])
+CARD_HIGH = np.array([80, 88, 104, 112, 112, 112, 112])
+
+
+def truncatedNormal(rng, n, mean, sd, low = None, high = None, rounded = False):
+    """n normal draws, redrawing (in bulk) the ones outside [low, high]
+
+    Args:
+    rng: numpy Generator
+    mean, sd: floats, parameters of the normal distribution
+    low, high: optional bounds, None for no bound
+    rounded: bool, rounds the draws before checking the bounds (finalSimulation's king towers)
+    """
+    values = rng.normal(mean, sd, n)
+    if rounded:
+        values = np.round(values)
+    if low is None and high is None:
+        return values
+    outside = np.flatnonzero(((values < low) if low is not None else False) | ((values > high) if high is not None else False))
+    while outside.size:
+        redraw = rng.normal(mean, sd, outside.size)
+        if rounded:
+            redraw = np.round(redraw)
+        values[outside] = redraw
+        bad = ((redraw < low) if low is not None else False) | ((redraw > high) if high is not None else False)
+        outside = outside[bad]
+    return values
+
+
+def realCardLevels(kts, rng):
+    """Card levels of players with king towers kts, drawn like player.createRealPlayers"""
+    index = np.asarray(kts) - KINGS[0]
+    draws = rng.normal(REAL_CARD_MEAN[index], REAL_CARD_SD[index])
+    return np.trunc(np.minimum(draws, REAL_CARD_CAP[index])).astype(COLUMNS["cardLevel"])
+
+
+def uniformCardLevels(kts, rng):
+    """Card levels of players with king towers kts, drawn like player.createPlayer"""
+    index = np.asarray(kts) - KINGS[0]
+    return rng.integers(CARD_LOW[index], CARD_HIGH[index] + 1).astype(COLUMNS["cardLevel"])
+
+
+def realPopulation(numPlayers, seed = None, trophies = 5000, firstId = 0, skillBounds = (None, None), ppBounds = (None, None)):
+    """finalSimulation's players (tableSim.createRealPlayer) as a PlayerTable
+
+    Args:
+    numPlayers: int, number of players
+    seed: None, int, SeedSequence or numpy Generator
+    trophies: starting trophies of every player
+    firstId: int, id of the first player
+    skillBounds, ppBounds: optional (low, high) bounds of the skill and party percentage normals.
+                           Unbounded by default, like createRealPlayer
+    """
+    rng = makeRng(seed)
+    table = PlayerTable(numPlayers, trophies = trophies)
+    table.id += firstId
+    table.kt = truncatedNormal(rng, numPlayers, KT_MEAN, KT_SD, KINGS[0], KINGS[-1], rounded = True).astype(COLUMNS["kt"])
+    table.cardLevel = realCardLevels(table.kt, rng)
+    table.skill = truncatedNormal(rng, numPlayers, *SKILL, *skillBounds).astype(COLUMNS["skill"])
+    table.pp = truncatedNormal(rng, numPlayers, *PARTY, *ppBounds).astype(COLUMNS["pp"])
+    return table
+
+
+def basicPopulation(numPlayers, trophies = 5000, seed = None, firstId = 0):
+    """Players with uniform king towers and no skill (ladderSim2.createArray, tableSim.createTable) as a PlayerTable"""
+    rng = makeRng(seed)
+    table = PlayerTable(numPlayers, trophies = trophies)
+    table.id += firstId
+    table.kt = rng.integers(KINGS[0], KINGS[-1] + 1, numPlayers).astype(COLUMNS["kt"])
+    table.cardLevel = uniformCardLevels(table.kt, rng)
+    return table
@@ -0,0 +1,80 @@
+import numpy as np
+
+#Seeding for the simulations.  Everything random takes a seed, which can be None (unseeded), an int,
+#a numpy SeedSequence or a numpy Generator.  Independent streams for processes or replicas come from
+#SeedSequence.spawn, so runs with different streams never share random numbers.
+
+
+def makeRng(seed = None):
+    """Returns a numpy Generator for seed.  A Generator is returned as is so it can be shared"""
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+def copySeed(seed):
+    """Returns a seed makeRng turns into a new Generator at the point seed's stream is at now, without drawing from or
+    spawning off seed: a SeedSequence with the same entropy and spawn key, or a Generator with a copy of the bit
+    generator's state.  Lets an observer (like matchLog's sampling) follow a run's seed without changing the run"""
+    if isinstance(seed, np.random.SeedSequence):
+        return np.random.SeedSequence(seed.entropy, spawn_key = seed.spawn_key, pool_size = seed.pool_size)
+    if isinstance(seed, np.random.Generator):
+        bitGenerator = type(seed.bit_generator)()
+        bitGenerator.state = seed.bit_generator.state
+        return np.random.Generator(bitGenerator)
+    return seed
+
+
+def describeSeed(seed):
+    """json-able description of seed: None, the int, the entropy and spawn key of a SeedSequence, or the
+    bit_generator.state of a Generator"""
+    if isinstance(seed, np.random.SeedSequence):
+        return {"entropy": seed.entropy, "spawnKey": list(seed.spawn_key)}
+    if isinstance(seed, np.random.Generator):
+        return seed.bit_generator.state
+    return None if seed is None else int(seed)
+
+
+def spawn(seed, n):
+    """Returns n independent SeedSequences derived from seed, one per process or replica
+
+    Args:
+    seed: None, int or SeedSequence
+    n: int, number of streams
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n)
+
+
+class RandomBlock():
+    """
+    Draws random numbers from a Generator a block at a time and hands them out one by one,
+    so a simulation loop pays one numpy call per block instead of one Python call per draw.
+
+    Methods:
+        random
+        randrange
+    """
+    def __init__(self, rng, blockSize = 65536):
+        """Args:
+            rng: numpy Generator (or anything makeRng accepts)
+            blockSize: int, number of values drawn at a time
+        """
+        self.rng = makeRng(rng)
+        self.blockSize = blockSize
+        self.block = []
+        self.pos = 0
+
+    def random(self):
+        """Returns a float in [0, 1), like random.random()"""
+        if self.pos == len(self.block):
+            self.block = self.rng.random(self.blockSize).tolist()
+            self.pos = 0
+        value = self.block[self.pos]
+        self.pos += 1
+        return value
+
+    def randrange(self, n):
+        """Returns an int in [0, n), like random.randrange(n)"""
+        return int(self.random() * n)
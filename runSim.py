@@ -0,0 +1,144 @@
+import json
+import time
+import argparse
+import pandas as pd
+from engine import LadderEngine
+from rngStreams import makeRng, copySeed
+from checkpoint import runSeasons
+from matchLog import MatchLog
+from sweep import DEFAULTS as RULES, policyFromConfig, loadPopulation
+from population import realPopulation
+from playerTable import PlayerTable
+
+#Command line entry point.  Runs any table simulation from a json config file and/or flags and writes the final
+#players to a csv file.  Plotting libraries are only imported with --plots (see ladderPlots), so a worker running a
+#short simulation starts in a fraction of a second.
+#python runSim.py --config run.json --population baselineData.csv --mode KT --KTrule 1 --KTcutoff 6000 --seasons 5 --matches 1000000 --out kt.csv
+#Flags override the config file, which overrides DEFAULTS.  Rule keys are the same as sweep.py's.
+
+DEFAULTS = dict(RULES,
+                population = None, #csv file made by ladderSim2.storeDF, None for finalSimulation's players
+                resetPopulation = True, #season reset the population file and zero its wins, losses and level differences
+                players = 100000, #number of generated players when there is no population file
+                partySkip = False,
+                widenEvery = None,
+                maxQueue = None,
+                sampler = False,
+                seasons = 1,
+                matches = 1000000, #matches per season
+                resetAfterLast = False,
+                seed = None,
+                out = "result.csv",
+                checkpoint = None,
+                checkpointEvery = None,
+                log = None,
+                plots = None) #file name prefix of the 6 ladderPlots plots, None for no plots
+
+
+def loadConfig(filename = None, **overrides):
+    """Settings of a run: DEFAULTS, updated with the json file filename, updated with overrides
+
+    Args:
+    filename: optional json file with any keys of DEFAULTS
+    overrides: any keys of DEFAULTS
+    Returns: dict
+    """
+    config = dict(DEFAULTS)
+    if filename is not None:
+        with open(filename) as f:
+            config.update(json.load(f))
+    config.update(overrides)
+    for key in config:
+        if key not in DEFAULTS:
+            raise ValueError(f"Unknown setting: {key}")
+    return config
+
+
+def buildPolicy(config):
+    """MatchPolicy of a config"""
+    policy = policyFromConfig({key: config[key] for key in RULES})
+    policy.partySkip = config["partySkip"]
+    policy.widenEvery = config["widenEvery"]
+    policy.maxQueue = config["maxQueue"]
+    return policy
+
+
+def buildPopulation(config, rng):
+    """Starting PlayerTable of a config: its population file (season reset with no matches played, see
+    sweep.loadPopulation, unless config['resetPopulation'] is False), or config['players'] of finalSimulation's players"""
+    if config["population"] is not None:
+        if not config["resetPopulation"]:
+            return PlayerTable.fromDF(pd.read_csv(config["population"]))
+        return loadPopulation(config["population"])
+    return realPopulation(config["players"], seed = rng)
+
+
+def runFromConfig(config):
+    """Runs the simulation described by config, writes its results and returns the final PlayerTable"""
+    logSeed = copySeed(config["seed"]) #before the run draws from the seed, so the sampling follows any kind of seed
+    rng = makeRng(config["seed"])
+    table = buildPopulation(config, rng)
+    engine = LadderEngine(table, buildPolicy(config), rng = rng, sampler = config["sampler"])
+    log = None
+    if config["log"] is not None:
+        log = MatchLog(config["log"], seed = logSeed)
+        engine.addObserver(log)
+    try:
+        runSeasons(engine, config["seasons"], config["matches"], checkpointFile = config["checkpoint"],
+                   checkpointEvery = config["checkpointEvery"], resetAfterLast = config["resetAfterLast"])
+    finally:
+        if log is not None:
+            log.close()
+    table.sortByTrophies()
+    if config["out"] is not None:
+        table.toDF().to_csv(config["out"], index = False)
+    if config["plots"] is not None:
+        import ladderPlots
+        ladderPlots.plots(table, config["plots"])
+    return table
+
+
+def parseArgs(argv = None):
+    """Reads the command line.  Returns (config file name or None, dict of the settings given as flags)"""
+    parser = argparse.ArgumentParser(description = "Runs a ladder simulation on a PlayerTable")
+    flag = lambda *args, **kwargs: parser.add_argument(*args, default = argparse.SUPPRESS, **kwargs)
+    parser.add_argument("--config", help = "json file with any of the settings below")
+    flag("--population", help = "csv file of the starting players (ladderSim2.storeDF format).  Their trophies are season "
+                                "reset and their wins, losses and level differences zeroed, unless --noReset is given")
+    flag("--noReset", dest = "resetPopulation", action = "store_false", help = "starts from the population file as it is")
+    flag("--players", type = int, help = "number of generated players when there is no population file")
+    flag("--mode", choices = ["KT", "CL", "KTCL"])
+    flag("--KTrule", type = int, help = "max king tower difference")
+    flag("--KTcutoff", type = int, help = "max trophies where king tower mm occurs")
+    flag("--CLrule", type = int, help = "card levels must differ by less than this")
+    flag("--CLcutoff", type = int, help = "max trophies where card level mm occurs")
+    flag("--gatesList", type = int, nargs = "*", help = "trophy gates")
+    flag("--capList", type = int, nargs = "+", help = "trophy counts where card levels are capped")
+    flag("--partySkip", action = "store_true", help = "players skip ladder with probability pp")
+    flag("--widenEvery", type = int, help = "draws between widenings of a queued player's limits")
+    flag("--maxQueue", type = int, help = "most queued players")
+    flag("--sampler", action = "store_true", help = "draw players with an EligibleSampler")
+    flag("--seasons", type = int)
+    flag("--matches", type = int, help = "matches per season")
+    flag("--resetAfterLast", action = "store_true", help = "also resets trophies after the last season")
+    flag("--seed", type = int)
+    flag("--out", help = "csv file of the final players")
+    flag("--checkpoint", help = "checkpoint file, written at every season end")
+    flag("--checkpointEvery", type = int, help = "matches between checkpoints")
+    flag("--log", help = "match log file (see matchLog)")
+    flag("--plots", help = "file name prefix of the plots")
+    args = vars(parser.parse_args(argv))
+    return args.pop("config"), args
+
+
+def main(argv = None):
+    """Runs the simulation given on the command line"""
+    configFile, overrides = parseArgs(argv)
+    config = loadConfig(configFile, **overrides)
+    start = time.perf_counter()
+    runFromConfig(config)
+    print(f"Finished in {time.perf_counter() - start:.1f} s, results in {config['out']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import numpy as np
+from rngStreams import makeRng
+
+#Draws the next player to look for a match without throwing draws away.  The legacy loops draw any player and
+#skip the draw if they are already queued, or (finalSimulation) with probability pp if they aren't playing ladder.
+#The player that gets through is drawn with probability proportional to 1 - pp (0 to 1, since draws below a negative
+#pp never skip) among the players that aren't queued, which is what EligibleSampler draws directly.
+
+
+class EligibleSampler():
+    """
+    Draws rows of a PlayerTable with probability proportional to their weight, leaving out excluded (queued) rows.
+    Weighted rows are drawn a block at a time (one searchsorted over the cumulative weights per block), and
+    excluded rows, a small share of the weight, are drawn again inside draw.  Excluding and including are O(1).
+
+    Attributes:
+        cumulative: array, cumulative weights
+        excluded: set of rows that can't be drawn
+        block: list of pre-drawn rows
+    Methods:
+        draw
+        exclude
+        include
+        reset
+    """
+    def __init__(self, weights, rng = None, blockSize = 65536):
+        """Args:
+            weights: array of non negative floats, relative chance of drawing each row (ladder play probability)
+            rng: numpy Generator (or anything makeRng accepts)
+            blockSize: int, number of rows drawn at a time
+        """
+        weights = np.clip(np.asarray(weights, dtype = np.float64), 0, None)
+        self.cumulative = np.cumsum(weights)
+        self.positive = int(np.count_nonzero(weights))
+        self.last = int(np.flatnonzero(weights)[-1]) if self.positive else 0 #last row that can be drawn
+        self.rng = makeRng(rng)
+        self.blockSize = blockSize
+        self.block = []
+        self.pos = 0
+        self.excluded = set()
+
+    def reset(self):
+        """Includes every row again (after a season reset empties the queues)"""
+        self.excluded = set()
+
+    def exclude(self, i):
+        """Stops row i from being drawn (it joined a queue)"""
+        self.excluded.add(i)
+
+    def include(self, i):
+        """Lets row i be drawn again (it left its queue)"""
+        self.excluded.discard(i)
+
+    def draw(self):
+        """Returns the next drawn row"""
+        if len(self.excluded) >= self.positive:
+            raise RuntimeError("Every player is queued or never plays ladder")
+        while True:
+            if self.pos == len(self.block):
+                u = self.rng.random(self.blockSize)*self.cumulative[-1]
+                self.block = np.minimum(np.searchsorted(self.cumulative, u, side = "right"), self.last).tolist()
+                self.pos = 0
+            row = self.block[self.pos]
+            self.pos += 1
+            if row not in self.excluded:
+                return row
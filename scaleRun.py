@@ -0,0 +1,121 @@
+import time
+import resource
+import numpy as np
+from playerTable import PlayerTable, COLUMNS
+from engine import LadderEngine, MatchPolicy
+from checkpoint import runSeasons
+from snapshot import saveSnapshot
+from sweep import ktSummary
+from population import realPopulation
+from rngStreams import makeRng, spawn
+import tableSim as ts
+
+#Runs with millions of players.  A player is one row of typed columns (no Player object), queues only hold the
+#queued players in trophy buckets (TrophyQueue), and the population is generated a chunk at a time straight into
+#preallocated columns (population.realPopulation), so memory grows by a fixed number of bytes per player (BUDGET):
+#  columns: the PlayerTable columns, kept for the whole run
+#  sampler: the EligibleSampler's cumulative weights, kept for the whole run
+#  transient: float64 temporaries of the ladder weights and season resets, and the end of run summary data frame
+#             (the largest, it sets the peak), freed after use
+#Everything else (queues, pending batch, random blocks, one generation chunk) doesn't depend on the population size.
+#Measured at 1M players: 100 to 110 bytes per player over the interpreter and libraries, about 1.1GB for 10M players.
+#python scaleRun.py --players 1000000 --seasons 1 runs a full finalSimulation season (160 matches per player).
+
+BUDGET = {"columns": sum(np.dtype(dtype).itemsize for dtype in COLUMNS.values()),
+          "sampler": 8,
+          "transient": 72}
+
+
+def peakRssMB():
+    """Peak resident memory of this process so far, in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/2**10
+
+
+def memoryBudget(numPlayers, workers = 1):
+    """Expected memory of a run on top of the interpreter and libraries, in MB, by part (see BUDGET).
+    Sharded runs (workers > 1) also keep a shared copy of the columns and each worker a copy of its band"""
+    budget = {part: numPlayers*size/2**20 for part, size in BUDGET.items()}
+    if workers > 1:
+        budget["shared"] = numPlayers*(BUDGET["columns"] + 2)/2**20
+    budget["total"] = sum(budget.values())
+    return budget
+
+
+def generatePopulation(numPlayers, seed = None, chunkSize = 1000000):
+    """finalSimulation's players (population.realPopulation), generated chunkSize at a time into preallocated
+    columns.  The same seed and chunkSize give the same table
+
+    Args:
+    numPlayers: int, number of players
+    seed: None, int, SeedSequence or numpy Generator
+    chunkSize: int, players generated at a time, bounds the float64 temporaries of the generation
+    """
+    rng = makeRng(seed)
+    table = PlayerTable(numPlayers)
+    for start in range(0, numPlayers, chunkSize):
+        stop = min(start + chunkSize, numPlayers)
+        chunk = realPopulation(stop - start, seed = rng, firstId = start)
+        for name in COLUMNS:
+            getattr(table, name)[start:stop] = getattr(chunk, name)
+    return table
+
+
+def runScale(numPlayers = 1000000, numSeasons = 1, matchesPerSzn = None, policy = None, seed = None, chunkSize = 1000000,
+             workers = 1, outFile = None):
+    """Runs finalSimulation's rules on numPlayers players and reports the time and memory it took
+
+    Args:
+    numPlayers: int, number of players
+    numSeasons: int, number of seasons, with a season reset between them
+    matchesPerSzn: int, matches per season.  Defaults to 160 per player, as in finalSimulation
+    policy: MatchPolicy, finalSimulation's (trophy caps and party skips) by default
+    seed: None, int or SeedSequence
+    chunkSize: int, players generated at a time
+    workers: int, runs the seasons with shardEngine.runSharded on this many processes if more than 1
+    outFile: optional snapshot file (see snapshot.py) to store the final table in
+    Returns: (ktSummary data frame, report dict)
+    """
+    policy = policy or MatchPolicy(capList = ts.CAPLIST, partySkip = True)
+    matchesPerSzn = matchesPerSzn or 160*numPlayers
+    populationSeed, runSeed = spawn(seed, 2)
+    baseline = peakRssMB()
+    start = time.perf_counter()
+    table = generatePopulation(numPlayers, seed = populationSeed, chunkSize = chunkSize)
+    generated = time.perf_counter()
+    if workers > 1:
+        from shardEngine import runSharded
+        runSharded(table, policy, numSeasons, matchesPerSzn, seed = runSeed, workers = workers)
+    else:
+        engine = LadderEngine(table, policy, rng = runSeed, sampler = True)
+        runSeasons(engine, numSeasons, matchesPerSzn)
+        del engine
+    finished = time.perf_counter()
+    summary = ktSummary(table)
+    if outFile is not None:
+        saveSnapshot(table, outFile, params = {"players": numPlayers, "seasons": numSeasons, "matchesPerSzn": matchesPerSzn,
+                                               "seed": seed if isinstance(seed, int) else None, "policy": repr(policy)})
+    report = {"players": numPlayers, "seasons": numSeasons, "matches": numSeasons*matchesPerSzn, "workers": workers,
+              "generateSeconds": generated - start, "runSeconds": finished - generated,
+              "matchesPerSecond": numSeasons*matchesPerSzn/(finished - generated),
+              "baselineRssMB": baseline, "peakRssMB": peakRssMB(),
+              "budgetMB": memoryBudget(numPlayers, workers)["total"]}
+    report["bytesPerPlayer"] = (report["peakRssMB"] - baseline)*2**20/numPlayers
+    return summary, report
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Runs finalSimulation's rules on millions of players")
+    parser.add_argument("--players", type = int, default = 1000000)
+    parser.add_argument("--seasons", type = int, default = 1)
+    parser.add_argument("--matches", type = int, help = "matches per season, 160 per player by default")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--chunk", type = int, default = 1000000)
+    parser.add_argument("--workers", type = int, default = 1)
+    parser.add_argument("--out", help = "snapshot file of the final players")
+    args = parser.parse_args()
+    summary, report = runScale(args.players, args.seasons, args.matches, seed = args.seed, chunkSize = args.chunk,
+                               workers = args.workers, outFile = args.out)
+    print(summary.to_string())
+    for key, value in report.items():
+        print(f"{key}: {value:.1f}" if isinstance(value, float) else f"{key}: {value}")
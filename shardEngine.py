@@ -0,0 +1,186 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from playerTable import PlayerTable, COLUMNS
+from engine import LadderEngine
+from ladderRules import seasonReset
+from rngStreams import spawn
+
+#Runs one simulation on several cores by splitting the ladder into trophy bands.  Matches are only made within
+#40 trophies, so players in different bands almost never play each other.  The player columns live in shared memory.
+#Every round each worker process runs a LadderEngine on the players of one band and writes them back in place (bands
+#never share rows, so no locks are needed).  Between rounds the bands are recomputed as trophy ranges weighted by
+#ladder play, so every band gets the same share of the matches, which moves every player that crossed a boundary to
+#their new band in one batched exchange.  Queues don't survive a round, and players near a boundary can only play
+#across it after the next exchange moves the boundary.  Every band of every round has its own random stream, and the
+#number of bands is fixed (SHARDS) rather than taken from the number of worker processes, so the results only depend
+#on the seed and the number of bands, never on the number of workers.
+#Scripts calling runSharded should do it under if __name__ == "__main__": so the worker processes can import them.
+
+CHANGED = ["trophies", "wins", "losses", "totalLvlDiff"] #columns a match writes
+SHARDS = 8 #default number of trophy bands, whatever the number of workers
+_ATTACHED = {} #worker process: shared memory name -> (SharedMemory, array)
+
+
+class SharedTable():
+    """
+    Copy of a PlayerTable whose columns, and the band of every row, are shared memory blocks that worker
+    processes attach to by name.  Use it as a context manager: the blocks are freed on exit.
+
+    Attributes:
+        table: PlayerTable backed by the shared blocks
+        owner: int16 array, band of every row
+        blocks: dict, column name -> SharedMemory
+    Methods:
+        spec
+        close
+    """
+    def __init__(self, table):
+        """Copies table into new shared memory blocks"""
+        self.blocks = {}
+        self.table = PlayerTable(0)
+        columns = dict(COLUMNS, owner = np.int16)
+        for name, dtype in columns.items():
+            size = len(table)*np.dtype(dtype).itemsize
+            block = shared_memory.SharedMemory(create = True, size = max(size, 1))
+            array = np.ndarray(len(table), dtype = dtype, buffer = block.buf)
+            array[:] = getattr(table, name) if name != "owner" else 0
+            self.blocks[name] = block
+            if name == "owner":
+                self.owner = array
+            else:
+                setattr(self.table, name, array)
+
+    def spec(self):
+        """What a worker needs to attach: dict, column name -> (block name, dtype string, rows)"""
+        return {name: (block.name, np.dtype(COLUMNS.get(name, np.int16)).str, len(self.table)) for name, block in self.blocks.items()}
+
+    def close(self):
+        """Frees the shared blocks.  The table's columns can't be used afterwards"""
+        self.table = None
+        self.owner = None
+        for block in self.blocks.values():
+            if block.name in _ATTACHED: #attached by runBand in this process
+                _ATTACHED.pop(block.name)[0].close()
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach(spec):
+    """Worker side: arrays of the shared blocks in spec, attaching to each block once per process"""
+    arrays = {}
+    for name, (blockName, dtype, rows) in spec.items():
+        if blockName not in _ATTACHED:
+            block = shared_memory.SharedMemory(name = blockName)
+            _ATTACHED[blockName] = (block, np.ndarray(rows, dtype = dtype, buffer = block.buf))
+        arrays[name] = _ATTACHED[blockName][1]
+    return arrays
+
+
+def assignBands(trophies, weights, shards):
+    """Splits players into shards trophy bands with equal total weight (ladder play).  Players are ranked by
+    trophies, so players with the same trophies can end up in neighbouring bands (a season reset puts
+    many players on the same count)
+
+    Returns: int16 array, band of every player, bands increasing with trophies
+    """
+    order = np.argsort(trophies, kind = "stable")
+    cumulative = np.cumsum(weights[order])
+    bands = np.empty(len(order), dtype = np.int16)
+    bands[order] = np.minimum((cumulative - weights[order]/2)*shards//max(cumulative[-1], 1e-12), shards - 1)
+    return bands
+
+
+def splitMatches(numMatches, shares):
+    """Splits numMatches between bands in proportion to shares (largest remainders get the leftovers)"""
+    exact = numMatches*np.asarray(shares, dtype = np.float64)/np.sum(shares)
+    counts = np.floor(exact).astype(np.int64)
+    counts[np.argsort(counts - exact)[:numMatches - counts.sum()]] += 1
+    return counts
+
+
+def runBand(spec, band, numMatches, policy, batchSize, seed):
+    """Plays numMatches matches among the rows of band and writes them back to the shared table.
+    This is what each worker process runs
+
+    Returns: (band, players in the band, largest queue size, seconds)
+    """
+    start = time.perf_counter()
+    arrays = _attach(spec)
+    rows = np.flatnonzero(arrays["owner"] == band)
+    table = PlayerTable(0)
+    for name in COLUMNS:
+        setattr(table, name, arrays[name][rows])
+    engine = LadderEngine(table, policy, batchSize = batchSize, rng = seed, sampler = True)
+    engine.run(numMatches, progress = False)
+    for name in CHANGED:
+        arrays[name][rows] = getattr(table, name)
+    return band, rows.size, engine.maxQueueSize, time.perf_counter() - start
+
+
+def runSharded(table, policy, numSeasons, matchesPerSzn, shards = None, exchangeEvery = None, batchSize = 4096,
+               seed = None, workers = None, resetAfterLast = False):
+    """Plays numSeasons seasons of matchesPerSzn matches on table split into trophy bands, with a season reset
+    between seasons.  Same arguments as checkpoint.runSeasons; table is updated in place
+
+    Args:
+    table: PlayerTable
+    policy: MatchPolicy.  Players are drawn with an EligibleSampler (see LadderEngine)
+    shards: int, number of trophy bands.  Defaults to SHARDS.  The results depend on it (bands don't play each
+            other), so it must not follow the number of workers
+    exchangeEvery: int, matches (over every band) between two exchanges.  Defaults to 2 per player
+    seed: None, int or SeedSequence of the run
+    workers: int, number of processes.  Defaults to every core, 1 runs every band in this process
+    Returns: (table, data frame with one row per band and round: season, round, band, players, matches,
+             maxQueueSize, seconds)
+    """
+    workers = workers or os.cpu_count()
+    shards = shards or SHARDS
+    exchangeEvery = exchangeEvery or 2*len(table)
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    weights = np.clip(policy.weights(table), 0, None)
+    rows = []
+    pool = ProcessPoolExecutor(max_workers = workers) if workers > 1 else None
+    try:
+        with SharedTable(table) as shared:
+            spec = shared.spec()
+            trophies = shared.table.trophies
+            for season in range(1, numSeasons + 1):
+                played = 0
+                rnd = 0
+                while played < matchesPerSzn:
+                    chunk = min(exchangeEvery, matchesPerSzn - played)
+                    shared.owner[:] = assignBands(trophies, weights, shards)
+                    shares = np.bincount(shared.owner, weights = weights, minlength = shards)
+                    shares[np.bincount(shared.owner, minlength = shards) < 2] = 0 #no one to play
+                    counts = splitMatches(chunk, shares)
+                    tasks = [(spec, band, int(n), policy, batchSize, s) for band, (n, s) in enumerate(zip(counts, spawn(root, shards))) if n > 0]
+                    if pool is None:
+                        results = [runBand(*task) for task in tasks]
+                    else:
+                        results = list(pool.map(runBand, *zip(*tasks)))
+                    rnd += 1
+                    for (band, players, maxQueue, seconds), task in zip(results, tasks):
+                        rows += [{"season": season, "round": rnd, "band": band, "players": players, "matches": task[2],
+                                  "maxQueueSize": maxQueue, "seconds": seconds}]
+                    played += chunk
+                print(f"Season {season} complete")
+                if season < numSeasons or resetAfterLast:
+                    trophies[:] = seasonReset(trophies)
+            for name in CHANGED:
+                setattr(table, name, getattr(shared.table, name).copy())
+            del trophies #views of the blocks must be gone before they are closed
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return table, pd.DataFrame(rows)
@@ -0,0 +1,130 @@
+import os
+import glob
+import json
+import numpy as np
+import pandas as pd
+from playerTable import PlayerTable, COLUMNS, DF_COLUMNS
+
+#Binary snapshots of a PlayerTable.  A snapshot file is:
+#  MAGIC, then a little endian uint32 with the length of the header, then the header as json,
+#  padded so every column starts on a 64 byte boundary, then each column's raw data in COLUMNS order.
+#The header has the schema version, number of players, each column's dtype and offset, and the run parameters.
+#Columns are opened with np.memmap, so loading a snapshot doesn't read it into memory.
+
+MAGIC = b"CRLADDER"
+VERSION = 1
+ALIGN = 64
+EXTENSION = ".snap"
+
+
+def _align(n):
+    return (n + ALIGN - 1)//ALIGN*ALIGN
+
+
+def saveSnapshot(table, filename, params = None):
+    """Writes table to filename as a snapshot
+
+    Args:
+    table: PlayerTable
+    filename: string, name of the file
+    params: optional dict of run parameters (mode, rules, seed...) stored in the header.  Must be json serializable
+    """
+    columns = {}
+    offset = 0
+    for name, dtype in COLUMNS.items():
+        columns[name] = {"dtype": np.dtype(dtype).newbyteorder("<").str, "offset": offset}
+        offset = _align(offset + len(table)*np.dtype(dtype).itemsize)
+    header = {"version": VERSION, "numPlayers": len(table), "columns": columns, "params": params or {}}
+    headerBytes = json.dumps(header, default = str).encode()
+    dataStart = _align(len(MAGIC) + 4 + len(headerBytes))
+    with open(filename, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint32(len(headerBytes)).astype("<u4").tobytes())
+        f.write(headerBytes)
+        for name in COLUMNS:
+            f.seek(dataStart + columns[name]["offset"])
+            f.write(np.ascontiguousarray(getattr(table, name), dtype = columns[name]["dtype"]).tobytes())
+        f.truncate(dataStart + offset)
+
+
+def readHeader(filename):
+    """Returns (header dict, byte offset of the column data) of a snapshot file"""
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filename} is not a snapshot file")
+        length = int(np.frombuffer(f.read(4), dtype = "<u4")[0])
+        header = json.loads(f.read(length))
+    if header["version"] > VERSION:
+        raise ValueError(f"{filename} has snapshot version {header['version']}, only versions up to {VERSION} can be read")
+    return header, _align(len(MAGIC) + 4 + length)
+
+
+def loadSnapshot(filename, mode = "r"):
+    """Opens a snapshot file as a PlayerTable whose columns are memory mapped
+
+    Args:
+    filename: string, name of the file
+    mode: np.memmap mode. 'r' is read only, 'c' lets the table be changed (simulated on) without changing the file,
+          None reads the columns into memory
+    Returns: (PlayerTable, run parameters dict)
+    """
+    header, dataStart = readHeader(filename)
+    n = header["numPlayers"]
+    table = PlayerTable(0)
+    for name, info in header["columns"].items():
+        if n == 0:
+            column = np.empty(0, dtype = info["dtype"])
+        elif mode is None:
+            with open(filename, "rb") as f:
+                f.seek(dataStart + info["offset"])
+                column = np.fromfile(f, dtype = info["dtype"], count = n)
+        else:
+            column = np.memmap(filename, dtype = info["dtype"], mode = mode, offset = dataStart + info["offset"], shape = (n,))
+        setattr(table, name, column)
+    return table, header["params"]
+
+
+def iterSnapshots(pattern):
+    """Yields (filename, PlayerTable, run parameters) of every snapshot file matching pattern, one at a time.
+    Only the pages of the columns that are used are read"""
+    for filename in sorted(glob.glob(pattern)):
+        table, params = loadSnapshot(filename)
+        yield filename, table, params
+
+
+def readResultCSV(filename):
+    """Reads one of the csv results made by ladderSim2.storeDF into a PlayerTable.
+    Handles the files where storeDF's index_label = False shifted the header one column left, and files
+    with an unnamed index column"""
+    df = pd.read_csv(filename) #rows with one more field than the header get it as the index
+    df = df.drop(columns = [c for c in df.columns if c.startswith("Unnamed")])
+    missing = [c for c in DF_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"{filename} is missing columns {missing}")
+    return PlayerTable.fromDF(df)
+
+
+def convertCSV(filename, outFile = None):
+    """Converts a csv result file into a snapshot (filename + '.snap' by default) and returns the snapshot's name"""
+    if outFile is None:
+        outFile = os.path.splitext(filename)[0] + EXTENSION
+    saveSnapshot(readResultCSV(filename), outFile, params = {"source": os.path.basename(filename)})
+    return outFile
+
+
+def convertAll(directory = ".", outDirectory = None):
+    """One time conversion of every csv result in directory (including the ones without a .csv extension)
+    Returns: list of the snapshot files made"""
+    made = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path) or name.endswith(EXTENSION) or "." in name and not name.endswith(".csv"):
+            continue
+        with open(path, "rb") as f:
+            if b"Trophies" not in f.readline():
+                continue
+        outFile = None
+        if outDirectory is not None:
+            outFile = os.path.join(outDirectory, os.path.splitext(name)[0] + EXTENSION)
+        made += [convertCSV(path, outFile)]
+    return made
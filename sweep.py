@@ -0,0 +1,123 @@
+import os
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from playerTable import PlayerTable
+from engine import LadderEngine, MatchPolicy
+from rngStreams import spawn
+
+#Runs a grid of ladder rule configurations across a process pool, one configuration per task.
+#Configurations use the same names as ladderSim2.test: mode, KTrule, KTcutoff, CLrule, CLcutoff, gatesList, capList.
+#The defaults are test's too, except KTcutoff: test's 1 turns the KT rule off, so it defaults to 5000 like CLcutoff.
+#Scripts calling runSweep should do it under if __name__ == "__main__": so the worker processes can import them.
+
+DEFAULTS = {"mode": None, "KTrule": 1, "KTcutoff": 5000, "CLrule": 100, "CLcutoff": 5000, "gatesList": [5000], "capList": None}
+
+
+def makeGrid(**options):
+    """Makes every combination of the given options.
+    makeGrid(mode = ['KT'], KTrule = [1, 2], KTcutoff = [6000, 7000]) gives 4 configurations
+
+    Args:
+    options: lists of values for any key of DEFAULTS
+    Returns: list of configuration dicts
+    """
+    for key in options:
+        if key not in DEFAULTS:
+            raise ValueError(f"Unknown sweep option: {key}")
+    keys = list(options)
+    return [dict(zip(keys, values)) for values in itertools.product(*[options[k] for k in keys])]
+
+
+def policyFromConfig(config):
+    """Builds the MatchPolicy of a configuration"""
+    c = dict(DEFAULTS, **config)
+    return MatchPolicy(mode = c["mode"], cardLvlRule = c["CLrule"], CLcutoff = c["CLcutoff"], KTdiff = c["KTrule"],
+                       KTcutoff = c["KTcutoff"], gatesList = c["gatesList"], capList = c["capList"])
+
+
+def loadPopulation(population):
+    """Returns a copy of population as a PlayerTable with reset trophies (a season reset, PlayerTable.reset) and no
+    matches played.  A table and the csv file of the same table give the same population
+
+    Args:
+    population: PlayerTable, or the name of a csv file made by ladderSim2.storeDF
+    """
+    if isinstance(population, PlayerTable):
+        table = population.copy()
+    else:
+        table = PlayerTable.fromDF(pd.read_csv(population))
+    table.wins[:] = 0
+    table.losses[:] = 0
+    table.totalLvlDiff[:] = 0
+    table.reset()
+    return table
+
+
+def ktSummary(table):
+    """Summary of a table by king tower: players, mean and median trophies, LvlDiff/Match and win rate"""
+    matches = table.wins + table.losses
+    df = pd.DataFrame({"King Tower": table.kt,
+                       "Trophies": table.trophies,
+                       "LvlDiff/Match": table.lvlDiffPerMatch(),
+                       "Win Rate": np.where(matches == 0, 0, table.wins/np.maximum(matches, 1))})
+    summary = df.groupby("King Tower").agg(Players = ("Trophies", "size"),
+                                           Trophies = ("Trophies", "mean"),
+                                           MedianTrophies = ("Trophies", "median"),
+                                           LvlDiffPerMatch = ("LvlDiff/Match", "mean"),
+                                           WinRate = ("Win Rate", "mean"))
+    return summary.reset_index()
+
+
+def runConfig(config, population, matchesPerSzn, seasons, seed):
+    """Runs seasons seasons of one configuration (like ladderSim2.test) and summarizes it by king tower.
+    This is what each worker process runs
+
+    Args:
+    seed: int or SeedSequence of this configuration's random stream
+    """
+    table = loadPopulation(population)
+    engine = LadderEngine(table, policyFromConfig(config), rng = seed)
+    start = time.perf_counter()
+    for season in range(1, seasons + 1):
+        engine.run(matchesPerSzn, progress = False)
+        if season != seasons:
+            engine.endSeason()
+    summary = ktSummary(table)
+    for key, value in reversed(list(dict(DEFAULTS, **config).items())):
+        summary.insert(0, key, [value]*len(summary))
+    summary["seed"] = seed.entropy if isinstance(seed, np.random.SeedSequence) else seed
+    summary["stream"] = str(seed.spawn_key) if isinstance(seed, np.random.SeedSequence) else ""
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def runSweep(grid, population, matchesPerSzn, seasons = 5, seed = 0, workers = None, outFile = None):
+    """Runs every configuration of grid in parallel and collects the results in one table
+
+    Args:
+    grid: list of configuration dicts (see makeGrid)
+    population: PlayerTable or csv file name, the starting players of every configuration
+    matchesPerSzn: int, matches played per season
+    seasons: int, number of seasons per configuration
+    seed: int, base seed.  Each configuration gets its own independent stream spawned from it
+    workers: int, number of processes. Defaults to every core
+    outFile: optional csv file name to store the results in
+    Returns: DataFrame with one row per configuration and king tower
+    """
+    seeds = spawn(seed, len(grid))
+    workers = workers or os.cpu_count()
+    results = []
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        futures = {pool.submit(runConfig, config, population, matchesPerSzn, seasons, s): n
+                   for n, (config, s) in enumerate(zip(grid, seeds))}
+        for done, future in enumerate(as_completed(futures), 1):
+            n = futures[future]
+            results += [future.result().assign(task = n)]
+            print(f"[{done}/{len(grid)}] finished {grid[n]}")
+    df = pd.concat(results).sort_values(["task", "King Tower"]).reset_index(drop = True)
+    if outFile is not None:
+        df.to_csv(outFile, index = False)
+    return df
@@ -0,0 +1,92 @@
+import player as pl
+from engine import LadderEngine, MatchPolicy
+from rngStreams import makeRng, copySeed
+from checkpoint import runSeasons
+from matchLog import MatchLog
+from population import realPopulation, basicPopulation
+
+#Simulations running natively on a PlayerTable. Same rules and arguments as the ones in ladderSim2,
+#but players are row indices so there are no Player attribute lookups, __lt__ or __eq__ calls.
+#Every simulation is a MatchPolicy run by the same LadderEngine (see engine.py).
+#seed is None (unseeded), an int, a SeedSequence or a numpy Generator (see rngStreams.py).
+
+CAPLIST = [5300, 5600, 6000, 6300, 6600, 7000]
+
+
+def createTable(numPlayers, trophies, seed = None):
+    """Creates a PlayerTable of numPlayers players with random king towers (like ladderSim2.createArray)"""
+    return basicPopulation(numPlayers, trophies = trophies, seed = seed)
+
+
+def runPolicy(table, numMatches, policy, seed = None, telemetry = None):
+    """Plays numMatches matches on table following policy, then sorts the table by trophies
+    telemetry: optional telemetry.Telemetry to attach to the engine"""
+    engine = LadderEngine(table, policy, rng = seed)
+    if telemetry is not None:
+        telemetry.attach(engine)
+    engine.run(numMatches)
+    return table.sortByTrophies()
+
+
+def simulate(numPlayers, initialTrophies, numMatches, gatesList = [5000], seed = None):
+    """Table version of ladderSim2.simulate"""
+    rng = makeRng(seed)
+    table = createTable(numPlayers, initialTrophies, seed = rng)
+    engine = LadderEngine(table, MatchPolicy(gatesList = gatesList), rng = rng)
+    engine.run(numMatches)
+    print(f"Max queue size: {engine.maxQueueSize}")
+    return table.sortByTrophies()
+
+
+def continueSim(table, numMatches, mode = None, cardLvlRule = 0, KTdiff = 0, KTcutoff = 5000, gatesList = [5000], seed = None):
+    """Table version of ladderSim2.continueSim.  Every mode uses one general queue, searched by the MatchIndex
+    query within the mode's KT and card level limits (see MatchPolicy.limits)"""
+    policy = MatchPolicy(mode = mode, cardLvlRule = cardLvlRule, KTdiff = KTdiff, KTcutoff = KTcutoff, gatesList = gatesList)
+    return runPolicy(table, numMatches, policy, seed = seed)
+
+
+def KTsim(table, numMatches, KTdiff = 1, KTcutoff = 6000, gatesList = [5000], seed = None):
+    """Table version of ladderSim2.KTsim"""
+    return runPolicy(table, numMatches, MatchPolicy(mode = 'KT', KTdiff = KTdiff, KTcutoff = KTcutoff, gatesList = gatesList), seed = seed)
+
+
+def CLsim(table, numMatches, CLrule, CLcutoff, gatesList = [5000], seed = None):
+    """Table version of ladderSim2.CLsim, with its card level queues (MatchPolicy.legacyCL)"""
+    policy = MatchPolicy(mode = 'CL', cardLvlRule = CLrule, CLcutoff = CLcutoff, gatesList = gatesList, legacyCL = True)
+    return runPolicy(table, numMatches, policy, seed = seed)
+
+
+def trophyCapSim(table, numMatches, capList, seed = None):
+    """Table version of ladderSim2.trophyCapSim"""
+    return runPolicy(table, numMatches, MatchPolicy(capList = capList), seed = seed)
+
+
+def finalSimulation(numPlayers = 100000, numSeasons = 12, matchesPerSzn = 16000000, seed = None, checkpointFile = None, checkpointEvery = None,
+                    logFile = None, logSampleRate = 1.0):
+    """Table version of ladderSim2.finalSimulation
+    checkpointFile: optional string, writes a checkpoint there at every season end, and every checkpointEvery matches
+    if checkpointEvery is given.  An interrupted run is continued with checkpoint.resume(checkpointFile)
+    logFile: optional string, logs the matches there (see matchLog), logSampleRate of them"""
+    logSeed = copySeed(seed) #before the run draws from seed, so the sampling follows any kind of seed
+    rng = makeRng(seed)
+    table = realPopulation(numPlayers, seed = rng)
+    engine = LadderEngine(table, MatchPolicy(capList = CAPLIST, partySkip = True), rng = rng, sampler = True)
+    log = None
+    if logFile is not None:
+        log = MatchLog(logFile, sampleRate = logSampleRate, seed = logSeed)
+        engine.addObserver(log)
+    try:
+        runSeasons(engine, numSeasons, matchesPerSzn, checkpointFile = checkpointFile, checkpointEvery = checkpointEvery, resetAfterLast = True)
+    finally:
+        if log is not None:
+            log.close()
+    return table.sortByTrophies()
+
+
+def createRealPlayer(id, rng):
+    """Creates one of finalSimulation's players using the numpy Generator rng.
+    population.realPopulation draws a whole population at once from the same distributions"""
+    kt = 0
+    while kt not in range(8, 15):
+        kt = round(rng.normal(11, 1.5))
+    return pl.createRealPlayers(kingLvl = kt, id = id, skill = float(rng.normal(0.5, 0.16667)), pp = float(rng.normal(0.2, 0.15)), rng = rng)
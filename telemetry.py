@@ -0,0 +1,121 @@
+import time
+from functools import wraps
+
+#Instrumentation of a LadderEngine run.  Counters are updated by the engine as it goes, queue lengths are
+#sampled every few draws, and with profile = True the main phases of the matchmaking loop are timed.
+#Everything is returned as a dict by report(), or handed to a callback while the run plays, instead of printed.
+
+
+class Telemetry():
+    """
+    Counters and timings of a LadderEngine.  Attach it with telemetry.attach(engine) before running.
+
+    Counters: draws, matches, queued (drawn players without an opponent), flushes (batches played early
+    because a drawn player had a pending match).
+    Rejections: self (drawn player already queued), partySkip, emptyQueue, window (no queued player within the
+    trophy window), KT, CL and accept (candidates failing the KT rule, card level rule or MatchPolicy.eligible).
+
+    Attributes:
+        counters: dict, counter name -> count
+        rejections: dict, reason -> count
+        queueLengths: dict, queue length bin -> number of samples
+        timings: dict, phase -> [calls, seconds] (only with profile)
+    Methods:
+        attach
+        count
+        reject
+        onDraw
+        onMatch
+        addRun
+        report
+    """
+    def __init__(self, sampleEvery = 1000, queueBin = 10, profile = False, callback = None, reportEvery = None):
+        """Args:
+            sampleEvery: int, draws between queue length samples
+            queueBin: int, width of the queue length histogram bins
+            profile: bool, times the phases of every step ('step', 'search', 'flush').  search is MatchIndex queries, flush
+                     is playing batches (and the observers), the rest of step is drawing and queueing.  Slows the run down
+            callback: optional function called with report() every reportEvery matches
+            reportEvery: optional int, matches between callbacks
+        """
+        self.sampleEvery = sampleEvery
+        self.queueBin = queueBin
+        self.profile = profile
+        self.callback = callback
+        self.reportEvery = reportEvery
+        self.counters = {"draws": 0, "matches": 0, "queued": 0, "flushes": 0}
+        self.rejections = {}
+        self.queueLengths = {}
+        self.timings = {}
+        self.seconds = 0.0
+        self.maxQueueSize = 0
+        self.engine = None
+
+    def attach(self, engine):
+        """Makes engine report to this telemetry, and installs the phase timers if profiling.  Returns self"""
+        self.engine = engine
+        engine.telemetry = self
+        if self.profile:
+            engine.step = self._timed(engine.step, "step")
+            engine.findOpponent = self._timed(engine.findOpponent, "search")
+            engine.batch.flush = self._timed(engine.batch.flush, "flush")
+        return self
+
+    def _timed(self, function, phase):
+        """Wraps function so its calls and time are added to timings[phase]"""
+        timing = self.timings.setdefault(phase, [0, 0.0])
+        clock = time.perf_counter
+        @wraps(function)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timing[0] += 1
+                timing[1] += clock() - start
+        return timed
+
+    def count(self, name):
+        """Adds one to a counter"""
+        self.counters[name] = self.counters.get(name, 0) + 1
+
+    def reject(self, reason):
+        """Adds one to a rejection reason"""
+        self.rejections[reason] = self.rejections.get(reason, 0) + 1
+
+    def onDraw(self, engine):
+        """Counts a draw and samples the queue length every sampleEvery draws"""
+        self.counters["draws"] += 1
+        if self.counters["draws"] %self.sampleEvery == 0:
+            length = len(engine.queued)
+            self.maxQueueSize = max(self.maxQueueSize, length)
+            b = length //self.queueBin
+            self.queueLengths[b] = self.queueLengths.get(b, 0) + 1
+
+    def onMatch(self):
+        """Counts a match and calls the callback every reportEvery matches"""
+        self.counters["matches"] += 1
+        if self.callback is not None and self.reportEvery and self.counters["matches"] %self.reportEvery == 0:
+            self.callback(self.report())
+
+    def addRun(self, seconds):
+        """Adds the wall time of one LadderEngine.run"""
+        self.seconds += seconds
+
+    def report(self):
+        """Returns everything measured so far as a dict:
+        counters, rejections, run time, matches per second, draws per match, queue length histogram (bin start -> samples), maxQueueSize
+        (the engine's if attached, else the largest sample) and timings (phase -> calls, seconds, share of the step time)"""
+        matches = self.counters["matches"]
+        stepTime = self.timings.get("step", [0, 0.0])[1]
+        timings = {phase: {"calls": calls, "seconds": seconds, "share": seconds/stepTime if stepTime else 0.0}
+                   for phase, (calls, seconds) in self.timings.items()}
+        return {"counters": dict(self.counters),
+                "rejections": dict(self.rejections),
+                "seconds": self.seconds,
+                "matchesPerSecond": matches/self.seconds if self.seconds else 0.0,
+                "drawsPerMatch": self.counters["draws"]/matches if matches else 0.0,
+                "queueHistogram": {b*self.queueBin: n for b, n in sorted(self.queueLengths.items())},
+                "maxQueueSize": self.engine.maxQueueSize if self.engine is not None else self.maxQueueSize,
+                "timings": timings}
+
@@ -0,0 +1,466 @@
+import random
+from bisect import bisect_left
+import numpy as np
+import pytest
+import batchMatch as bm
+import player as pl
+import tableSim as ts
+import ladderRules as rules
+import ladderSim2 as ls
+from engine import LadderEngine, MatchPolicy
+from checkpoint import runSeasons, resume
+from metrics import MatchMetrics
+from sampler import EligibleSampler
+from eventEngine import EventEngine
+from trophyQueue import TrophyQueue
+from matchIndex import MatchIndex
+from population import realPopulation
+from matchLog import MatchLog, readMatchLog, iterMatchLog, readHeader
+from snapshot import saveSnapshot, loadSnapshot
+from shardEngine import runSharded
+from telemetry import Telemetry
+from playerTable import COLUMNS
+
+#Seeded checks that the fast versions give the same results as the code they replaced.  Run with python -m pytest
+
+
+class FixedDraws():
+    """numpy Generator stand in whose random(n) gives n copies of one draw, and random() the draw itself"""
+    def __init__(self, draw):
+        self.draw = draw
+
+    def random(self, n = None):
+        return self.draw if n is None else np.full(n, self.draw)
+
+
+class Crash(MatchMetrics):
+    """Observer that stops a run with an error once it has seen more than limit matches"""
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+
+    def onBatch(self, table, result):
+        super().onBatch(table, result)
+        if self.matches > self.limit:
+            raise RuntimeError("crash")
+
+
+def matchTable(numPairs = 150, seed = 0):
+    """2*numPairs players with skills, around the gates and loss percent breakpoints, paired as rows 2k and 2k + 1"""
+    rng = np.random.default_rng(seed)
+    table = realPopulation(2*numPairs, seed = rng)
+    table.trophies[0::2] = rng.choice([4000, 4990, 5000, 5010, 5290, 5310, 5990, 6010, 6500], numPairs)
+    table.trophies[1::2] = table.trophies[0::2] + rng.integers(-40, 41, numPairs)
+    table.cardLevel[1::2][::3] = table.cardLevel[0::2][::3] + table.kt[0::2][::3] - table.kt[1::2][::3] #equal levels
+    return table
+
+
+def test_batch_kernel_matches_playMatch(monkeypatch):
+    """playMatches and Player.playMatch give every player the same win chance and, for the same winner,
+    the same trophies, wins, losses and level differences.  Each draw of a grid over [0, 1) is given to both
+    versions.  They map a draw to a winner differently, so the number of draws each player wins may differ by
+    one"""
+    table = matchTable()
+    p1 = np.arange(0, len(table), 2)
+    p2 = p1 + 1
+    gatesList = [4000, 5000, 6000]
+    draws = (np.arange(200) + 0.5)/200
+    batchWins = np.zeros(p1.size, dtype = np.int64)
+    scalarWins = np.zeros(p1.size, dtype = np.int64)
+    for draw in draws:
+        batch = table.copy()
+        bm.playMatches(batch, p1, p2, gatesList = gatesList, rng = FixedDraws(draw))
+        players = table.toPlayers()
+        monkeypatch.setattr(random, "random", lambda: draw)
+        for a, b in zip(p1, p2):
+            players[a].playMatch(players[b], gatesList = gatesList)
+        scalar = type(table).fromPlayers(players)
+        batchP1 = batch.wins[p1] == 1
+        scalarP1 = scalar.wins[p1] == 1
+        batchWins += batchP1
+        scalarWins += scalarP1
+        same = np.flatnonzero(batchP1 == scalarP1)
+        rows = np.concatenate((p1[same], p2[same]))
+        for column in ["trophies", "wins", "losses", "totalLvlDiff"]:
+            assert (getattr(batch, column)[rows] == getattr(scalar, column)[rows]).all(), column
+    assert np.abs(batchWins - scalarWins).max() <= 1
+
+
+def test_table_playMatch_matches_playMatch(monkeypatch):
+    """PlayerTable.playMatch given a draw through rng and Player.playMatch given it through random.random end
+    with the same players, and PlayerTable.playMatch doesn't touch random"""
+    table = matchTable()
+    monkeypatch.setattr(random, "random", lambda: pytest.fail("random.random called"))
+    for draw in [0.05, 0.5, 0.95]:
+        rows = table.copy()
+        for a in range(0, len(table), 2):
+            rows.playMatch(a, a + 1, gatesList = [4000, 5000, 6000], rng = FixedDraws(draw))
+        players = table.toPlayers()
+        with monkeypatch.context() as m:
+            m.setattr(random, "random", lambda: draw)
+            for a in range(0, len(table), 2):
+                players[a].playMatch(players[a + 1], gatesList = [4000, 5000, 6000])
+        scalar = type(table).fromPlayers(players)
+        for column in ["trophies", "wins", "losses", "totalLvlDiff"]:
+            assert (getattr(rows, column) == getattr(scalar, column)).all(), column
+
+
+@pytest.mark.parametrize("policy", [MatchPolicy(capList = ts.CAPLIST),
+                                    MatchPolicy(mode = 'KTCL', cardLvlRule = 4, KTdiff = 1, KTcutoff = 8000, capList = ts.CAPLIST,
+                                                widenEvery = 300, maxQueue = 60)],
+                         ids = ["caps", "widening"])
+def test_checkpoint_resume_is_bit_for_bit(policy, tmp_path):
+    """A run that crashes mid season and is resumed from its last checkpoint ends with exactly the players of
+    the same run without a crash"""
+    def engine():
+        return LadderEngine(realPopulation(1500, seed = 3), policy, rng = 5)
+    expected = runSeasons(engine(), 3, 15000).copy()
+    crashing = engine()
+    crashing.addObserver(Crash(35000))
+    checkpointFile = str(tmp_path/"run.npz")
+    with pytest.raises(RuntimeError):
+        runSeasons(crashing, 3, 15000, checkpointFile = checkpointFile, checkpointEvery = 3500)
+    resumed = resume(checkpointFile)
+    for column in ["trophies", "wins", "losses", "totalLvlDiff"]:
+        assert (getattr(resumed, column) == getattr(expected, column)).all(), column
+
+
+def queueOps(seed, steps = 3000):
+    """Seeded adds (of players 0, 1, 2 ... with trophies around the gates) and removes of queued players,
+    as (player, trophies) and (player, None)"""
+    rng = random.Random(seed)
+    queued = []
+    ops = []
+    for player in range(steps):
+        if queued and rng.random() < 0.4:
+            ops += [(queued.pop(rng.randrange(len(queued))), None)]
+        else:
+            ops += [(player, rng.choice([4000, 5000, 5000, 5000, rng.randint(4900, 5100)]))]
+            queued += [player]
+    return ops
+
+
+def test_trophy_queue_matches_sorted_list():
+    """candidates gives the queued players by trophy difference (ties to the higher trophies, then oldest first),
+    and above the player legacy's sorted queue (insert at searchsorted, take the one at searchsorted, or the
+    last) would offer, after every add and remove"""
+    queue = TrophyQueue()
+    legacy = [] #(trophies, player), in the order of the legacy queue arrays
+    queued = {} #player -> trophies.  Players are added in number order, so older players have lower numbers
+    rng = random.Random(1)
+    for player, trophies in queueOps(0):
+        if trophies is None:
+            queue.remove(player)
+            legacy.remove((queued.pop(player), player))
+        else:
+            queue.add(player, trophies)
+            queued[player] = trophies
+            legacy.insert(bisect_left([t for t, _ in legacy], trophies), (trophies, player))
+        x = rng.randint(4850, 5150)
+        expected = sorted(queued, key = lambda p: (abs(queued[p] - x), queued[p] < x, p))
+        assert list(queue.candidates(x)) == expected
+        assert list(queue.candidates(x, 20)) == [p for p in expected if abs(queued[p] - x) <= 20]
+        assert list(queue) == sorted(queued, key = lambda p: (queued[p], p))
+        if legacy:
+            assert queue.above(x) == legacy[min(bisect_left([t for t, _ in legacy], x), len(legacy) - 1)][1]
+        else:
+            assert queue.above(x) is None
+
+
+def test_match_index_query_matches_scan():
+    """MatchIndex.query returns the first candidate within the trophy window and the KT and card level rules,
+    and counts why the ones before it were rejected"""
+    index = MatchIndex()
+    attrs = {}
+    rng = random.Random(2)
+    for player, trophies in queueOps(3, 2000):
+        if trophies is None:
+            index.remove(player)
+            del attrs[player]
+            continue
+        kt, cardLevel = rng.randint(9, 14), rng.randint(70, 100)
+        index.add(player, trophies, kt, cardLevel)
+        attrs[player] = (kt, cardLevel)
+        x, kt, cardLevel = rng.randint(4850, 5150), rng.randint(9, 14), rng.randint(70, 100)
+        scan = list(index.candidates(x, 40))
+        rejections = {}
+        found = index.query(x, kt, cardLevel, ktDiff = 1, clRule = 8, rejections = rejections)
+        allowed = [p for p in scan if abs(attrs[p][0] - kt) <= 1 and abs(attrs[p][1] - cardLevel) < 8]
+        assert found == (allowed[0] if allowed else None)
+        assert index.query(x, kt, cardLevel, ktDiff = 1, clRule = 8) == found
+        checked = scan[:scan.index(found) + 1] if found is not None else scan
+        assert sum(rejections.values()) == len(checked) - (found is not None) + (not scan)
+
+
+def test_sampler_arrivals_match_skip_loop():
+    """EligibleSampler with MatchPolicy.weights gives each pp range (negative pp included, about 9% of
+    finalSimulation's players) the share of arrivals of the legacy loop: draw anyone, skip if random() < pp"""
+    table = realPopulation(2000, seed = 4)
+    rng = np.random.default_rng(5)
+    drawn = rng.integers(0, len(table), 600000)
+    arrivals = drawn[rng.random(drawn.size) >= table.pp[drawn]]
+    sampler = EligibleSampler(MatchPolicy(partySkip = True).weights(table), rng = 6)
+    sampled = np.array([sampler.draw() for _ in range(arrivals.size)])
+    bins = np.digitize(table.pp, [0, 0.2, 0.4])
+    assert (bins == 0).mean() > 0.05
+    legacyShare = np.bincount(bins[arrivals], minlength = 4)/arrivals.size
+    sampledShare = np.bincount(bins[sampled], minlength = 4)/sampled.size
+    assert np.abs(legacyShare - sampledShare).max() < 0.005
+
+
+def test_sampler_exclusion():
+    """EligibleSampler never draws excluded or zero weight rows, draws the others in proportion to their weight,
+    draws a row again once it is included or the sampler is reset, and fails once nothing can be drawn"""
+    weights = np.array([0, 1, 2, 3, 4, 0, 5, 5], dtype = float)
+    sampler = EligibleSampler(weights, rng = 7, blockSize = 1000)
+    for row in [2, 6]:
+        sampler.exclude(row)
+    draws = np.array([sampler.draw() for _ in range(60000)])
+    counts = np.bincount(draws, minlength = weights.size)
+    assert counts[[0, 2, 5, 6]].sum() == 0
+    kept = weights.copy()
+    kept[[2, 6]] = 0
+    assert np.abs(counts/draws.size - kept/kept.sum()).max() < 0.01
+    sampler.include(2)
+    assert 2 in {sampler.draw() for _ in range(2000)}
+    for row in [1, 2, 3, 4, 7]:
+        sampler.exclude(row)
+    with pytest.raises(RuntimeError):
+        sampler.draw()
+    sampler.reset()
+    assert {sampler.draw() for _ in range(2000)} == {1, 2, 3, 4, 6, 7}
+
+
+def test_event_engine_arrivals():
+    """EventEngine players search in proportion to their ladder play chance (never with pp 1), every search ends
+    in a match or a timeout, and the same seed plays the same matches"""
+    def run():
+        table = realPopulation(3000, seed = 2)
+        table.trophies[:] = 5000
+        table.pp[:1000] = 0
+        table.pp[1000:2000] = 0.75
+        table.pp[2000:] = 1
+        engine = EventEngine(table, MatchPolicy(partySkip = True), rng = 8, timeout = 120)
+        return table, engine, engine.runFor(2*24*3600)
+    table, engine, matches = run()
+    played = table.wins + table.losses
+    assert table.wins.sum() == table.losses.sum() == matches
+    assert played[2000:].sum() == 0
+    assert 3.5 < played[:1000].mean()/played[1000:2000].mean() < 4.2 #4, a little less as matches take time
+    waits = engine.waits.toFrame(None)
+    assert waits["Searches"].sum() == 2*matches + waits["Timeouts"].sum()
+    assert waits["Timeouts"].sum() > 0
+    again, _, _ = run()
+    for column in ["trophies", "wins", "losses", "totalLvlDiff"]:
+        assert (getattr(again, column) == getattr(table, column)).all(), column
+
+
+@pytest.mark.parametrize("seed", [lambda: 3, lambda: np.random.SeedSequence(9).spawn(2)[1], lambda: np.random.default_rng(4)],
+                         ids = ["int", "SeedSequence", "Generator"])
+def test_match_log_sampling_follows_seed(seed, tmp_path):
+    """finalSimulation logs the same sample of matches twice from equal seeds of every kind, and its log records
+    the seed"""
+    logs = []
+    for k in range(2):
+        logFile = str(tmp_path/f"{k}.log")
+        ts.finalSimulation(1000, 1, 10000, seed = seed(), logFile = logFile, logSampleRate = 0.1)
+        logs += [np.array(readMatchLog(logFile))]
+    assert 0 < logs[0].size < 10000
+    assert (logs[0] == logs[1]).all()
+    assert readHeader(logFile)[0]["seed"] is not None
+
+
+def test_telemetry_counts_without_changing_the_run():
+    """A run with profiling Telemetry attached plays the same matches as one without, and every draw is counted
+    as a match, a queued player or a rejected draw"""
+    policy = MatchPolicy(mode = 'KT', KTdiff = 1, KTcutoff = 6000, partySkip = True)
+    for sampler in [False, True]:
+        plain = LadderEngine(realPopulation(3000, seed = 1), policy, rng = 2, sampler = sampler)
+        plain.run(20000, progress = False)
+        timed = LadderEngine(realPopulation(3000, seed = 1), policy, rng = 2, sampler = sampler)
+        telemetry = Telemetry(profile = True).attach(timed)
+        timed.run(20000, progress = False)
+        report = telemetry.report()
+        counters, rejections = report["counters"], report["rejections"]
+        assert (plain.table.trophies == timed.table.trophies).all()
+        assert counters["matches"] == 20000
+        assert counters["draws"] == counters["matches"] + counters["queued"] + rejections.get("self", 0) + rejections.get("partySkip", 0)
+
+
+@pytest.mark.parametrize("mode", ["r", "c", None])
+def test_snapshot_round_trip(mode, tmp_path):
+    """loadSnapshot gives back the saved columns, dtypes and parameters, and a copy on write table can be
+    simulated on without changing the file"""
+    table = realPopulation(5000, seed = 6)
+    ts.runPolicy(table, 20000, MatchPolicy(capList = ts.CAPLIST), seed = 7)
+    filename = str(tmp_path/"run.snap")
+    saveSnapshot(table, filename, {"mode": None, "seed": 7})
+    loaded, params = loadSnapshot(filename, mode = mode)
+    assert params == {"mode": None, "seed": 7}
+    for name, dtype in COLUMNS.items():
+        column = getattr(loaded, name)
+        assert column.dtype == dtype, name
+        assert np.array_equal(column, getattr(table, name), equal_nan = column.dtype.kind == "f"), name
+    if mode == "c":
+        ts.runPolicy(loaded, 5000, MatchPolicy(), seed = 8)
+        assert (loadSnapshot(filename)[0].trophies == table.trophies).all()
+
+
+def test_match_log_round_trip(tmp_path):
+    """Every match of a run is read back from its log: one record per match in order, the wins of every player,
+    and the trophies won and lost add up to every player's trophy change.  A second run appends to the log"""
+    table = realPopulation(3000, seed = 9)
+    start = table.trophies.astype(np.int64)
+    engine = LadderEngine(table, MatchPolicy(capList = ts.CAPLIST), rng = 10)
+    logFile = str(tmp_path/"run.log")
+    with MatchLog(logFile, bufferSize = 1000, buffers = 2) as log:
+        engine.addObserver(log)
+        engine.run(15000, progress = False)
+    records = np.array(readMatchLog(logFile))
+    assert (records["tick"] == np.arange(15000)).all()
+    assert np.array_equal(np.concatenate(list(iterMatchLog(logFile, chunkSize = 4096))), records)
+    winners = np.where(records["winner"] == 1, records["id1"], records["id2"])
+    losers = np.where(records["winner"] == 1, records["id2"], records["id1"])
+    rows = np.argsort(table.id)
+    assert (np.bincount(winners, minlength = len(table)) == table.wins[rows]).all()
+    change = np.bincount(winners, records["won"], len(table)) - np.bincount(losers, records["lost"], len(table))
+    assert (change == (table.trophies.astype(np.int64) - start)[rows]).all()
+    with MatchLog(logFile) as log:
+        engine.addObserver(log)
+        engine.run(1000, progress = False)
+    assert readMatchLog(logFile).size == 16000
+
+
+def test_sharded_totals_match_unsharded():
+    """runSharded plays every match of every season, and its trophies, level differences and results are close to
+    an unsharded run and don't depend on the number of workers"""
+    policy = MatchPolicy(partySkip = True)
+    start = realPopulation(4000, seed = 3)
+    single, _ = runSharded(start.copy(), policy, 2, 20000, shards = 4, seed = 5, workers = 1)
+    pooled, _ = runSharded(start.copy(), policy, 2, 20000, shards = 4, seed = 5, workers = 2)
+    unsharded = runSeasons(LadderEngine(start.copy(), policy, rng = 5, sampler = True), 2, 20000)
+    for column in ["trophies", "wins", "losses", "totalLvlDiff"]:
+        assert (getattr(single, column) == getattr(pooled, column)).all(), column
+    for table in [single, unsharded]:
+        assert table.wins.sum() == table.losses.sum() == 40000
+        assert (table.id == start.id).all() and (table.kt == start.kt).all()
+    assert abs(single.trophies.mean() - unsharded.trophies.mean()) < 10
+    assert abs(single.totalLvlDiff.sum() - unsharded.totalLvlDiff.sum())/unsharded.totalLvlDiff.sum() < 0.1
+
+
+#The if-chains ladderRules replaced, as they were
+def oldReset(trophies):
+    """Old Player.reset"""
+    if trophies >= 7000:
+        return min((6600, int(trophies - 0.3*(trophies - 5000))))
+    elif 6000 <= trophies < 7000:
+        return int(trophies - 0.4*(trophies - 5000))
+    elif 5000 <= trophies < 6000:
+        return int(trophies - 0.5*(trophies - 5000))
+    return trophies
+
+def oldLossPercent(trophies):
+    """Old player.lossPercent"""
+    if 4000 <= trophies < 5000:
+        return 1
+    elif 5000 <= trophies < 5300:
+        return 0.8
+    elif 5300 <= trophies < 6000:
+        return 0.9
+    return 1
+
+def oldCap(trophies, capList):
+    """Old the cap lines of ladderSim2 and MatchPolicy.cap"""
+    return (8 + np.searchsorted(capList, trophies))*8
+
+def oldSepByCards(cardLevel):
+    """Old ladderSim2.sepByCards, for one player's card level"""
+    if 60 <= cardLevel <= 63:
+        return '60-63'
+    elif 64 <= cardLevel <= 67:
+        return '64-67'
+    elif 68 <= cardLevel <= 71:
+        return '68-71'
+    elif 72 <= cardLevel <= 75:
+        return '72-75'
+    elif 76 <= cardLevel <= 79:
+        return '76-79'
+    elif 80 <= cardLevel <= 83:
+        return '80-83'
+    elif 84 <= cardLevel <= 87:
+        return '84-87'
+    elif 88 <= cardLevel <= 91:
+        return '88-91'
+    elif 92 <= cardLevel <= 95:
+        return '92-95'
+    elif 96 <= cardLevel <= 99:
+        return '96-99'
+    elif 100 <= cardLevel <= 103:
+        return '100-103'
+    elif 104 <= cardLevel <= 107:
+        return '104-107'
+    elif 108 <= cardLevel:
+        return '108-112'
+    return cardLevel
+
+def oldGates(opponent, original, gatesList):
+    """The gate loop of the old Player.winsMatch, on a loser that had original trophies before the match"""
+    for gate in gatesList:
+        if opponent.trophies < gate <= original:
+            opponent.trophies = gate
+            break
+    return opponent.trophies
+
+
+TROPHIES = np.arange(0, 12001)
+
+
+def test_season_reset_matches_if_chain():
+    """seasonReset, Player.reset and PlayerTable.reset against the old Player.reset for every trophy count"""
+    expected = np.array([oldReset(t) for t in TROPHIES.tolist()])
+    assert (rules.seasonReset(TROPHIES) == expected).all()
+    assert [rules.seasonReset(t) for t in TROPHIES.tolist()] == expected.tolist()
+    player = pl.Player()
+    for t, e in zip(TROPHIES.tolist()[::7], expected[::7]):
+        player.trophies = t
+        player.reset()
+        assert player.trophies == e
+    table = realPopulation(TROPHIES.size, seed = 0)
+    table.trophies[:] = TROPHIES
+    table.reset()
+    assert (table.trophies == expected).all()
+
+
+def test_loss_percent_matches_if_chain():
+    """lossPercent of one trophy count and of an array against the old player.lossPercent"""
+    expected = np.array([oldLossPercent(t) for t in TROPHIES.tolist()])
+    assert (rules.lossPercent(TROPHIES) == expected).all()
+    assert [pl.lossPercent(t) for t in TROPHIES.tolist()] == expected.tolist()
+
+
+@pytest.mark.parametrize("capList", [ts.CAPLIST, [5000, 5500, 6500], [6000]])
+def test_card_level_caps_match_searchsorted(capList):
+    """cap and capLevels against the old (8 + searchsorted)*8 cap lines"""
+    expected = oldCap(TROPHIES, capList)
+    assert (rules.cap(TROPHIES, capList) == expected).all()
+    assert [rules.cap(t, capList) for t in TROPHIES.tolist()[::13]] == expected[::13].tolist()
+    cards = np.random.default_rng(1).integers(60, 113, TROPHIES.size)
+    assert (rules.capLevels(cards, TROPHIES, capList) == np.minimum(cards, expected)).all()
+
+
+@pytest.mark.parametrize("gatesList", [[5000], [4000, 5000, 6000], [4000, 4300, 4600, 5000, 6000, 7000], []])
+def test_gates_match_loop(gatesList):
+    """applyGates against the old Player.winsMatch gate loop on seeded trophy losses"""
+    rng = np.random.default_rng(2)
+    original = rng.integers(3500, 7500, 20000)
+    newTrophies = original - rng.integers(0, 60, original.size)
+    expected = [oldGates(pl.Player(trophies = t), o, gatesList) for t, o in zip(newTrophies.tolist(), original.tolist())]
+    assert rules.applyGates(newTrophies, original, gatesList).tolist() == expected
+
+
+def test_card_groups_match_if_chain():
+    """cardGroups and sepByCards against the old sepByCards labels, ints below 60 included"""
+    levels = list(range(40, 116))
+    expected = [oldSepByCards(level) for level in levels]
+    assert ls.cardGroups(np.array(levels)).tolist() == expected
+    assert [p.cardLevel for p in ls.sepByCards([pl.Player(cardLevel = level) for level in levels])] == expected
@@ -0,0 +1,108 @@
+from bisect import bisect_left
+
+class TrophyQueue():
+    """
+    Matchmaking queue of players ordered by trophies.
+    Players are stored in buckets, one per trophy count, and only the sorted list of occupied
+    trophy counts is searched, so adding, removing and finding the closest player are O(log n)
+    and checking if a player is already queued is O(1).  Buckets are dicts used as ordered sets, so a player
+    is removed from a crowded bucket (the gates and the season reset floor) in O(1) too.
+
+    Attributes:
+        buckets: dict, trophies -> dict of the queued players with that many trophies (oldest first) -> None
+        keys: sorted list of the trophy counts that have a bucket
+        members: dict, queued player -> trophies it was queued with
+    Methods:
+        add
+        remove
+        nearest
+        candidates
+        above
+    """
+    def __init__(self):
+        """Creates an empty queue"""
+        self.buckets = {}
+        self.keys = []
+        self.members = {}
+
+    def __len__(self):
+        """Number of queued players"""
+        return len(self.members)
+
+    def __contains__(self, player):
+        """Checks if player is already queued"""
+        return player in self.members
+
+    def __iter__(self):
+        """Iterates over the queued players from lowest to highest trophies"""
+        for key in self.keys:
+            yield from self.buckets[key]
+
+    def add(self, player, trophies):
+        """Adds player to the queue.  A player can only be queued once.
+
+        Args:
+        player: Hashable player identifier (a PlayerTable row index)
+        trophies: int, the player's trophies
+        """
+        if player in self.members:
+            raise ValueError(f"Player {player} is already queued")
+        trophies = int(trophies)
+        self.members[player] = trophies
+        bucket = self.buckets.get(trophies)
+        if bucket is None:
+            self.keys.insert(bisect_left(self.keys, trophies), trophies)
+            self.buckets[trophies] = {player: None}
+        else:
+            bucket[player] = None
+
+    def remove(self, player):
+        """Removes player from the queue and returns the trophies it was queued with"""
+        trophies = self.members.pop(player)
+        bucket = self.buckets[trophies]
+        del bucket[player]
+        if not bucket:
+            del self.buckets[trophies]
+            del self.keys[bisect_left(self.keys, trophies)]
+        return trophies
+
+    def nearest(self, trophies):
+        """Returns the queued player with the closest trophies (the oldest one if several are as close).
+        Ties between a higher and lower bucket go to the higher one.  Returns None if the queue is empty"""
+        for player in self.candidates(trophies):
+            return player
+        return None
+
+    def above(self, trophies):
+        """The one candidate ladderSim2's sorted queue arrays give (np.searchsorted(queue, player), the last
+        player if that is past the end): the newest of the lowest bucket with at least trophies, or the oldest of
+        the highest bucket if every queued player has fewer.  None if the queue is empty"""
+        if not self.keys:
+            return None
+        position = bisect_left(self.keys, trophies)
+        if position < len(self.keys):
+            return next(reversed(self.buckets[self.keys[position]]))
+        return next(iter(self.buckets[self.keys[-1]]))
+
+    def candidates(self, trophies, window = None):
+        """Yields queued players in order of trophy difference from trophies.  Buckets are read in place, not
+        copied, so the queue must not change while the generator is running (stop using it first)
+
+        Args:
+        trophies: int, the trophies to search around
+        window: optional int, only yields players within +/- window trophies
+        """
+        high = bisect_left(self.keys, trophies)
+        low = high - 1
+        while low >= 0 or high < len(self.keys):
+            lowDiff = trophies - self.keys[low] if low >= 0 else None
+            highDiff = self.keys[high] - trophies if high < len(self.keys) else None
+            if lowDiff is None or (highDiff is not None and highDiff <= lowDiff):
+                key, diff = self.keys[high], highDiff
+                high += 1
+            else:
+                key, diff = self.keys[low], lowDiff
+                low -= 1
+            if window is not None and diff > window:
+                return
+            yield from self.buckets[key]
@@ -0,0 +1,177 @@
+import io
+import math
+import contextlib
+import numpy as np
+import pandas as pd
+import ladderSim2 as ls
+import tableSim as ts
+from playerTable import PlayerTable
+from engine import LadderEngine, MatchPolicy
+from rngStreams import spawn
+from sweep import loadPopulation
+from population import realPopulation
+
+#Statistical equivalence of the table engine and the Player object simulations.  The two use different random
+#sequences, so their results can't be compared bit for bit.  Instead both are run on the same starting population
+#(several replicas each) and, for every king tower, the distributions of trophies, LvlDiff/Match and win rate are
+#compared with two sample Kolmogorov-Smirnov and Welch tests.  A comparison passes if the difference isn't
+#significant (Bonferroni corrected) or is smaller than its tolerance.  A case whose Player object version crashes fails.
+
+CASES = {"continueSim": (lambda arr, n, seed: ls.continueSim(arr, n, seed = seed),
+                         MatchPolicy()),
+         "KTsim": (lambda arr, n, seed: ls.KTsim(arr, n, KTdiff = 1, KTcutoff = 6000, seed = seed),
+                   MatchPolicy(mode = 'KT', KTdiff = 1, KTcutoff = 6000)),
+         "CLsim": (lambda arr, n, seed: ls.CLsim(arr, n, 5, 6000, seed = seed),
+                   MatchPolicy(mode = 'CL', cardLvlRule = 5, CLcutoff = 6000, legacyCL = True)),
+         "trophyCapSim": (lambda arr, n, seed: ls.trophyCapSim(arr, n, ts.CAPLIST, seed = seed),
+                          MatchPolicy(capList = ts.CAPLIST))}
+TOLERANCES = {"Trophies": 0.1, #KS statistic
+              "LvlDiff/Match": 0.25, #difference of the means, levels per match
+              "Win Rate": 0.02} #difference of the means
+
+
+def ksTest(a, b):
+    """Two sample Kolmogorov-Smirnov test
+
+    Returns: (statistic, asymptotic p value)
+    """
+    a = np.sort(np.asarray(a, dtype = np.float64))
+    b = np.sort(np.asarray(b, dtype = np.float64))
+    values = np.concatenate((a, b))
+    cdfA = np.searchsorted(a, values, side = "right")/a.size
+    cdfB = np.searchsorted(b, values, side = "right")/b.size
+    d = float(np.max(np.abs(cdfA - cdfB)))
+    n = a.size*b.size/(a.size + b.size)
+    lam = (math.sqrt(n) + 0.12 + 0.11/math.sqrt(n))*d
+    if lam < 0.2:
+        return d, 1.0
+    p = 2*sum((-1)**(k - 1)*math.exp(-2*k*k*lam*lam) for k in range(1, 101))
+    return d, min(max(p, 0.0), 1.0)
+
+
+def welchTest(a, b):
+    """Welch's test of equal means, with the normal approximation (samples here are hundreds of players)
+
+    Returns: (difference of the means, two sided p value)
+    """
+    a = np.asarray(a, dtype = np.float64)
+    b = np.asarray(b, dtype = np.float64)
+    diff = float(b.mean() - a.mean())
+    se = math.sqrt(a.var(ddof = 1)/a.size + b.var(ddof = 1)/b.size)
+    if se == 0:
+        return diff, 1.0 if diff == 0 else 0.0
+    return diff, math.erfc(abs(diff)/se/math.sqrt(2))
+
+
+def _summary(table):
+    """Per player values that are compared, as a data frame"""
+    matches = table.wins + table.losses
+    return pd.DataFrame({"King Tower": table.kt,
+                         "Trophies": table.trophies,
+                         "LvlDiff/Match": table.lvlDiffPerMatch(),
+                         "Win Rate": np.where(matches == 0, 0, table.wins/np.maximum(matches, 1)),
+                         "Matches": matches})
+
+
+def runBoth(case, population, numMatches, seed):
+    """Runs the Player object and the table engine version of case once each on copies of population
+
+    Returns: (legacy PlayerTable, engine PlayerTable)
+    """
+    legacy, policy = CASES[case]
+    legacySeed, engineSeed = spawn(seed, 2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        arr = legacy(population.toPlayers(), numMatches, legacySeed)
+        table = population.copy()
+        LadderEngine(table, policy, rng = engineSeed).run(numMatches, progress = False)
+    return PlayerTable.fromPlayers(arr), table
+
+
+def compareRuns(legacy, engine, alpha = 0.01, tolerances = TOLERANCES, minPlayers = 20):
+    """Compares per player results of the two versions for every king tower
+
+    Args:
+    legacy, engine: data frames of per player results (see _summary), pooled over replicas
+    alpha: float, family wise significance level, Bonferroni corrected over every comparison
+    tolerances: dict, metric -> largest difference that counts as equivalent
+    minPlayers: int, king towers with fewer players (with a match played) in either version are skipped
+    Returns: data frame with one row per king tower and metric
+    """
+    rows = []
+    for kt in sorted(set(legacy["King Tower"]) & set(engine["King Tower"])):
+        a = legacy[legacy["King Tower"] == kt]
+        b = engine[engine["King Tower"] == kt]
+        for metric in TOLERANCES:
+            x, y = a, b
+            if metric != "Trophies":
+                x, y = a[a["Matches"] > 0], b[b["Matches"] > 0] #players that never played have no rate
+            if len(x) < minPlayers or len(y) < minPlayers:
+                continue
+            if metric == "Trophies":
+                effect, p = ksTest(x[metric], y[metric])
+                test = "KS"
+            else:
+                effect, p = welchTest(x[metric], y[metric])
+                test = "Welch"
+            rows += [{"King Tower": kt, "Metric": metric, "Test": test, "Legacy": x[metric].mean(), "Engine": y[metric].mean(),
+                      "Effect": effect, "Tolerance": tolerances[metric], "p": p}]
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    df["Significant"] = df["p"] < alpha/len(df)
+    df["Passed"] = ~df["Significant"] | (df["Effect"].abs() <= df["Tolerance"])
+    return df
+
+
+def validate(cases = None, population = None, numPlayers = 2000, numMatches = 20000, replicas = 3, seed = 0,
+             alpha = 0.01, tolerances = TOLERANCES):
+    """Checks that the table engine is statistically equivalent to the Player object simulations
+
+    Args:
+    cases: optional list of CASES keys, every case by default
+    population: optional PlayerTable or csv file (like baselineData.csv) every run starts from.
+                Defaults to numPlayers of finalSimulation's players
+    numMatches: int, matches per run
+    replicas: int, runs of each version, pooled
+    seed: int, base seed.  Every run gets its own stream
+    alpha: float, family wise significance level of each case
+    tolerances: dict, metric -> largest difference that counts as equivalent
+    Returns: data frame with one row per case, king tower and metric.  Error holds the exception of a case
+             that crashed
+    """
+    if population is None:
+        population = realPopulation(numPlayers, seed = seed)
+    else:
+        population = loadPopulation(population)
+    results = []
+    for case, caseSeed in zip(cases or CASES, spawn(seed, len(cases or CASES))):
+        legacy, engine = [], []
+        try:
+            for replicaSeed in spawn(caseSeed, replicas):
+                a, b = runBoth(case, population, numMatches, replicaSeed)
+                legacy += [_summary(a)]
+                engine += [_summary(b)]
+        except Exception as error: #the Player object CLsim only has queues for card levels 60 and up
+            print(f"{case}: the Player object version failed, {error!r}")
+            results += [pd.DataFrame({"Case": [case], "Error": [repr(error)]})]
+            continue
+        df = compareRuns(pd.concat(legacy), pd.concat(engine), alpha = alpha, tolerances = tolerances)
+        df.insert(0, "Case", case)
+        results += [df]
+        print(f"{case}: {int(df['Passed'].sum())}/{len(df)} comparisons passed")
+    return pd.concat(results, ignore_index = True)
+
+
+def failures(results):
+    """Rows of validate's results that fail: comparisons that didn't pass, and crashed cases"""
+    passed = results.get("Passed", pd.Series(False, index = results.index)).astype("boolean").fillna(False).astype(bool)
+    return results[~passed]
+
+
+if __name__ == "__main__":
+    results = validate()
+    print(results.to_string())
+    failed = failures(results)
+    if len(failed):
+        print(f"{len(failed)} failures")
+        raise SystemExit(1)